@@ -0,0 +1,117 @@
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Iterable, Iterator, List, Tuple
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV = "{http://arxiv.org/schemas/atom}"
+
+ENTRY = ATOM + "entry"
+TITLE = ATOM + "title"
+SUMMARY = ATOM + "summary"
+AUTHOR = ATOM + "author"
+NAME = ATOM + "name"
+PUBLISHED = ATOM + "published"
+ID = ATOM + "id"
+LINK = ATOM + "link"
+CATEGORY = ATOM + "category"
+DOI = ARXIV + "doi"
+JOURNAL_REF = ARXIV + "journal_ref"
+COMMENT = ARXIV + "comment"
+
+
+def parse_entry(entry: ET.Element) -> dict:
+    """Builds a paper record from one <entry>, visiting each child exactly once."""
+    title, abstract, published_str, entry_id = None, "", None, None
+    doi = journal_ref = comment = pdf_url = None
+    authors, categories = [], []
+
+    for child in entry:
+        tag = child.tag
+        if tag == TITLE:
+            title = child.text
+        elif tag == SUMMARY:
+            abstract = (child.text or "").strip()
+        elif tag == AUTHOR:
+            name = child.find(NAME)
+            if name is not None and name.text:
+                authors.append(name.text)
+        elif tag == PUBLISHED:
+            published_str = child.text
+        elif tag == ID:
+            entry_id = child.text
+        elif tag == LINK:
+            if pdf_url is None and child.get("title") == "pdf":
+                pdf_url = child.get("href")
+        elif tag == CATEGORY:
+            term = child.get("term")
+            if term is not None:
+                categories.append(term)
+        elif tag == DOI:
+            doi = child.text
+        elif tag == JOURNAL_REF:
+            journal_ref = child.text
+        elif tag == COMMENT:
+            comment = child.text
+
+    return {
+        "type": "paper",
+        "title": title.strip() if title else "No title",
+        "abstract": abstract,
+        "authors": ", ".join(authors),
+        "date": datetime.strptime(published_str, "%Y-%m-%dT%H:%M:%SZ") if published_str else datetime.now(),
+        "source": "arXiv",
+        "arxiv_id": entry_id.split("/abs/")[-1] if entry_id else None,
+        "pdf_url": pdf_url,
+        "doi": doi,
+        "categories": ", ".join(categories),
+        "journal_ref": journal_ref,
+        "comment": comment,
+    }
+
+
+class ArxivFeedParser:
+    """
+    Single-pass Atom parser. Feed response chunks as they arrive with
+    `for record in parser.feed(chunk)`, or hand it iterparse events via
+    handle_events. Each <entry> is detached from the tree once handled,
+    so memory stays flat however many entries the feed holds.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root = None
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        """Parses another chunk and returns the entries it completed."""
+        self._parser.feed(chunk)
+        return list(self.handle_events(self._parser.read_events()))
+
+    def close(self) -> List[dict]:
+        """Flushes the parser; raises ET.ParseError on a truncated document."""
+        self._parser.close()
+        return list(self.handle_events(self._parser.read_events()))
+
+    def handle_events(self, events: Iterable[Tuple[str, ET.Element]]) -> Iterator[dict]:
+        for event, elem in events:
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+            elif elem.tag == ENTRY:
+                yield parse_entry(elem)
+                self._root.remove(elem)
+
+
+def parse_arxiv_file(path: str) -> Iterator[dict]:
+    """Streams records from a saved Atom response, e.g. for offline benchmarks."""
+    yield from ArxivFeedParser().handle_events(ET.iterparse(path, events=("start", "end")))
+
+
+if __name__ == "__main__":
+    # Usage: python arxiv_parser.py saved_response.xml [more.xml ...]
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        count = sum(1 for _ in parse_arxiv_file(path))
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {count} entries in {elapsed:.3f}s ({count / elapsed if elapsed else 0:.0f} entries/s)")
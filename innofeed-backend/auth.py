@@ -0,0 +1,140 @@
+import os
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import bcrypt
+
+# bcrypt runs in these worker processes, never on the API's event loop or threadpool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Hash requests queued or running per API process before new ones are refused with a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 4)))
+# Hashing workers yield the CPU to request handling under contention; higher favours feeds over logins
+PASSWORD_HASH_NICE = int(os.getenv("PASSWORD_HASH_NICE", "5"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Must be shared by every API worker, and kept across restarts, for tokens to stay valid
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+if not SESSION_SECRET:
+    print("⚠️ SESSION_SECRET is not set; using a random one, so tokens die with this process")
+    SESSION_SECRET = secrets.token_hex(32)
+_SESSION_KEY = SESSION_SECRET.encode("utf-8")
+
+
+# --- Password Hashing ---
+def _password_bytes(password: str) -> bytes:
+    # bcrypt only looks at the first 72 bytes
+    return password.encode("utf-8")[:72]
+
+
+def _lower_priority(nice: int):
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check_password(password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(_password_bytes(password), hashed_password.encode("utf-8"))
+    except ValueError as e:
+        print(f"Password verification error: {e}")
+        return False
+
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when PASSWORD_HASH_MAX_PENDING requests are already waiting."""
+
+
+class PasswordHasher:
+    """
+    bcrypt on a bounded pool of worker processes. Each hash costs hundreds
+    of milliseconds of CPU; running it here keeps a burst of logins from
+    occupying the API's threads or stalling its event loop. Workers run at
+    lower priority, so feed requests keep getting CPU time during a burst.
+
+    Admission is bounded: past max_pending outstanding calls, new ones fail
+    fast with PasswordHasherBusy, rather than waiting behind a queue whose
+    tail would time out anyway.
+    """
+
+    def __init__(self, workers: int, max_pending: int, nice: int = 0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.nice = nice
+        self.pending = 0
+        self._executor = None
+
+    def start(self):
+        if self._executor is None:
+            # spawn, not fork: the API process has driver threads that must not be copied mid-operation
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority, initargs=(self.nice,),
+            )
+            # Start every worker now rather than on the first logins
+            for future in [self._executor.submit(_lower_priority, 0) for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordHasherBusy()
+        self.start()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash_password, password, BCRYPT_ROUNDS)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_check_password, password, hashed_password)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_NICE)
+
+
+# --- Session Tokens ---
+def _sign(payload: bytes) -> str:
+    digest = hmac.new(_SESSION_KEY, payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def issue_token(user_id: int, ttl: int = SESSION_TTL_SECONDS) -> Tuple[str, int]:
+    """A stateless "user_id.expires.signature" bearer token; returns it with its expiry (unix seconds)."""
+    expires = int(time.time()) + ttl
+    payload = f"{user_id}.{expires}"
+    return f"{payload}.{_sign(payload.encode('ascii'))}", expires
+
+
+def verify_token(token: str) -> Optional[int]:
+    """The token's user_id if its signature is valid and it has not expired, else None."""
+    if not token.isascii():
+        return None
+    payload, _, signature = token.rpartition(".")
+    user_id, _, expires = payload.partition(".")
+    if not (user_id.isdigit() and expires.isdigit()):
+        return None
+    if not hmac.compare_digest(signature, _sign(payload.encode("ascii"))):
+        return None
+    if int(expires) < time.time():
+        return None
+    return int(user_id)
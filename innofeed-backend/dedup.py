@@ -0,0 +1,137 @@
+import os
+import hashlib
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+# Estimated Jaccard similarity of title+abstract shingles at which two items count as the same work
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# Stored signatures and bucket keys depend on these, so they are not configurable
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16  # 8 rows per band: pairs above ~0.7 Jaccard almost always share a bucket
+SHINGLE_SIZE = 3
+MINHASH_SEED = 4242
+# Shingles hashed per matrix block; bounds the (shingles x permutations) uint64 block at ~32 MB
+SHINGLE_CHUNK = 32768
+
+WORD = re.compile(r"[a-z0-9]+")
+ARXIV_VERSION = re.compile(r"v\d+$")
+DOI_PREFIX = re.compile(r"^(https?://(dx\.)?doi\.org/|doi:)", re.IGNORECASE)
+
+
+# --- Identity Keys ---
+def normalize_doi(doi: Optional[str]) -> Optional[str]:
+    if not doi:
+        return None
+    doi = DOI_PREFIX.sub("", doi.strip()).lower()
+    return doi or None
+
+
+def normalize_arxiv_id(arxiv_id: Optional[str]) -> Optional[str]:
+    """Drops the version suffix: 2401.01234v2 and 2401.01234v3 are the same paper."""
+    if not arxiv_id:
+        return None
+    return ARXIV_VERSION.sub("", arxiv_id.strip().lower()) or None
+
+
+def content_key(title: Optional[str], abstract: Optional[str]) -> str:
+    """Identity for items with no source id: a hash of the text, not the title alone."""
+    digest = hashlib.sha1(f"{title or ''}\n{abstract or ''}".encode("utf-8")).hexdigest()
+    return f"text:{digest[:20]}"
+
+
+def identity_keys(item: dict) -> List[str]:
+    """
+    Every key under which this item's work may reappear, most specific
+    first: its own (source, external_id), then the normalized DOI, arXiv
+    id and patent family shared by its other versions.
+    """
+    keys = [f"{item['source']}:{item['external_id']}"]
+    doi = normalize_doi(item.get("doi"))
+    if doi:
+        keys.append(f"doi:{doi}")
+    arxiv_id = normalize_arxiv_id(item.get("arxiv_id"))
+    if arxiv_id:
+        keys.append(f"arxiv:{arxiv_id}")
+    family_id = item.get("patent_family_id")
+    if family_id and family_id != "N/A":
+        keys.append(f"family:{family_id}")
+    return keys
+
+
+# --- MinHash ---
+class MinHasher:
+    """
+    MinHash signatures over word SHINGLE_SIZE-grams, computed for a whole
+    batch at once. The permutations are multiply-shift hashes: the top 32
+    bits of a * x + b in wrapping 64-bit arithmetic, with a odd.
+    """
+
+    def __init__(self, permutations: int = MINHASH_PERMUTATIONS, bands: int = MINHASH_BANDS, seed: int = MINHASH_SEED):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 2 ** 63, permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, permutations, dtype=np.uint64)
+        self.bands = bands
+        self.rows = permutations // bands
+        self.band_mix = rng.integers(0, 2 ** 63, (bands, self.rows), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """32-bit hashes of the text's word n-grams (the words themselves if it is shorter)."""
+        words = WORD.findall((text or "").lower())
+        if not words:
+            return np.zeros(0, dtype=np.uint64)
+        hashes = np.asarray([zlib.crc32(w.encode("utf-8")) for w in words], dtype=np.uint64)
+        n = min(SHINGLE_SIZE, len(hashes))
+        combined = np.zeros(len(hashes) - n + 1, dtype=np.uint64)
+        for offset in range(n):
+            combined = combined * np.uint64(0x9E3779B1) + hashes[offset:len(hashes) - n + 1 + offset]
+        return np.unique(combined & np.uint64(0xFFFFFFFF))
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        Shape (texts, permutations) uint32. Texts with no words get an
+        all-ones signature, which callers must not match on (see has_shingles).
+        """
+        per_text = [self.shingles(t) for t in texts]
+        signatures = np.full((len(texts), len(self.a)), np.iinfo(np.uint32).max, dtype=np.uint32)
+        start = 0
+        while start < len(texts):
+            # Take whole texts until the block is full
+            end, size = start, 0
+            while end < len(texts) and (size == 0 or size + len(per_text[end]) <= SHINGLE_CHUNK):
+                size += len(per_text[end])
+                end += 1
+            block = per_text[start:end]
+            lengths = np.asarray([len(s) for s in block])
+            if lengths.sum():
+                x = np.concatenate(block)
+                with np.errstate(over="ignore"):
+                    hashed = ((x[:, None] * self.a + self.b) >> np.uint64(32)).astype(np.uint32)
+                nonempty = np.flatnonzero(lengths)
+                bounds = np.concatenate(([0], np.cumsum(lengths)[:-1]))[nonempty]
+                signatures[start + nonempty] = np.minimum.reduceat(hashed, bounds, axis=0)
+            start = end
+        return signatures
+
+    @staticmethod
+    def has_shingles(signatures: np.ndarray) -> np.ndarray:
+        return (signatures != np.iinfo(np.uint32).max).any(axis=1)
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """One signed 64-bit bucket key per band, shape (texts, bands); the band index is mixed in."""
+        bands = signatures.astype(np.uint64).reshape(len(signatures), self.bands, self.rows)
+        with np.errstate(over="ignore"):
+            keys = (bands * self.band_mix).sum(axis=2, dtype=np.uint64)
+            keys += np.arange(self.bands, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        return keys.view(np.int64)
+
+    @staticmethod
+    def similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+        """Estimated Jaccard similarity of one signature to each row of others."""
+        return (others == signature).mean(axis=1)
+
+
+minhasher = MinHasher()
@@ -0,0 +1,122 @@
+import re
+import zlib
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+# Texts per matrix multiply; keeps the dense (batch x n_features) block around 32 MB
+CHUNK_SIZE = 512
+
+
+class HashingVectorizer:
+    """Stateless bag-of-words vectorizer: tokens are hashed into n_features columns with crc32."""
+
+    def __init__(self, n_features: int = 2 ** 14):
+        self.n_features = n_features
+
+    def counts(self, texts: Sequence[str]) -> np.ndarray:
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for token in TOKEN.findall((text or "").lower()):
+                rows.append(row)
+                cols.append(zlib.crc32(token.encode("utf-8")))
+        flat = np.asarray(rows, dtype=np.int64) * self.n_features + np.asarray(cols, dtype=np.int64) % self.n_features
+        counts = np.bincount(flat, minlength=len(texts) * self.n_features)
+        return counts.reshape(len(texts), self.n_features).astype(np.float32)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class DomainClassifier:
+    """
+    Nearest-centroid classifier over hashed TF-IDF vectors. Centroids are the
+    mean direction of each domain's stored items; scoring a batch is one
+    (texts x features) @ (features x domains) matrix multiply.
+    """
+
+    def __init__(self, n_features: int = 2 ** 14):
+        self.vectorizer = HashingVectorizer(n_features)
+        self.idf = None
+        self.centroids = None
+        self.labels: List[str] = []
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.centroids is not None and len(self.labels) > 0
+
+    def fit(self, rows: Iterable[Tuple[str, str]]):
+        """
+        Learns from (text, label) pairs in one pass: per-label sums of
+        normalized sublinear term frequencies, with IDF applied at the end.
+        """
+        n_features = self.vectorizer.n_features
+        doc_freq = np.zeros(n_features, dtype=np.float64)
+        sums = {}
+        n_docs = 0
+
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == CHUNK_SIZE:
+                n_docs += self._fit_chunk(chunk, doc_freq, sums)
+                chunk = []
+        if chunk:
+            n_docs += self._fit_chunk(chunk, doc_freq, sums)
+        if not sums:
+            return self
+
+        self.idf = (np.log((1 + n_docs) / (1 + doc_freq)) + 1.0).astype(np.float32)
+        self.labels = sorted(sums)
+        centroids = np.stack([sums[label] for label in self.labels]).astype(np.float32) * self.idf
+        self.centroids = _normalize_rows(centroids)
+        return self
+
+    def _fit_chunk(self, chunk, doc_freq, sums) -> int:
+        counts = self.vectorizer.counts([text for text, _ in chunk])
+        doc_freq += (counts > 0).sum(axis=0)
+        tf = _normalize_rows(np.log1p(counts))
+        labels = np.asarray([label for _, label in chunk])
+        for label in np.unique(labels):
+            total = tf[labels == label].sum(axis=0)
+            sums[label] = sums.get(label, 0) + total
+        return len(chunk)
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """L2-normalized TF-IDF vectors, one row per text."""
+        return _normalize_rows(np.log1p(self.vectorizer.counts(texts)) * self.idf)
+
+    def scores(self, texts: Sequence[str]) -> np.ndarray:
+        """Cosine similarity of every text to every domain centroid, shape (texts, domains)."""
+        blocks = [
+            self.transform(texts[start:start + CHUNK_SIZE]) @ self.centroids.T
+            for start in range(0, len(texts), CHUNK_SIZE)
+        ]
+        return np.vstack(blocks) if blocks else np.zeros((0, len(self.labels)), dtype=np.float32)
+
+    def classify(self, texts: Sequence[str], top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        """Top-k (domain, score) pairs for each text, best first."""
+        scores = self.scores(texts)
+        top_k = min(top_k, len(self.labels))
+        best = np.argsort(-scores, axis=1)[:, :top_k]
+        return [
+            [(self.labels[j], float(scores[i, j])) for j in best[i]]
+            for i in range(len(texts))
+        ]
+
+    def save(self, path: str):
+        np.savez(path, idf=self.idf, centroids=self.centroids, labels=np.asarray(self.labels),
+                 n_features=self.vectorizer.n_features)
+
+    @classmethod
+    def load(cls, path: str) -> "DomainClassifier":
+        data = np.load(path, allow_pickle=False)
+        classifier = cls(int(data["n_features"]))
+        classifier.idf = data["idf"]
+        classifier.centroids = data["centroids"]
+        classifier.labels = [str(label) for label in data["labels"]]
+        return classifier
@@ -0,0 +1,123 @@
+import re
+import threading
+import zlib
+from typing import List
+
+import numpy as np
+
+# Sentence boundary: terminal punctuation followed by whitespace and an uppercase/digit/bracket start
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])")
+TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers him his how i if in into is it its itself just me more most my no nor not of off on once
+only or other our ours out over own same she should so some such than that the their theirs them then there
+these they this those through to too under until up very was we were what when where which while who whom
+why will with would you your paper propose proposed present presents show shows results approach
+method methods based using use used new novel
+""".split())
+
+
+class ExtractiveSummarizer:
+    """
+    Offline centroid TF-IDF summarizer. Every sentence in a batch is scored at
+    once by its cosine similarity to its abstract's TF-IDF centroid, using flat
+    NumPy arrays rather than per-document loops. Terms are hashed into
+    n_features buckets (as in domain_classifier), so the document frequencies
+    shared across calls stay a fixed size however long the process runs,
+    while IDF still sharpens as more abstracts pass through.
+    """
+
+    def __init__(self, max_sentences: int = 2, max_chars: int = 400, lead_bias: float = 0.15, n_features: int = 2 ** 18):
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+        self.lead_bias = lead_bias
+        self.n_features = n_features
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self._lock = threading.Lock()
+
+    def summarize_many(self, texts: List[str]) -> List[str]:
+        summaries = ["No content available" if not t or not t.strip() else None for t in texts]
+        docs = [i for i, summary in enumerate(summaries) if summary is None]
+        if not docs:
+            return summaries
+
+        # Flatten the batch: one entry per sentence, one entry per token
+        sentences, sent_doc, sent_pos = [], [], []
+        tok_terms, tok_sent = [], []
+        for d, i in enumerate(docs):
+            for pos, sentence in enumerate(SENTENCE_SPLIT.split(texts[i].strip())):
+                s = len(sentences)
+                sentences.append(sentence)
+                sent_doc.append(d)
+                sent_pos.append(pos)
+                for term in TOKEN.findall(sentence.lower()):
+                    if term not in STOPWORDS:
+                        tok_terms.append(term)
+                        tok_sent.append(s)
+        vocab_size = self.n_features
+
+        sent_doc = np.asarray(sent_doc, dtype=np.int64)
+        sent_pos = np.asarray(sent_pos, dtype=np.int64)
+        # Hash each distinct term once; the lookup table lives only for this batch
+        buckets = {term: zlib.crc32(term.encode("utf-8")) % vocab_size for term in set(tok_terms)}
+        tok_ids = np.fromiter(map(buckets.__getitem__, tok_terms), dtype=np.int64, count=len(tok_terms))
+        tok_sent = np.asarray(tok_sent, dtype=np.int64)
+        tok_doc = sent_doc[tok_sent]
+
+        # Document frequencies: each (doc, term) pair counts once. IDF is only
+        # computed for the (sorted) buckets this batch uses, not all n_features
+        doc_terms = np.unique(tok_doc * vocab_size + tok_ids) % vocab_size
+        batch_terms, batch_df = np.unique(doc_terms, return_counts=True)
+        with self._lock:
+            self.doc_freq[batch_terms] += batch_df
+            self.n_docs += len(docs)
+            batch_idf = np.log((1 + self.n_docs) / (1 + self.doc_freq[batch_terms])) + 1.0
+
+        n_sent = len(sentences)
+        score = np.zeros(n_sent)
+        if len(tok_ids):
+            # Sentence-term weights w_st = tf * idf, one row per distinct (sentence, term)
+            st_keys, st_counts = np.unique(tok_sent * vocab_size + tok_ids, return_counts=True)
+            st_sent, st_term = st_keys // vocab_size, st_keys % vocab_size
+            w_st = st_counts * batch_idf[np.searchsorted(batch_terms, st_term)]
+
+            # Document centroids w_dt = sum of the doc's sentence weights
+            dt_keys_per_st = sent_doc[st_sent] * vocab_size + st_term
+            dt_keys, dt_index = np.unique(dt_keys_per_st, return_inverse=True)
+            w_dt = np.bincount(dt_index, weights=w_st)
+            doc_norm = np.sqrt(np.bincount(dt_keys // vocab_size, weights=w_dt ** 2, minlength=len(docs)))
+
+            dot = np.bincount(st_sent, weights=w_st * w_dt[dt_index], minlength=n_sent)
+            sent_norm = np.sqrt(np.bincount(st_sent, weights=w_st ** 2, minlength=n_sent))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                score = np.nan_to_num(dot / (sent_norm * doc_norm[sent_doc]))
+        # Abstracts front-load their claims, so nudge earlier sentences up
+        score = score * (1 + self.lead_bias / (1 + sent_pos))
+
+        # Rank sentences within each document and keep the top max_sentences, in original order
+        order = np.lexsort((-score, sent_doc))
+        first_of_doc = np.searchsorted(sent_doc[order], np.arange(len(docs)))
+        rank = np.empty(n_sent, dtype=np.int64)
+        rank[order] = np.arange(n_sent) - first_of_doc[sent_doc[order]]
+        keep = np.flatnonzero(rank < self.max_sentences)
+
+        picked = {}
+        for s in keep[np.lexsort((sent_pos[keep], sent_doc[keep]))]:
+            picked.setdefault(int(sent_doc[s]), []).append(sentences[s])
+        for d, i in enumerate(docs):
+            summary = " ".join(picked.get(d, [texts[i].strip()]))
+            if len(summary) > self.max_chars:
+                summary = summary[:self.max_chars].rsplit(" ", 1)[0] + "..."
+            summaries[i] = summary
+        return summaries
+
+
+summarizer = ExtractiveSummarizer()
+
+
+def summarize_many(texts: List[str]) -> List[str]:
+    return summarizer.summarize_many(texts)
@@ -0,0 +1,247 @@
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+# Upper bound on the serialized bytes held by one API process
+FEED_CACHE_MAX_BYTES = int(os.getenv("FEED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+FEED_CACHE_MAX_USERS = int(os.getenv("FEED_CACHE_MAX_USERS", "100000"))
+
+# Shared invalidation log; API workers and ingest runs must point at the same file
+FEED_CACHE_BUS_PATH = os.getenv(
+    "FEED_CACHE_BUS_PATH",
+    os.path.join(tempfile.gettempdir(), "innofeed_feed_invalidations.log"),
+)
+# Publishers rotate the log to <path>.1 once it reaches this size; 0 never rotates
+FEED_CACHE_BUS_MAX_BYTES = int(os.getenv("FEED_CACHE_BUS_MAX_BYTES", str(1024 * 1024)))
+
+# Rough per-entry bookkeeping cost (key tuple, OrderedDict node, index sets)
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def normalize_domain_ids(domain_ids: Iterable[int]) -> Tuple[int, ...]:
+    """Canonical cache key for a preference set: sorted, de-duplicated ids."""
+    return tuple(sorted(set(domain_ids)))
+
+
+def _entry_size(etag: str, body: bytes) -> int:
+    return sys.getsizeof(body) + sys.getsizeof(etag) + ENTRY_OVERHEAD_BYTES
+
+
+class FileInvalidationBus:
+    """
+    Local stand-in for a cross-process pub/sub backend (e.g. Redis).
+    Publishers append one line per event to a shared log file; each subscriber
+    remembers how far it has read and picks up new lines with a single stat().
+    Once the log reaches max_bytes the next publisher renames it to
+    <path>.1 and starts a new one. Subscribers see the new inode (or a
+    shorter file) as a reset, since they may have missed events.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._inode, self._offset = self._stat()
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Tuple[Optional[int], int]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def _rotate_if_full(self):
+        if self.max_bytes and self._stat()[1] >= self.max_bytes:
+            try:
+                # Atomic, so concurrent publishers can't lose the new file; a write
+                # racing the rename lands in <path>.1, after readers have reset
+                os.replace(self.path, f"{self.path}.1")
+            except FileNotFoundError:
+                pass
+
+    def publish(self, kind: str, ids: Iterable[int]):
+        ids = ",".join(str(i) for i in ids)
+        if not ids:
+            return
+        self._rotate_if_full()
+        # O_APPEND keeps small concurrent writes from interleaving
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{kind} {ids}\n")
+
+    def poll(self):
+        """Returns new (kind, ids) events, or None if the log was rotated or truncated."""
+        inode, size = self._stat()
+        if inode == self._inode and size == self._offset:
+            return []
+        with self._lock:
+            if inode != self._inode and not (self._inode is None and self._offset == 0):
+                self._inode, self._offset = inode, size
+                return None
+            if size < self._offset:
+                self._offset = size
+                return None
+            self._inode = inode
+            try:
+                with open(self.path, "rb") as f:
+                    if os.fstat(f.fileno()).st_ino != inode:
+                        # Rotated since the stat; the next poll resets
+                        return []
+                    f.seek(self._offset)
+                    chunk = f.read(size - self._offset)
+            except FileNotFoundError:
+                return []
+            # Only consume complete lines; a partial write is picked up next time
+            end = chunk.rfind(b"\n") + 1
+            self._offset += end
+        events = []
+        for line in chunk[:end].decode("utf-8").splitlines():
+            kind, _, ids = line.partition(" ")
+            events.append((kind, [int(i) for i in ids.split(",") if i]))
+        return events
+
+
+class FeedCache:
+    """
+    Bounded LRU of pre-serialized feed pages (with their ETags) keyed by normalized domain set.
+    Entries are indexed by domain so an ingest touching one domain drops only
+    the pages that can contain it. A small user -> domain-set map lets cache
+    hits skip the preference lookup as well.
+    """
+
+    def __init__(self, max_bytes: int, max_users: int, bus: Optional[FileInvalidationBus] = None):
+        self.max_bytes = max_bytes
+        self.max_users = max_users
+        self.bus = bus
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._pages: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+        self._by_domain: Dict[int, set] = {}
+        self._generations: Dict[int, int] = {}
+        self._user_domains: "OrderedDict[int, Tuple[int, ...]]" = OrderedDict()
+        self._user_epoch = 0
+        self._lock = threading.Lock()
+
+    # --- Cross-process invalidation ---
+    def sync(self):
+        """Applies invalidations published by other processes since the last call."""
+        if not self.bus:
+            return
+        events = self.bus.poll()
+        if events is None:
+            self.clear()
+            return
+        for kind, ids in events:
+            if kind == "domain":
+                self._invalidate_domains(ids)
+            elif kind == "user":
+                self._invalidate_users(ids)
+
+    def invalidate_domains(self, domain_ids: Iterable[int]):
+        domain_ids = list(domain_ids)
+        self._invalidate_domains(domain_ids)
+        if self.bus:
+            self.bus.publish("domain", domain_ids)
+
+    def invalidate_user(self, user_id: int):
+        self._invalidate_users([user_id])
+        if self.bus:
+            self.bus.publish("user", [user_id])
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._by_domain.clear()
+            self._user_domains.clear()
+            self._user_epoch += 1
+            self.current_bytes = 0
+            for domain_id in self._generations:
+                self._generations[domain_id] += 1
+
+    # --- User preference sets ---
+    def user_epoch(self) -> int:
+        """Snapshot to pass to put_user_domains, bumped by every preference change."""
+        return self._user_epoch
+
+    def get_user_domains(self, user_id: int) -> Optional[Tuple[int, ...]]:
+        with self._lock:
+            domain_ids = self._user_domains.get(user_id)
+            if domain_ids is not None:
+                self._user_domains.move_to_end(user_id)
+            return domain_ids
+
+    def put_user_domains(self, user_id: int, domain_ids: Tuple[int, ...], epoch: int):
+        with self._lock:
+            if epoch != self._user_epoch:
+                return
+            self._user_domains[user_id] = domain_ids
+            self._user_domains.move_to_end(user_id)
+            while len(self._user_domains) > self.max_users:
+                self._user_domains.popitem(last=False)
+
+    # --- Feed pages ---
+    def generation(self, domain_ids: Tuple[int, ...]) -> Tuple[int, ...]:
+        """Snapshot to pass to put_page so a page built from stale rows is discarded."""
+        with self._lock:
+            return tuple(self._generations.get(d, 0) for d in domain_ids)
+
+    def get_page(self, key: tuple) -> Optional[Tuple[str, bytes]]:
+        """Returns (etag, body) for a cached page, or None."""
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put_page(self, key: tuple, etag: str, body: bytes, generation: Tuple[int, ...]):
+        """Stores a page; key[0] must be the normalized domain-id tuple."""
+        domain_ids = key[0]
+        size = _entry_size(etag, body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != tuple(self._generations.get(d, 0) for d in domain_ids):
+                return
+            if key in self._pages:
+                self._drop(key)
+            self._pages[key] = (etag, body)
+            self.current_bytes += size
+            for domain_id in domain_ids:
+                self._by_domain.setdefault(domain_id, set()).add(key)
+            while self.current_bytes > self.max_bytes:
+                self._drop(next(iter(self._pages)))
+
+    # --- Internals ---
+    def _invalidate_domains(self, domain_ids: Iterable[int]):
+        with self._lock:
+            for domain_id in domain_ids:
+                self._generations[domain_id] = self._generations.get(domain_id, 0) + 1
+                for key in list(self._by_domain.get(domain_id, ())):
+                    self._drop(key)
+
+    def _invalidate_users(self, user_ids: Iterable[int]):
+        with self._lock:
+            self._user_epoch += 1
+            for user_id in user_ids:
+                self._user_domains.pop(user_id, None)
+
+    def _drop(self, key: tuple):
+        """Removes one page and its index entries. Caller must hold the lock."""
+        etag, body = self._pages.pop(key)
+        self.current_bytes -= _entry_size(etag, body)
+        for domain_id in key[0]:
+            keys = self._by_domain.get(domain_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_domain[domain_id]
+
+
+invalidation_bus = FileInvalidationBus(FEED_CACHE_BUS_PATH, FEED_CACHE_BUS_MAX_BYTES)
+feed_cache = FeedCache(FEED_CACHE_MAX_BYTES, FEED_CACHE_MAX_USERS, bus=invalidation_bus)
@@ -0,0 +1,138 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import EXTERNAL_REQUEST_SECONDS
+
+# Status codes worth retrying; everything else is returned to the caller as-is
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second with bursts up to `capacity`.
+    Waiters are served in arrival order, so one host's queue never starves.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                # Sleep while holding the lock so later callers queue behind us
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+
+class AsyncFetcher:
+    """
+    Shared httpx connection pool with per-host rate limits and jittered retries.
+    Use as `async with AsyncFetcher(...) as fetcher: await fetcher.get(url)`.
+    """
+
+    def __init__(
+        self,
+        rate_limits: Optional[Dict[str, TokenBucket]] = None,
+        max_connections: int = 20,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 30.0,
+    ):
+        self.rate_limits = rate_limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = timeout
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout, follow_redirects=True)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a server's Retry-After."""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    async def get(self, url: str, params: Optional[dict] = None, service: Optional[str] = None) -> httpx.Response:
+        """
+        GETs a URL under its host's rate limit, retrying transient failures.
+        Each attempt is timed into external_request_duration_seconds under
+        service (default: the host name).
+        """
+        host = urlsplit(url).hostname
+        bucket = self.rate_limits.get(host)
+        for attempt in range(self.max_retries + 1):
+            if bucket:
+                await bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = await self.client.get(url, params=params)
+            except httpx.TransportError as e:
+                EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service or host, outcome=type(e).__name__)
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service or host, outcome=response.status_code)
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+                continue
+            return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, params: Optional[dict] = None, service: Optional[str] = None):
+        """
+        Like get(), but yields the response before its body is read so callers
+        can consume it incrementally with `response.aiter_bytes()`. Attempts
+        are timed up to the response headers.
+        """
+        host = urlsplit(url).hostname
+        bucket = self.rate_limits.get(host)
+        for attempt in range(self.max_retries + 1):
+            if bucket:
+                await bucket.acquire()
+            request = self.client.build_request("GET", url, params=params)
+            start = time.perf_counter()
+            try:
+                response = await self.client.send(request, stream=True)
+            except httpx.TransportError as e:
+                EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service or host, outcome=type(e).__name__)
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service or host, outcome=response.status_code)
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                await response.aclose()
+                await asyncio.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+                continue
+            try:
+                yield response
+            finally:
+                await response.aclose()
+            return
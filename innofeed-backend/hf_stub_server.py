@@ -0,0 +1,85 @@
+"""
+Local stand-in for the Hugging Face Inference API, for exercising nlp_utils
+without network access or quota:
+
+    python hf_stub_server.py --port 8089 --latency 0.2 --fail-rate 0.1
+    HF_API_BASE=http://127.0.0.1:8089 HF_API_KEY=stub python ingest.py
+
+Summarization returns the first sentence of each input; zero-shot
+classification returns the candidate labels in the order given. Failures
+are answered with --fail-status (503 by default) to trip circuit breakers.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def summarize(text):
+    first_sentence = text.split(". ")[0].strip()
+    return {"summary_text": first_sentence}
+
+
+def classify(text, labels):
+    scores = [round(1 / (rank + 1), 3) for rank in range(len(labels))]
+    return {"sequence": text, "labels": labels, "scores": scores}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+    fail_status = 503
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            return self._send(self.fail_status, {"error": "Model is overloaded", "estimated_time": 1.0})
+
+        inputs = body.get("inputs", "")
+        batch = inputs if isinstance(inputs, list) else [inputs]
+        if "zeroshot" in self.path:
+            labels = body.get("parameters", {}).get("candidate_labels", [])
+            outputs = [classify(text, labels) for text in batch]
+        elif "summarization" in self.path:
+            outputs = [summarize(text) for text in batch]
+        else:
+            return self._send(404, {"error": f"Unknown model {self.path}"})
+
+        # Single inputs mirror the real API's shapes: a list for summaries, a dict for zero-shot
+        if not isinstance(inputs, list):
+            outputs = outputs if "summarization" in self.path else outputs[0]
+        self._send(200, outputs)
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8089, latency=0.0, fail_rate=0.0, fail_status=503):
+    """Builds a configured server; call serve_forever() on it (or run it in a thread)."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency, "fail_rate": fail_rate, "fail_status": fail_status,
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.fail_rate, args.fail_status)
+    print(f"HF stub listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
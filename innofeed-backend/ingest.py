@@ -2,14 +2,32 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-import requests
-from sqlalchemy import create_engine, Column, Integer, Text, DateTime, ForeignKey
+import argparse
+import asyncio
+import httpx
+import json
+from sqlalchemy import create_engine, Column, Integer, BigInteger, Float, Text, Date, DateTime, LargeBinary, ForeignKey, Index, PrimaryKeyConstraint, UniqueConstraint, bindparam, column, func, inspect, literal, literal_column, select, table, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, declarative_base
-from datetime import datetime
-from urllib.parse import quote
+from datetime import date, datetime
+from urllib.parse import quote, urlsplit
 import xml.etree.ElementTree as ET
+import re
 import time
-from nlp_utils import summarize_text, categorize_text
+from collections import Counter, defaultdict
+import numpy as np
+from nlp_utils import summarize_many
+from feed_cache import invalidation_bus
+from item_events import item_event_log, item_event_payloads, notify_item_events
+from fetch_client import AsyncFetcher, TokenBucket
+from arxiv_parser import ArxivFeedParser
+from search import ensure_search_schema
+from item_vectors import item_vectors, item_text
+from dedup import NEAR_DUPLICATE_THRESHOLD, content_key, identity_keys, minhasher
+from domain_classifier import DomainClassifier
+from ranking import RANK_SCORE_TOLERANCE, RANK_SOURCE_WEIGHTS, rank_scores
+import metrics
+from metrics import METRICS_TEXTFILE_PATH, instrument_engine, registry
 
 # --- Database Configuration ---
 DB_USER = os.getenv("DB_USER")
@@ -19,15 +37,43 @@ DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 
-if not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
+# DATABASE_URL overrides the DB_* settings, e.g. sqlite:///innofeed.db for a local stand-in
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+if not DATABASE_URL and not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
     raise RuntimeError("Database environment variables are not fully set in .env file.")
 
 if not SERPAPI_KEY:
     print("Warning: SERPAPI_KEY not found. Patent fetching will be skipped.")
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# --- Source API Configuration ---
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "http://export.arxiv.org/api/query")
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+# arXiv asks for no more than one request every three seconds
+ARXIV_REQUESTS_PER_SECOND = float(os.getenv("ARXIV_REQUESTS_PER_SECOND", str(1 / 3)))
+SERPAPI_REQUESTS_PER_SECOND = float(os.getenv("SERPAPI_REQUESTS_PER_SECOND", "1"))
+SERPAPI_BURST = int(os.getenv("SERPAPI_BURST", "5"))
+# Items fetched per query on a first run, before any watermark exists
+INGEST_MAX_RESULTS = int(os.getenv("INGEST_MAX_RESULTS", "50"))
+# Safety cap per query when catching up to a watermark or backfilling to a cutoff
+INGEST_CATCHUP_MAX_RESULTS = int(os.getenv("INGEST_CATCHUP_MAX_RESULTS", "1000"))
+
+# --- Domain Classifier Configuration ---
+DOMAIN_CLASSIFIER_PATH = os.getenv(
+    "DOMAIN_CLASSIFIER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "domain_centroids.npz"),
+)
+DOMAIN_CLASSIFIER_MAX_AGE_HOURS = float(os.getenv("DOMAIN_CLASSIFIER_MAX_AGE_HOURS", "24"))
+# Score bonus for the domain whose source query fetched the item
+CLASSIFIER_QUERY_PRIOR = float(os.getenv("CLASSIFIER_QUERY_PRIOR", "0.1"))
+# Any other domain scoring at least this much is added as a secondary label
+CLASSIFIER_MULTILABEL_MIN_SCORE = float(os.getenv("CLASSIFIER_MULTILABEL_MIN_SCORE", "0.35"))
+
+if not DATABASE_URL:
+    DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 engine = create_engine(DATABASE_URL)
+instrument_engine(engine, "ingest")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -36,304 +82,1045 @@ class Domain(Base):
     __tablename__ = "domains"
     id = Column(Integer, primary_key=True)
     name = Column(Text, nullable=False)
+    # When refresh_rank_scores last changed a score in this domain; versions its "top" feed
+    ranked_at = Column(DateTime)
 
 class Item(Base):
+    """The columns every feed, search and related-items scan reads; source-specific fields live in *_details."""
     __tablename__ = "items"
+    __table_args__ = (
+        Index("ix_items_domain_date_id", "domain_id", "date", "id"),
+        Index("ix_items_domain_id_id", "domain_id", "id"),
+        # Type filters with a date range, e.g. /search?type=patent&date_from=...
+        Index("ix_items_type_date_id", "type", "date", "id"),
+        # Dedup key for bulk upserts: ON CONFLICT (source, external_id)
+        Index("uq_items_source_external_id", "source", "external_id", unique=True),
+    )
     id = Column(Integer, primary_key=True)
     type = Column(Text, nullable=False)
     title = Column(Text, nullable=False)
+    external_id = Column(Text)
     abstract = Column(Text)
     summary = Column(Text)
     authors = Column(Text)
     date = Column(DateTime)
     source = Column(Text)
     domain_id = Column(Integer, ForeignKey("domains.id"))
-    
-    # Patent columns
+
+class ItemDomain(Base):
+    """
+    Every domain an item is routed to; items.domain_id is only its primary
+    one. date repeats items.date so feeds page through this table alone.
+    """
+    __tablename__ = "item_domains"
+    __table_args__ = (
+        UniqueConstraint("item_id", "domain_id", name="uq_item_domains_item_domain"),
+        Index("ix_item_domains_domain_date_item", "domain_id", "date", "item_id"),
+        # The feed ETag version stamp: max(id) per domain, which moves on every new membership
+        Index("ix_item_domains_domain_id_id", "domain_id", "id"),
+        # The "top" feed: WHERE domain_id IN (...) ORDER BY rank_score DESC, item_id DESC
+        Index("ix_item_domains_domain_rank_item", "domain_id", "rank_score", "item_id"),
+    )
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    domain_id = Column(Integer, ForeignKey("domains.id"), nullable=False)
+    date = Column(DateTime)
+    # The item's ranking score, the same on each of its rows; NULL until refresh_rank_scores runs
+    rank_score = Column(Float)
+
+class PaperDetails(Base):
+    __tablename__ = "paper_details"
+    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
+    arxiv_id = Column(Text)
+    pdf_url = Column(Text)
+    doi = Column(Text)
+    journal_ref = Column(Text)
+    categories = Column(Text)
+    comment = Column(Text)
+
+class PatentDetails(Base):
+    __tablename__ = "patent_details"
+    __table_args__ = (
+        Index("ix_patent_details_publication_date", "publication_date"),
+        Index("ix_patent_details_priority_date", "priority_date"),
+    )
+    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
     application_number = Column(Text)
     application_status = Column(Text)
-    publication_date = Column(Text)
+    # NULL when the source gave no date (it used to be stored as the string "N/A")
+    publication_date = Column(Date)
     uspc_classification = Column(Text)
     cpc_classifications = Column(Text)
     assignee = Column(Text)
-    priority_date = Column(Text)
+    priority_date = Column(Date)
     patent_family_id = Column(Text)
     patent_pdf_url = Column(Text)
     thumbnail_url = Column(Text)
     cited_by_count = Column(Integer)
-    
-    # Paper columns
-    arxiv_id = Column(Text)
-    pdf_url = Column(Text)
-    doi = Column(Text)
-    journal_ref = Column(Text)
-    categories = Column(Text)
-    comment = Column(Text)
+
+# --- Facets ---
+class ItemCategory(Base):
+    """One row per arXiv category of a paper; paper_details.categories keeps the joined string for display."""
+    __tablename__ = "item_categories"
+    __table_args__ = (
+        PrimaryKeyConstraint("item_id", "category"),
+        Index("ix_item_categories_category_item", "category", "item_id"),
+    )
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    category = Column(Text, nullable=False)
+
+class ItemCpcCode(Base):
+    """One row per CPC classification of a patent."""
+    __tablename__ = "item_cpc_codes"
+    __table_args__ = (
+        PrimaryKeyConstraint("item_id", "code"),
+        Index("ix_item_cpc_codes_code_item", "code", "item_id"),
+    )
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    code = Column(Text, nullable=False)
+
+class ItemAssignee(Base):
+    """One row per assignee of a patent, including those after the first that patent_details.assignee shows."""
+    __tablename__ = "item_assignees"
+    __table_args__ = (
+        PrimaryKeyConstraint("item_id", "assignee"),
+        Index("ix_item_assignees_assignee_item", "assignee", "item_id"),
+    )
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    assignee = Column(Text, nullable=False)
+
+class FacetCount(Base):
+    """
+    Rollup behind /facets: how many items have each value of a facet, per
+    domain (counting item_domains memberships) and under ALL_DOMAINS
+    (counting items once). insert_items keeps it current in its own
+    transaction; rebuild_facet_counts recomputes it from scratch.
+    """
+    __tablename__ = "facet_counts"
+    __table_args__ = (
+        PrimaryKeyConstraint("facet", "domain_id", "value"),
+        # Top values of one facet in one domain: ORDER BY item_count DESC LIMIT n
+        Index("ix_facet_counts_facet_domain_count", "facet", "domain_id", "item_count"),
+    )
+    facet = Column(Text, nullable=False)
+    domain_id = Column(Integer, nullable=False)
+    value = Column(Text, nullable=False)
+    item_count = Column(BigInteger, nullable=False)
+
+class IngestWatermark(Base):
+    """Newest item date ingested per (source, query); incremental runs page back only this far."""
+    __tablename__ = "ingest_watermarks"
+    source = Column(Text, primary_key=True)
+    query = Column(Text, primary_key=True)
+    latest_date = Column(DateTime, nullable=False)
+    # JSON list of the external ids dated exactly latest_date; the next run skips these rather than refetching them
+    latest_ids = Column(Text)
+    updated_at = Column(DateTime, nullable=False)
+
+class IngestJob(Base):
+    """
+    One unit of ingestion work for ingest_worker.py: one source query's
+    listing from start_offset, leased to one worker at a time. checkpoint holds the
+    paging state after the last committed page, so a retried or re-leased
+    job resumes there.
+    """
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (Index("ix_ingest_jobs_status_run_after", "status", "run_after"),)
+    id = Column(Integer, primary_key=True)
+    source = Column(Text, nullable=False)  # "arXiv" or "Google Patents"
+    # The domains the query serves, for display; jobs queued before query planning name one
+    domain = Column(Text, nullable=False)
+    query = Column(Text)
+    start_offset = Column(Integer, nullable=False, default=0)
+    # Page range size; None pages down to the watermark (or cutoff)
+    max_results = Column(Integer)
+    cutoff = Column(DateTime)
+    # queued -> running -> done | failed | cancelled
+    status = Column(Text, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False)
+    lease_owner = Column(Text)
+    lease_expires = Column(DateTime)
+    checkpoint = Column(Text)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+# --- Dedup Index ---
+class ItemAlias(Base):
+    """A key under which a stored item's work may reappear: its own ids, or a linked duplicate's."""
+    __tablename__ = "item_aliases"
+    alias = Column(Text, primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False, index=True)
+    # "own" for the item's identity keys, "shared_id" or "near_duplicate" for linked duplicates
+    reason = Column(Text, nullable=False)
+
+class ItemSignature(Base):
+    __tablename__ = "item_signatures"
+    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
+    minhash = Column(LargeBinary, nullable=False)
+
+class ItemLshBucket(Base):
+    """MinHash LSH bands: items sharing a band_key are near-duplicate candidates."""
+    __tablename__ = "item_lsh_buckets"
+    __table_args__ = (PrimaryKeyConstraint("band_key", "item_id"),)
+    band_key = Column(BigInteger, nullable=False)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+
+# --- Schema Management ---
+def add_missing_columns(table):
+    """Adds model columns that an existing table predates; returns their names."""
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    added = []
+    with engine.begin() as conn:
+        for col in table.columns:
+            if col.name not in existing:
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+                added.append(col.name)
+    return added
+
+
+def parse_date(value):
+    """A date from a "YYYY-MM-DD..." string, or None for blanks, "N/A" and anything unparseable."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value.strip()[:10])
+    except (AttributeError, ValueError):
+        return None
+
+
+def migrate_item_details():
+    """
+    Moves the paper- and patent-only columns of a pre-split items table into
+    paper_details and patent_details, parsing the patent date strings into
+    DATEs, then drops them from items. Runs in one transaction and does
+    nothing once items is narrow. Returns the number of items migrated.
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns("items")}
+    legacy = [c for c in PAPER_FIELDS + PATENT_FIELDS if c in existing]
+    if not legacy:
+        return 0
+    items = table("items", column("id"), column("type"), *[column(c) for c in legacy])
+    insert = dialect_insert()
+    migrated, last_id = 0, 0
+    with engine.begin() as conn:
+        while True:
+            rows = conn.execute(
+                select(items).where(items.c.id > last_id).order_by(items.c.id).limit(INSERT_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for item_type, (model, fields) in DETAIL_TABLES.items():
+                values = [
+                    {"item_id": row.id, **detail_values(row._mapping, fields)}
+                    for row in rows if row.type == item_type
+                ]
+                if values:
+                    conn.execute(insert(model).values(values).on_conflict_do_nothing(index_elements=["item_id"]))
+            migrated += len(rows)
+        for name in legacy:
+            conn.execute(text(f"ALTER TABLE items DROP COLUMN {name}"))
+    print(f"Moved details of {migrated} items into paper_details/patent_details and dropped {len(legacy)} columns from items")
+    if engine.dialect.name == "postgresql":
+        print("Run VACUUM FULL items in a quiet period to rewrite the table without the dropped columns")
+    return migrated
+
+
+def backfill_item_domains():
+    """Gives every item of a database that predates item_domains its primary domain as a membership."""
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "INSERT INTO item_domains (item_id, domain_id, date) "
+            "SELECT id, domain_id, date FROM items WHERE domain_id IS NOT NULL ORDER BY id"
+        ))
+    if result.rowcount:
+        print(f"Backfilled domain memberships for {result.rowcount} items")
+
+
+def migrate_title_keys():
+    """
+    Gives items with no external_id, or a legacy bare-title one
+    ("title:<title>"), the content key external_id_for computes for them,
+    and moves their own alias with it; otherwise dedup and the upsert never
+    match them when they are fetched again. An item whose content key
+    another item or alias already holds keeps its old key. Returns the
+    number of items re-keyed.
+    """
+    stale = Item.external_id.is_(None) | Item.external_id.like("title:%")
+    set_key = (
+        update(Item.__table__)
+        .where(Item.__table__.c.id == bindparam("b_id"))
+        .values(external_id=bindparam("b_key"))
+    )
+    move_alias = (
+        update(ItemAlias.__table__)
+        .where(ItemAlias.__table__.c.alias == bindparam("b_old"), ItemAlias.__table__.c.item_id == bindparam("b_id"))
+        .values(alias=bindparam("b_new"))
+    )
+    rekeyed, kept, last_id = 0, 0, 0
+    with engine.begin() as conn:
+        while True:
+            rows = conn.execute(
+                select(Item.id, Item.source, Item.external_id, Item.title, Item.abstract)
+                .where(stale, Item.id > last_id).order_by(Item.id).limit(INSERT_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            keys = {row.id: content_key(row.title, row.abstract) for row in rows}
+            taken = set(conn.execute(
+                select(Item.source, Item.external_id).where(Item.external_id.in_(set(keys.values())))
+            ).all())
+            taken_aliases = set(conn.execute(
+                select(ItemAlias.alias).where(ItemAlias.alias.in_({f"{row.source}:{keys[row.id]}" for row in rows}))
+            ).scalars().all())
+            changes = []
+            for row in rows:
+                key = keys[row.id]
+                if (row.source, key) in taken or f"{row.source}:{key}" in taken_aliases:
+                    kept += 1
+                    continue
+                taken.add((row.source, key))
+                changes.append({
+                    "b_id": row.id, "b_key": key,
+                    "b_old": f"{row.source}:{row.external_id}", "b_new": f"{row.source}:{key}",
+                })
+            if changes:
+                conn.execute(set_key, changes)
+                conn.execute(move_alias, changes)
+            rekeyed += len(changes)
+    if rekeyed:
+        print(f"Re-keyed {rekeyed} items without a source id to their content keys; {kept} kept their old key")
+    return rekeyed
+
+
+def ensure_schema():
+    """Creates missing tables, columns and indexes, including on pre-existing tables."""
+    had_item_domains = inspect(engine).has_table("item_domains")
+    had_facet_counts = inspect(engine).has_table("facet_counts")
+    Base.metadata.create_all(bind=engine)
+    if not had_item_domains:
+        backfill_item_domains()
+    add_missing_columns(IngestJob.__table__)
+    add_missing_columns(IngestWatermark.__table__)
+    add_missing_columns(Domain.__table__)
+    add_missing_columns(ItemDomain.__table__)
+    for index in ItemDomain.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    # create_all skips tables that already exist, so add their newer columns and indexes explicitly
+    if "external_id" in add_missing_columns(Item.__table__):
+        # Tables this old still have the detail columns, migrated below
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE items SET external_id = COALESCE(arxiv_id, NULLIF(application_number, 'N/A'))"
+            ))
+    # Before the unique index: rows without a source id get their content keys here
+    migrate_title_keys()
+    migrate_item_details()
+    for index in Item.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    ensure_search_schema(engine)
+    if not had_facet_counts:
+        backfill_item_facets()
+        rebuild_facet_counts()
+
+# --- Ingestion Metrics ---
+# fetch is time spent waiting on the sources, parse turning their responses into item dicts
+INGEST_STAGE_SECONDS = metrics.Histogram(
+    "ingest_stage_duration_seconds", "Time per page or batch in each ingestion stage", ["stage"],
+)
+INGEST_ITEMS = metrics.Counter("ingest_items_total", "Fetched items by what ingestion did with them", ["outcome"])
+
+
+def report_ingest_metrics(since=None):
+    """
+    Prints the stage timings observed since `since`, an earlier
+    INGEST_STAGE_SECONDS.totals() (by default since the process started),
+    and, with METRICS_TEXTFILE_PATH set, writes every metric there. The
+    metrics themselves stay cumulative, as Prometheus expects.
+    """
+    since = since or {}
+    timings = []
+    for (stage,), (count, seconds) in sorted(INGEST_STAGE_SECONDS.totals().items()):
+        count_before, seconds_before = since.get((stage,), (0, 0.0))
+        if count > count_before:
+            timings.append(f"{stage} {seconds - seconds_before:.2f}s/{count - count_before}")
+    if timings:
+        print("Stage timings: " + ", ".join(timings))
+    if METRICS_TEXTFILE_PATH:
+        try:
+            registry.write_textfile(METRICS_TEXTFILE_PATH)
+        except OSError as e:
+            print("Error writing metrics:", e)
 
 # --- Data Ingestion Functions ---
-def fetch_arxiv(domains_list, max_results=50):
-    """Fetches recent papers from arXiv with enhanced metadata."""
-    category_map = {
-        "AI": "cs.AI",
-        "Robotics": "cs.RO",
-        "Quantum Computing": "quant-ph",
-        "Genetics": "q-bio.GN",
-        "Cybersecurity": "cs.CR",
-        "Blockchain": "cs.CR"
-    }
+def make_fetcher():
+    """Shared connection pool with each source host's rate limit."""
+    return AsyncFetcher(rate_limits={
+        urlsplit(ARXIV_API_URL).hostname: TokenBucket(ARXIV_REQUESTS_PER_SECOND),
+        urlsplit(SERPAPI_URL).hostname: TokenBucket(SERPAPI_REQUESTS_PER_SECOND, SERPAPI_BURST),
+    })
+
+
+def load_watermarks():
+    """(latest_date, external ids stored at that date) per (source, query)."""
+    db = SessionLocal()
+    try:
+        return {
+            (w.source, w.query): (w.latest_date, frozenset(json.loads(w.latest_ids or "[]")))
+            for w in db.query(IngestWatermark).all()
+        }
+    finally:
+        db.close()
+
+
+def advance_watermarks(progress):
+    """
+    Moves each query's watermark up to the newest item it fetched, but only
+    for queries whose paging reached the old watermark (or cutoff), so an
+    interrupted run never leaves a gap behind the new watermark. The ids of
+    the items at the new watermark date are kept with it; new items sharing
+    an unchanged watermark date are added to them.
+    Call after the fetched items are stored.
+    """
+    db = SessionLocal()
+    try:
+        existing = {(w.source, w.query): w for w in db.query(IngestWatermark).all()}
+        advanced = 0
+        for (source, query), state in progress.items():
+            if not state["complete"] or state["newest"] is None:
+                if not state["complete"]:
+                    print(f"Watermark for {source} '{query}' kept: paging stopped before reaching it")
+                continue
+            newest_ids = set(state["newest_ids"])
+            mark = existing.get((source, query))
+            if mark is None:
+                mark = IngestWatermark(source=source, query=query, latest_date=state["newest"])
+                db.add(mark)
+            elif state["newest"] > mark.latest_date:
+                mark.latest_date = state["newest"]
+            elif state["newest"] == mark.latest_date:
+                stored_ids = set(json.loads(mark.latest_ids or "[]"))
+                if newest_ids <= stored_ids:
+                    continue
+                newest_ids |= stored_ids
+            else:
+                continue
+            mark.latest_ids = json.dumps(sorted(newest_ids))
+            mark.updated_at = datetime.now()
+            advanced += 1
+        db.commit()
+        print(f"Advanced {advanced} watermarks")
+    finally:
+        db.close()
 
-    all_papers = []
 
+class QueryProgress:
+    """
+    Paging state for one (source, query): the oldest date still wanted
+    (the backfill cutoff, else the watermark), the result budget, and
+    whether paging got all the way down to that floor. Items dated exactly
+    at the watermark that the last run already stored are skipped too.
+    """
+
+    def __init__(self, source, query, watermarks, max_results, cutoff=None, catch_up=True):
+        self.key = (source, query)
+        mark = watermarks.get(self.key)
+        self.floor = cutoff or (mark[0] if mark else None)
+        self.floor_ids = frozenset() if cutoff or not mark else mark[1]
+        self.max_results = max_results
+        if catch_up and self.floor is not None:
+            self.max_results = max(max_results, INGEST_CATCHUP_MAX_RESULTS)
+        self.newest = None
+        self.newest_ids = set()
+        self.complete = False
+        self.count = 0
+
+    def wanted(self, items):
+        """Keeps items at or above the floor; marks paging complete once a page crosses it."""
+        kept = []
+        for it in items:
+            dated = not it.pop("date_estimated", False)
+            if dated and self.floor is not None:
+                if it["date"] < self.floor:
+                    self.complete = True
+                    continue
+                if it["date"] == self.floor and external_id_for(it) in self.floor_ids:
+                    continue
+            if self.count < self.max_results:
+                kept.append(it)
+                self.count += 1
+                if dated and (self.newest is None or it["date"] > self.newest):
+                    self.newest, self.newest_ids = it["date"], set()
+                if dated and it["date"] == self.newest:
+                    self.newest_ids.add(external_id_for(it))
+        return kept
+
+    def done(self):
+        if self.complete:
+            return True
+        if self.count >= self.max_results:
+            # A first run's budget defines its history; a catch-up that hits the cap has a gap
+            self.complete = self.floor is None
+            return True
+        return False
+
+    def exhausted(self):
+        """The source has no more results."""
+        self.complete = True
+
+    def state(self):
+        return {"newest": self.newest, "newest_ids": sorted(self.newest_ids), "complete": self.complete}
+
+    def checkpoint(self):
+        return {
+            "count": self.count,
+            "newest": self.newest.isoformat() if self.newest else None,
+            "newest_ids": sorted(self.newest_ids),
+            "complete": self.complete,
+        }
+
+    def restore(self, checkpoint):
+        self.count = checkpoint["count"]
+        self.newest = datetime.fromisoformat(checkpoint["newest"]) if checkpoint["newest"] else None
+        # Checkpoints saved before ids were tracked have none
+        self.newest_ids = set(checkpoint.get("newest_ids", []))
+        self.complete = checkpoint["complete"]
+
+
+ARXIV_CATEGORIES = {
+    "AI": "cs.AI",
+    "Robotics": "cs.RO",
+    "Quantum Computing": "quant-ph",
+    "Genetics": "q-bio.GN",
+    "Cybersecurity": "cs.CR",
+    "Blockchain": "cs.CR"
+}
+ARXIV_PAGE_SIZE = 25
+
+PATENT_QUERIES = {
+    "AI": "artificial intelligence OR machine learning",
+    "Robotics": "robotics OR autonomous systems",
+    "Quantum Computing": "quantum computing OR quantum information",
+    "Genetics": "genetics OR genomics OR DNA",
+    "Cybersecurity": "cybersecurity OR network security OR encryption",
+    "Blockchain": "blockchain OR distributed ledger OR cryptocurrency"
+}
+PATENT_PAGE_SIZE = 20
+
+SOURCE_QUERIES = {"arXiv": ARXIV_CATEGORIES, "Google Patents": PATENT_QUERIES}
+
+
+# --- Query Planning ---
+def source_query(source, domain):
+    """The query a domain is fetched with from a source (arXiv queries are "cat:<category>"), or None."""
+    query = SOURCE_QUERIES[source].get(domain)
+    if query and source == "arXiv":
+        return f"cat:{query}"
+    return query
+
+
+def query_key(query):
+    """
+    Normalized form of a query: its OR-ed terms, lowercased, de-duplicated
+    and sorted, so "DNA OR genomics" and "genomics OR dna" are one query.
+    """
+    terms = {term.strip().lower() for term in re.split(r"\s+OR\s+", query, flags=re.IGNORECASE)}
+    return " OR ".join(sorted(terms - {""}))
+
+
+def plan_queries(source, domains_list):
+    """
+    Collapses the domains' queries for a source into distinct ones, so each
+    is fetched once however many domains share it (cs.CR serves both
+    Cybersecurity and Blockchain). Returns {query_key: (query, domains)}, in
+    domain order; query is the first domain's spelling, which is also the
+    key its watermark is stored under.
+    """
+    plan = {}
     for domain in domains_list:
-        cat = category_map.get(domain)
-        if not cat:
+        query = source_query(source, domain)
+        if not query:
             continue
+        key = query_key(query)
+        if key in plan:
+            plan[key][1].append(domain)
+        else:
+            plan[key] = (query, [domain])
+    return plan
+
+
+def tag_domains(items, domains):
+    """Marks fetched items with the domains their query serves; the first is the default primary domain."""
+    for it in items:
+        it["domain"] = domains[0]
+        it["domains"] = list(domains)
+    return items
+
 
-        url_base = f"http://export.arxiv.org/api/query?search_query=cat:{cat}&sortBy=submittedDate&sortOrder=descending"
+async def fetch_arxiv_page(fetcher, query, domains, start, size):
+    """One page of an arXiv listing, newest first. Raises on HTTP and parse errors."""
+    url = (f"{ARXIV_API_URL}?search_query={query}&sortBy=submittedDate&sortOrder=descending"
+           f"&start={start}&max_results={size}")
+    page = []
+    started, parsing = time.perf_counter(), 0.0
+    async with fetcher.stream(url, service="arxiv") as resp:
+        if resp.status_code != 200:
+            raise httpx.HTTPStatusError(f"arXiv returned {resp.status_code}", request=resp.request, response=resp)
+        # Entries are parsed as body chunks arrive, not after the full download
+        parser = ArxivFeedParser()
+        async for chunk in resp.aiter_bytes():
+            parse_start = time.perf_counter()
+            page.extend(parser.feed(chunk))
+            parsing += time.perf_counter() - parse_start
+        parse_start = time.perf_counter()
+        page.extend(parser.close())
+        parsing += time.perf_counter() - parse_start
+    INGEST_STAGE_SECONDS.observe(time.perf_counter() - started - parsing, stage="fetch")
+    INGEST_STAGE_SECONDS.observe(parsing, stage="parse")
+
+    for paper in page:
+        # Summaries are added after dedup, see summarize_items
+        paper["summary"] = None
+    return tag_domains(page, domains)
+
+
+async def fetch_arxiv(fetcher, domains_list, max_results=INGEST_MAX_RESULTS, watermarks=None, cutoff=None, progress=None):
+    """
+    Fetches recent papers from arXiv with enhanced metadata, each distinct
+    category once and all of them concurrently, newest first. Paging stops
+    at the query's watermark (or at cutoff, for backfills); per-query paging
+    state goes into progress.
+    """
+    async def fetch_query(query, domains):
+        paging = QueryProgress("arXiv", query, watermarks or {}, max_results, cutoff)
         papers = []
         start = 0
-        batch_size = 25
-
-        while len(papers) < max_results:
-            remaining = max_results - len(papers)
-            fetch_size = min(batch_size, remaining)
-            url = f"{url_base}&start={start}&max_results={fetch_size}"
-            resp = requests.get(url)
-            if resp.status_code != 200:
-                print(f"Error fetching from arXiv ({domain}): {resp.status_code}")
+
+        while not paging.done():
+            fetch_size = min(ARXIV_PAGE_SIZE, paging.max_results - paging.count)
+            try:
+                page = await fetch_arxiv_page(fetcher, query, domains, start, fetch_size)
+            except (httpx.HTTPError, ET.ParseError) as e:
+                print(f"Error fetching from arXiv ({query}): {e}")
                 break
 
-            root = ET.fromstring(resp.content)
-            ns = {"atom": "http://www.w3.org/2005/Atom"}
-            entries = root.findall("atom:entry", ns)
-            if not entries:
+            if not page:
+                paging.exhausted()
                 break
 
-            for entry in entries:
-                # Basic fields
-                title = entry.find("atom:title", ns).text.strip() if entry.find("atom:title", ns) is not None else "No title"
-                abstract = entry.find("atom:summary", ns).text.strip() if entry.find("atom:summary", ns) is not None else ""
-                
-                # Authors
-                authors = ", ".join([
-                    a.find("atom:name", ns).text
-                    for a in entry.findall("atom:author", ns)
-                    if a.find("atom:name", ns) is not None
-                ])
-                
-                # Date
-                published_str = entry.find("atom:published", ns).text if entry.find("atom:published", ns) is not None else None
-                published = datetime.strptime(published_str, "%Y-%m-%dT%H:%M:%SZ") if published_str else datetime.now()
-                
-                # NEW: Extract arXiv ID from entry ID
-                entry_id_elem = entry.find("atom:id", ns)
-                arxiv_id = entry_id_elem.text.split("/abs/")[-1] if entry_id_elem is not None else None
-                
-                # NEW: Extract PDF URL
-                pdf_url = None
-                for link in entry.findall("atom:link", ns):
-                    if link.get("title") == "pdf":
-                        pdf_url = link.get("href")
-                        break
-                
-                # NEW: Extract DOI
-                doi = None
-                doi_elem = entry.find("atom:doi", ns)
-                if doi_elem is not None:
-                    doi = doi_elem.text
-                
-                # NEW: Extract categories
-                categories = ", ".join([
-                    cat.get("term")
-                    for cat in entry.findall("atom:category", ns)
-                    if cat.get("term") is not None
-                ])
-                
-                # NEW: Extract journal reference
-                journal_ref = None
-                journal_elem = entry.find("atom:journal_ref", ns)
-                if journal_elem is not None:
-                    journal_ref = journal_elem.text
-                
-                # NEW: Extract comment
-                comment = None
-                comment_elem = entry.find("atom:comment", ns)
-                if comment_elem is not None:
-                    comment = comment_elem.text
-
-                ai_summary = summarize_text(abstract)
-
-                papers.append({
-                    "type": "paper",
-                    "title": title,
-                    "abstract": abstract,
-                    "summary": ai_summary,
-                    "authors": authors,
-                    "date": published,
-                    "source": "arXiv",
-                    "domain": domain,
-                    # NEW fields
-                    "arxiv_id": arxiv_id,
-                    "pdf_url": pdf_url,
-                    "doi": doi,
-                    "categories": categories,
-                    "journal_ref": journal_ref,
-                    "comment": comment
-                })
-            
+            papers.extend(paging.wanted(page))
             start += fetch_size
-            time.sleep(1)
 
-        print(f"Fetched {len(papers)} papers for domain: {domain}")
-        all_papers.extend(papers)
+        if progress is not None:
+            progress[paging.key] = paging.state()
+        print(f"Fetched {len(papers)} papers for {query} ({', '.join(domains)})")
+        return papers
 
-    return all_papers
+    plan = plan_queries("arXiv", domains_list).values()
+    results = await asyncio.gather(*(fetch_query(query, domains) for query, domains in plan))
+    return [paper for papers in results for paper in papers]
 
 
-def fetch_google_patents(domains_list, max_results=50):
-    """Fetches patents from Google Patents with enhanced metadata."""
-    if not SERPAPI_KEY:
-        print("SERPAPI_KEY not set. Skipping patent fetching.")
-        return []
+def parse_patent(result):
+    """Maps one SerpAPI Google Patents result to an item dict."""
+    # Basic fields
+    title = result.get("title", "No title")
+    snippet = result.get("snippet", "")
+    patent_id = result.get("patent_id", "N/A")
+    
+    # Publication date
+    pub_date_str = result.get("publication_date", "")
+    try:
+        pub_date = datetime.strptime(pub_date_str, "%Y-%m-%d") if pub_date_str else None
+    except ValueError:
+        pub_date = None
+
+    # Inventors
+    inventors = result.get("inventors", [])
+    if isinstance(inventors, list):
+        authors = ", ".join([inv.get("name", "") for inv in inventors if isinstance(inv, dict)])
+    else:
+        authors = "N/A"
 
-    query_map = {
-        "AI": "artificial intelligence OR machine learning",
-        "Robotics": "robotics OR autonomous systems",
-        "Quantum Computing": "quantum computing OR quantum information",
-        "Genetics": "genetics OR genomics OR DNA",
-        "Cybersecurity": "cybersecurity OR network security OR encryption",
-        "Blockchain": "blockchain OR distributed ledger OR cryptocurrency"
+    # Classifications
+    classifications = result.get("classifications", {})
+    cpc_list = classifications.get("cpc", [])
+    cpc_str = ", ".join([c.get("code", "") for c in cpc_list if isinstance(c, dict)]) if cpc_list else "N/A"
+    
+    uspc_list = classifications.get("us", [])
+    uspc_str = ", ".join([u.get("code", "") for u in uspc_list if isinstance(u, dict)]) if uspc_list else "N/A"
+
+    # Abstract
+    abstract = f"{title}. {snippet}" if snippet else title
+
+    # NEW: Extract assignee (company/owner)
+    assignee = None
+    assignees = result.get("assignees", [])
+    if isinstance(assignees, list) and len(assignees) > 0:
+        assignee = assignees[0].get("name", "N/A") if isinstance(assignees[0], dict) else "N/A"
+    # Every assignee, for the item_assignees facet table
+    assignee_names = [a.get("name") for a in assignees if isinstance(a, dict) and a.get("name")] if isinstance(assignees, list) else []
+    
+    # NEW: Priority date
+    priority_date = parse_date(result.get("priority_date"))
+    
+    # NEW: Patent family ID
+    patent_family_id = result.get("family_id", "N/A")
+    
+    # NEW: PDF URL
+    patent_pdf_url = result.get("pdf", None)
+    
+    # NEW: Thumbnail
+    thumbnail_url = result.get("thumbnail", None)
+    
+    # NEW: Citation count
+    cited_by_count = None
+    cited_by = result.get("cited_by", {})
+    if isinstance(cited_by, dict):
+        cited_by_count = cited_by.get("total", 0)
+
+    return {
+        "type": "patent",
+        "title": title,
+        "abstract": abstract,
+        "summary": None,
+        "authors": authors if authors else "N/A",
+        "date": pub_date or datetime.now(),
+        # Undated patents are kept but must not move the watermark
+        "date_estimated": pub_date is None,
+        "source": "Google Patents",
+        "application_number": patent_id,
+        "application_status": result.get("status", "N/A"),
+        "publication_date": pub_date.date() if pub_date else None,
+        "uspc_classification": uspc_str,
+        "cpc_classifications": cpc_str,
+        # NEW fields
+        "assignee": assignee,
+        "assignees": assignee_names,
+        "priority_date": priority_date,
+        "patent_family_id": patent_family_id,
+        "patent_pdf_url": patent_pdf_url,
+        "thumbnail_url": thumbnail_url,
+        "cited_by_count": cited_by_count
     }
 
-    all_patents = []
-    base_url = "https://serpapi.com/search"
+
+async def fetch_patents_page(fetcher, query, domains, start, size):
+    """One page of a query's Google Patents results, newest first. Raises on HTTP errors."""
+    params = {
+        "engine": "google_patents",
+        "q": query,
+        "api_key": SERPAPI_KEY,
+        # Newest first, so paging can stop at the watermark
+        "sort": "new",
+        "start": start,
+        "num": size
+    }
+    with INGEST_STAGE_SECONDS.time(stage="fetch"):
+        response = await fetcher.get(SERPAPI_URL, params=params, service="serpapi")
+    response.raise_for_status()
+    with INGEST_STAGE_SECONDS.time(stage="parse"):
+        patents = [parse_patent(result) for result in response.json().get("organic_results", [])]
+    return tag_domains(patents, domains)
+
+
+async def fetch_google_patents(fetcher, domains_list, max_results=INGEST_MAX_RESULTS, watermarks=None, cutoff=None, progress=None):
+    """
+    Fetches patents from Google Patents with enhanced metadata, each
+    distinct query once and all of them concurrently, newest first. Paging
+    stops at the query's watermark (or at cutoff, for backfills); per-query
+    paging state goes into progress.
+    """
+    if not SERPAPI_KEY:
+        print("SERPAPI_KEY not set. Skipping patent fetching.")
+        return []
 
     for domain in domains_list:
-        query = query_map.get(domain)
-        if not query:
+        if domain not in PATENT_QUERIES:
             print(f"No query mapping for domain: {domain}. Skipping.")
-            continue
 
+    async def fetch_query(query, domains):
+        label = ", ".join(domains)
         patents = []
         page = 0
-        results_per_page = 20
+        paging = QueryProgress("Google Patents", query, watermarks or {}, max_results, cutoff)
         
-        while len(patents) < max_results:
-            params = {
-                "engine": "google_patents",
-                "q": query,
-                "api_key": SERPAPI_KEY,
-                "start": page * results_per_page,
-                "num": results_per_page
-            }
-
+        while not paging.done():
             try:
-                response = requests.get(base_url, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-
-                organic_results = data.get("organic_results", [])
-                
-                if not organic_results:
-                    print(f"No more results for domain: {domain}")
-                    break
-
-                for result in organic_results:
-                    if len(patents) >= max_results:
-                        break
-
-                    # Basic fields
-                    title = result.get("title", "No title")
-                    snippet = result.get("snippet", "")
-                    patent_id = result.get("patent_id", "N/A")
-                    
-                    # Publication date
-                    pub_date_str = result.get("publication_date", "")
-                    try:
-                        pub_date = datetime.strptime(pub_date_str, "%Y-%m-%d") if pub_date_str else datetime.now()
-                    except ValueError:
-                        pub_date = datetime.now()
-
-                    # Inventors
-                    inventors = result.get("inventors", [])
-                    if isinstance(inventors, list):
-                        authors = ", ".join([inv.get("name", "") for inv in inventors if isinstance(inv, dict)])
-                    else:
-                        authors = "N/A"
-
-                    # Classifications
-                    classifications = result.get("classifications", {})
-                    cpc_list = classifications.get("cpc", [])
-                    cpc_str = ", ".join([c.get("code", "") for c in cpc_list if isinstance(c, dict)]) if cpc_list else "N/A"
-                    
-                    uspc_list = classifications.get("us", [])
-                    uspc_str = ", ".join([u.get("code", "") for u in uspc_list if isinstance(u, dict)]) if uspc_list else "N/A"
-
-                    # Abstract
-                    abstract = f"{title}. {snippet}" if snippet else title
-                    ai_summary = summarize_text(abstract) if snippet else None
-
-                    # NEW: Extract assignee (company/owner)
-                    assignee = None
-                    assignees = result.get("assignees", [])
-                    if isinstance(assignees, list) and len(assignees) > 0:
-                        assignee = assignees[0].get("name", "N/A") if isinstance(assignees[0], dict) else "N/A"
-                    
-                    # NEW: Priority date
-                    priority_date = result.get("priority_date", "N/A")
-                    
-                    # NEW: Patent family ID
-                    patent_family_id = result.get("family_id", "N/A")
-                    
-                    # NEW: PDF URL
-                    patent_pdf_url = result.get("pdf", None)
-                    
-                    # NEW: Thumbnail
-                    thumbnail_url = result.get("thumbnail", None)
-                    
-                    # NEW: Citation count
-                    cited_by_count = None
-                    cited_by = result.get("cited_by", {})
-                    if isinstance(cited_by, dict):
-                        cited_by_count = cited_by.get("total", 0)
-
-                    patents.append({
-                        "type": "patent",
-                        "title": title,
-                        "abstract": abstract,
-                        "summary": ai_summary,
-                        "authors": authors if authors else "N/A",
-                        "date": pub_date,
-                        "source": "Google Patents",
-                        "domain": domain,
-                        "application_number": patent_id,
-                        "application_status": result.get("status", "N/A"),
-                        "publication_date": pub_date_str if pub_date_str else "N/A",
-                        "uspc_classification": uspc_str,
-                        "cpc_classifications": cpc_str,
-                        # NEW fields
-                        "assignee": assignee,
-                        "priority_date": priority_date,
-                        "patent_family_id": patent_family_id,
-                        "patent_pdf_url": patent_pdf_url,
-                        "thumbnail_url": thumbnail_url,
-                        "cited_by_count": cited_by_count
-                    })
-
-                page += 1
-                time.sleep(1)
-
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching patents for domain {domain}: {e}")
+                page_patents = await fetch_patents_page(fetcher, query, domains, page * PATENT_PAGE_SIZE, PATENT_PAGE_SIZE)
+            except httpx.HTTPError as e:
+                print(f"Error fetching patents for {label}: {e}")
                 break
             except Exception as e:
-                print(f"Unexpected error processing patents for domain {domain}: {e}")
+                print(f"Unexpected error processing patents for {label}: {e}")
                 break
 
-        print(f"Fetched {len(patents)} patents for domain: {domain}")
-        all_patents.extend(patents)
+            if not page_patents:
+                print(f"No more results for {label}")
+                paging.exhausted()
+                break
+
+            patents.extend(paging.wanted(page_patents))
+            page += 1
+
+        if progress is not None:
+            progress[paging.key] = paging.state()
+        print(f"Fetched {len(patents)} patents for {label}")
+        return patents
+
+    plan = plan_queries("Google Patents", domains_list).values()
+    results = await asyncio.gather(*(fetch_query(query, domains) for query, domains in plan))
+    return [patent for patents in results for patent in patents]
 
-    return all_patents
+
+async def fetch_all(domains_list, max_results=INGEST_MAX_RESULTS, cutoff=None):
+    """
+    Fetches both sources concurrently over one pooled, rate-limited client.
+    Without cutoff each query pages back to its watermark; with one it
+    backfills down to cutoff. Returns (items, progress); pass progress to
+    advance_watermarks once the items are stored.
+    """
+    watermarks = load_watermarks()
+    progress = {}
+    async with make_fetcher() as fetcher:
+        arxiv_papers, google_patents = await asyncio.gather(
+            fetch_arxiv(fetcher, domains_list, max_results, watermarks, cutoff, progress),
+            fetch_google_patents(fetcher, domains_list, max_results, watermarks, cutoff, progress),
+        )
+    print(f"Fetched {len(arxiv_papers)} papers from arXiv.")
+    print(f"Fetched {len(google_patents)} patents from Google Patents.")
+    return arxiv_papers + google_patents, progress
+
+
+def dedup_items(items):
+    """
+    Splits fetched items into new ones and duplicates of stored or earlier
+    batch items, before any NLP work runs. Duplicates are found by
+    normalized identity keys first (own id, DOI, versionless arXiv id,
+    patent family), then by MinHash LSH over title+abstract. Every lookup
+    is a chunked IN query over the whole batch. Returns (new_items,
+    duplicates); each duplicate is (item, canonical, reason), where
+    canonical is a stored item id or the new item it repeats. reason is
+    "own" for a stored item fetched again under its own id.
+    """
+    for it in items:
+        it["external_id"] = external_id_for(it)
+    keyed = [(it, identity_keys(it)) for it in items]
+
+    db = SessionLocal()
+    try:
+        all_keys = sorted({key for _, keys in keyed for key in keys})
+        stored = {}
+        for start in range(0, len(all_keys), INSERT_BATCH_SIZE):
+            chunk = all_keys[start:start + INSERT_BATCH_SIZE]
+            stored.update(db.execute(select(ItemAlias.alias, ItemAlias.item_id).where(ItemAlias.alias.in_(chunk))).all())
+
+        candidates, duplicates, claimed = [], [], {}
+        for it, keys in keyed:
+            match = next((stored[k] for k in keys if k in stored), None)
+            if match is None:
+                match = next((claimed[k] for k in keys if k in claimed), None)
+            if match is not None:
+                # keys[0] is the item's own (source, external_id)
+                duplicates.append((it, match, "own" if keys[0] in stored else "shared_id"))
+                continue
+            for key in keys:
+                claimed.setdefault(key, it)
+            candidates.append(it)
+
+        signatures = minhasher.signatures([item_text(it["title"], it["abstract"]) for it in candidates])
+        usable = minhasher.has_shingles(signatures)
+        band_keys = minhasher.band_keys(signatures)
+
+        bucket_members = defaultdict(list)
+        probe_keys = sorted(set(band_keys[usable].ravel().tolist()))
+        for start in range(0, len(probe_keys), INSERT_BATCH_SIZE):
+            chunk = probe_keys[start:start + INSERT_BATCH_SIZE]
+            for band_key, item_id in db.execute(
+                select(ItemLshBucket.band_key, ItemLshBucket.item_id).where(ItemLshBucket.band_key.in_(chunk))
+            ):
+                bucket_members[band_key].append(item_id)
+        stored_signatures = {}
+        member_ids = sorted({item_id for ids in bucket_members.values() for item_id in ids})
+        for start in range(0, len(member_ids), INSERT_BATCH_SIZE):
+            chunk = member_ids[start:start + INSERT_BATCH_SIZE]
+            for item_id, minhash in db.execute(
+                select(ItemSignature.item_id, ItemSignature.minhash).where(ItemSignature.item_id.in_(chunk))
+            ):
+                stored_signatures[item_id] = np.frombuffer(minhash, dtype=np.uint32)
+    finally:
+        db.close()
+
+    # Verify bucket collisions against full signatures, comparing with stored and earlier new items
+    new_items, merged_into = [], {}
+    batch_buckets = defaultdict(list)
+    for i, it in enumerate(candidates):
+        if not usable[i]:
+            new_items.append(it)
+            continue
+        keys = band_keys[i].tolist()
+        stored_ids = sorted({item_id for key in keys for item_id in bucket_members.get(key, ())} & stored_signatures.keys())
+        batch_ids = sorted({j for key in keys for j in batch_buckets.get(key, ())})
+        others = [stored_signatures[item_id] for item_id in stored_ids] + [signatures[j] for j in batch_ids]
+        if others:
+            similarity = minhasher.similarity(signatures[i], np.stack(others))
+            best = int(np.argmax(similarity))
+            if similarity[best] >= NEAR_DUPLICATE_THRESHOLD:
+                canonical = stored_ids[best] if best < len(stored_ids) else candidates[batch_ids[best - len(stored_ids)]]
+                duplicates.append((it, canonical, "near_duplicate"))
+                merged_into[id(it)] = canonical
+                continue
+        for key in keys:
+            batch_buckets[key].append(i)
+        new_items.append(it)
+
+    # A shared-id duplicate may point at a batch item that itself turned out to be a near-duplicate
+    resolved = []
+    for it, canonical, reason in duplicates:
+        while isinstance(canonical, dict) and id(canonical) in merged_into:
+            canonical = merged_into[id(canonical)]
+        resolved.append((it, canonical, reason))
+
+    print(f"{len(new_items)} of {len(items)} fetched items are new ({len(resolved)} duplicates)")
+    return new_items, resolved
+
+
+def summarize_items(items):
+    """Fills in AI summaries in batches; patents without a snippet (abstract is just the title) get none."""
+    todo = [it for it in items if not (it["type"] == "patent" and it["abstract"] == it["title"])]
+    for it, summary in zip(todo, summarize_many([it["abstract"] for it in todo])):
+        it["summary"] = summary
+    return items
+
+
+def train_domain_classifier():
+    """Learns per-domain centroids from every stored item and saves them for reuse."""
+    db = SessionLocal()
+    try:
+        stmt = (
+            select(Item.title, Item.abstract, Domain.name)
+            .join(Domain, Item.domain_id == Domain.id)
+            .execution_options(yield_per=2000)
+        )
+        rows = db.execute(stmt)
+        classifier = DomainClassifier().fit((f"{title}. {abstract or ''}", name) for title, abstract, name in rows)
+    finally:
+        db.close()
+    if classifier.is_fitted:
+        classifier.save(DOMAIN_CLASSIFIER_PATH)
+        print(f"Trained domain classifier on {len(classifier.labels)} domains")
+    return classifier
+
+
+def load_domain_classifier():
+    """Loads saved centroids, retraining once they are older than DOMAIN_CLASSIFIER_MAX_AGE_HOURS."""
+    if os.path.exists(DOMAIN_CLASSIFIER_PATH):
+        age_hours = (time.time() - os.path.getmtime(DOMAIN_CLASSIFIER_PATH)) / 3600
+        if age_hours < DOMAIN_CLASSIFIER_MAX_AGE_HOURS:
+            return DomainClassifier.load(DOMAIN_CLASSIFIER_PATH)
+    return train_domain_classifier()
+
+
+def classify_items(items, classifier):
+    """
+    Assigns each item its best-scoring domain, with a small prior towards the
+    domains whose query fetched it (cs.CR, for one, serves two domains).
+    Sets "domains" to that domain plus every other scoring above
+    CLASSIFIER_MULTILABEL_MIN_SCORE, and "domain_scores" to the top three.
+    Items keep their query's domains that the classifier has not been
+    trained on (the first as their primary domain), and all of them until
+    it has been trained on two domains.
+    """
+    # With one centroid every item scores high against it; there is nothing to choose between yet
+    if not classifier.is_fitted or len(classifier.labels) < 2 or not items:
+        return items
+    scores = classifier.scores([f"{it['title']}. {it['abstract'] or ''}" for it in items])
+    label_index = {label: j for j, label in enumerate(classifier.labels)}
+    for it, row in zip(items, scores):
+        query_domains = it.get("domains") or [it["domain"]]
+        boosted = row.copy()
+        for domain in query_domains:
+            if domain in label_index:
+                boosted[label_index[domain]] += CLASSIFIER_QUERY_PRIOR
+        if query_domains[0] in label_index:
+            it["domain"] = classifier.labels[int(np.argmax(boosted))]
+        else:
+            it["domain"] = query_domains[0]
+        it["domains"] = [it["domain"]] + [
+            label for label, score in zip(classifier.labels, row)
+            if score >= CLASSIFIER_MULTILABEL_MIN_SCORE and label != it["domain"]
+        ] + [
+            # The classifier has no centroid to judge these by yet
+            domain for domain in query_domains if domain not in label_index and domain != it["domain"]
+        ]
+        it["domain_scores"] = [
+            (classifier.labels[j], round(float(row[j]), 4)) for j in np.argsort(-row)[:3]
+        ]
+    return items
+
+
+def merge_duplicate_domains(duplicates):
+    """
+    A duplicate fetched by another query (a cross-listed paper, or the same
+    invention as a paper and a patent) adds that query's domains to the new
+    item it repeats, ahead of classification.
+    """
+    for it, canonical, _ in duplicates:
+        if isinstance(canonical, dict):
+            domains = canonical.setdefault("domains", [canonical["domain"]])
+            domains.extend(d for d in it.get("domains") or [it["domain"]] if d not in domains)
+
+
+def store_batch(items, classifier):
+    """
+    Runs fetched items through dedup, classification and summaries, then
+    stores them and links their duplicates. Returns insert_items' counts,
+    which carry an "error" key if nothing was stored.
+    """
+    with INGEST_STAGE_SECONDS.time(stage="dedup"):
+        new_items, duplicates = dedup_items(items)
+        merge_duplicate_domains(duplicates)
+    with INGEST_STAGE_SECONDS.time(stage="classify"):
+        # Duplicates of stored items are classified too: link_duplicates routes the stored item to their domains.
+        # A stored item fetched again is not; it was routed when first stored.
+        classify_items(new_items + [
+            it for it, canonical, reason in duplicates if not isinstance(canonical, dict) and reason != "own"
+        ], classifier)
+    with INGEST_STAGE_SECONDS.time(stage="summarize"):
+        summarize_items(new_items)
+    with INGEST_STAGE_SECONDS.time(stage="insert"):
+        counts = insert_items(new_items)
+        if "error" not in counts:
+            link_duplicates(duplicates)
+    for outcome in ("inserted", "updated", "skipped"):
+        INGEST_ITEMS.inc(counts[outcome], outcome=outcome)
+    INGEST_ITEMS.inc(len(duplicates), outcome="duplicate")
+    return counts
+
+
+DEFAULT_DOMAINS = ["AI", "Robotics", "Quantum Computing", "Genetics", "Cybersecurity", "Blockchain"]
+
+
+def ensure_domains():
+    """Returns every domain name, seeding DEFAULT_DOMAINS into an empty table first."""
+    db = SessionLocal()
+    try:
+        domains_list = [d.name for d in db.query(Domain).all()]
+        if not domains_list:
+            print("No domains found. Initializing with default domains...")
+            for domain_name in DEFAULT_DOMAINS:
+                get_domain_id(db, domain_name)
+            domains_list = [d.name for d in db.query(Domain).all()]
+        return domains_list
+    finally:
+        db.close()
 
 
 def get_domain_id(db, domain_name):
@@ -348,83 +1135,586 @@ def get_domain_id(db, domain_name):
     return new_domain.id
 
 
-def insert_items(items):
-    """Inserts items into database with deduplication."""
+# Columns copied verbatim from fetched item dicts into items
+ITEM_FIELDS = ["type", "title", "abstract", "summary", "authors", "date", "source"]
+# ...and into the item type's details table
+PAPER_FIELDS = ["arxiv_id", "pdf_url", "doi", "journal_ref", "categories", "comment"]
+PATENT_FIELDS = [
+    "application_number", "application_status", "publication_date", "uspc_classification",
+    "cpc_classifications", "assignee", "priority_date", "patent_family_id", "patent_pdf_url",
+    "thumbnail_url", "cited_by_count",
+]
+DETAIL_TABLES = {"paper": (PaperDetails, PAPER_FIELDS), "patent": (PatentDetails, PATENT_FIELDS)}
+DATE_FIELDS = {"publication_date", "priority_date"}
+# Refreshed on conflict when insert_items(update_existing=True)
+UPDATABLE_FIELDS = ["summary", "application_status", "cited_by_count", "journal_ref", "doi", "comment"]
+# Rows per INSERT statement; 500 x 11 columns stays under SQLite's and Postgres' bind limits
+INSERT_BATCH_SIZE = 500
+
+
+def detail_values(it, fields):
+    """A details-table row from an item dict (or legacy items row), with dates parsed."""
+    return {field: parse_date(it.get(field)) if field in DATE_FIELDS else it.get(field) for field in fields}
+
+
+def external_id_for(it):
+    """Stable per-source identity: arXiv id or patent number, else a hash of the text."""
+    external_id = it.get("arxiv_id") or it.get("application_number")
+    if external_id and external_id != "N/A":
+        return external_id
+    return content_key(it["title"], it.get("abstract"))
+
+
+def dialect_insert():
+    return postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+
+
+def register_items(db, item_ids, rows):
+    """
+    Indexes newly stored items for dedup: their identity keys as "own"
+    aliases, plus MinHash signatures and LSH bucket rows. Runs in the
+    caller's transaction, so the index never disagrees with items.
+    """
+    insert = dialect_insert()
+    aliases = [
+        {"alias": key, "item_id": item_id, "reason": "own"}
+        for item_id, row in zip(item_ids, rows) for key in identity_keys(row)
+    ]
+    signatures = minhasher.signatures([item_text(row["title"], row.get("abstract")) for row in rows])
+    usable = np.flatnonzero(minhasher.has_shingles(signatures))
+    band_keys = minhasher.band_keys(signatures)
+    minhashes = [{"item_id": item_ids[n], "minhash": signatures[n].tobytes()} for n in usable]
+    buckets = [{"band_key": key, "item_id": item_ids[n]} for n in usable for key in band_keys[n].tolist()]
+
+    for model, values, key in (
+        (ItemAlias, aliases, ["alias"]),
+        (ItemSignature, minhashes, ["item_id"]),
+        (ItemLshBucket, buckets, ["band_key", "item_id"]),
+    ):
+        for start in range(0, len(values), INSERT_BATCH_SIZE):
+            db.execute(insert(model).values(values[start:start + INSERT_BATCH_SIZE]).on_conflict_do_nothing(index_elements=key))
+
+
+def item_domain_names(it):
+    """Every domain an item dict is routed to, primary first."""
+    return [it["domain"]] + [d for d in it.get("domains") or () if d != it["domain"]]
+
+
+def add_item_domains(db, memberships):
+    """
+    Inserts (item_id, domain_id, date) memberships, skipping existing ones,
+    in the caller's transaction. Returns the (item_id, domain_id) pairs added.
+    """
+    insert = dialect_insert()
+    values = [{"item_id": item_id, "domain_id": domain_id, "date": date} for item_id, domain_id, date in memberships]
+    added = []
+    for start in range(0, len(values), INSERT_BATCH_SIZE):
+        stmt = insert(ItemDomain).values(values[start:start + INSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_nothing(index_elements=["item_id", "domain_id"])
+        added.extend(db.execute(stmt.returning(ItemDomain.item_id, ItemDomain.domain_id)).all())
+    return added
+
+
+def link_duplicates(duplicates):
+    """
+    Records each duplicate's identity keys as aliases of the item it
+    repeats, so later runs recognise it by key alone, and routes stored
+    items to their duplicates' domains. A stored item fetched again
+    ("own") only adds its aliases; its domains stay as they are. Call
+    after insert_items, which stores the new items some duplicates point at.
+    """
+    if not duplicates:
+        return 0
     db = SessionLocal()
     try:
-        inserted_count = 0
+        pending = sorted({f"{c['source']}:{external_id_for(c)}" for _, c, _ in duplicates if isinstance(c, dict)})
+        stored = {}
+        for start in range(0, len(pending), INSERT_BATCH_SIZE):
+            chunk = pending[start:start + INSERT_BATCH_SIZE]
+            stored.update(db.execute(select(ItemAlias.alias, ItemAlias.item_id).where(ItemAlias.alias.in_(chunk))).all())
+
+        aliases, routed = [], defaultdict(set)
+        for it, canonical, reason in duplicates:
+            if isinstance(canonical, dict):
+                canonical = stored.get(f"{canonical['source']}:{external_id_for(canonical)}")
+                if canonical is None:
+                    continue  # the item it repeats was not stored
+            elif reason != "own":
+                # New items got their duplicates' domains before insert_items
+                routed[canonical].update(item_domain_names(it))
+            aliases.extend({"alias": key, "item_id": canonical, "reason": reason} for key in identity_keys(it))
+
+        insert = dialect_insert()
+        for start in range(0, len(aliases), INSERT_BATCH_SIZE):
+            db.execute(insert(ItemAlias).values(aliases[start:start + INSERT_BATCH_SIZE]).on_conflict_do_nothing(index_elements=["alias"]))
+
+        domain_ids = resolve_domain_ids(db, {name for names in routed.values() for name in names})
+        item_ids = sorted(routed)
+        dates = {}
+        for start in range(0, len(item_ids), INSERT_BATCH_SIZE):
+            chunk = item_ids[start:start + INSERT_BATCH_SIZE]
+            dates.update(db.execute(select(Item.id, Item.date).where(Item.id.in_(chunk))).all())
+        added = add_item_domains(db, [
+            (item_id, domain_ids[name], dates[item_id])
+            for item_id, names in routed.items() if item_id in dates for name in sorted(names)
+        ])
+        update_facet_counts(db, [], added)
+        touched_domain_ids = {domain_id for _, domain_id in added}
+        db.commit()
+        invalidation_bus.publish("domain", sorted(touched_domain_ids))
+        print(f"Linked {len(duplicates)} duplicates to stored items")
+    except Exception as e:
+        db.rollback()
+        print("Error linking duplicates:", e)
+    finally:
+        db.close()
+    return len(duplicates)
+
+
+def backfill_dedup_index():
+    """Registers stored items that have no aliases yet, e.g. rows that predate the dedup index."""
+    fields = [
+        Item.id, Item.source, Item.external_id, Item.title, Item.abstract,
+        PaperDetails.doi, PaperDetails.arxiv_id, PatentDetails.patent_family_id,
+    ]
+    unregistered = ~select(ItemAlias.item_id).where(ItemAlias.item_id == Item.id).exists()
+    stmt = (
+        select(*fields)
+        .outerjoin(PaperDetails, PaperDetails.item_id == Item.id)
+        .outerjoin(PatentDetails, PatentDetails.item_id == Item.id)
+        .where(unregistered)
+        .order_by(Item.id)
+        .limit(INSERT_BATCH_SIZE)
+    )
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(stmt).all()
+            if not rows:
+                break
+            register_items(db, [r.id for r in rows], [r._asdict() for r in rows])
+            db.commit()
+            total += len(rows)
+    finally:
+        db.close()
+    if total:
+        print(f"Registered {total} stored items in the dedup index")
+    return total
+
+
+def resolve_domain_ids(db, domain_names):
+    """Maps domain names to ids in one query, creating any that are missing."""
+    names = set(domain_names)
+    domain_ids = dict(db.execute(select(Domain.name, Domain.id).where(Domain.name.in_(names))).all())
+    missing = [Domain(name=name) for name in names - domain_ids.keys()]
+    if missing:
+        db.add_all(missing)
+        db.flush()
+        domain_ids.update({d.name: d.id for d in missing})
+    return domain_ids
+
+
+def insert_items(items, update_existing=False):
+    """
+    Bulk-writes items with INSERT ... ON CONFLICT (source, external_id), in
+    batches of INSERT_BATCH_SIZE rows, plus a paper_details or patent_details
+    row each, and returns {"inserted": n, "skipped": m}. With update_existing,
+    conflicting rows get UPDATABLE_FIELDS refreshed and are counted as
+    "updated". New items' facet rows and facet_counts are written in the
+    same transaction.
+    """
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    new_ids, new_rows = [], []
+    new_cards = {}
+    db = SessionLocal()
+    try:
+        domain_ids = resolve_domain_ids(db, {name for it in items for name in item_domain_names(it)})
+
+        # ON CONFLICT cannot touch the same key twice in one statement, so dedupe the batch first
+        by_key = {}
         for it in items:
-            exists = db.query(Item).filter(Item.title == it["title"]).first()
-            if exists:
-                continue
-                
-            domain_id = get_domain_id(db, it["domain"])
-            item = Item(
-                type=it["type"],
-                title=it["title"],
-                abstract=it["abstract"],
-                summary=it["summary"],
-                authors=it["authors"],
-                date=it["date"],
-                source=it["source"],
-                domain_id=domain_id,
-                # Patent fields
-                application_number=it.get("application_number"),
-                application_status=it.get("application_status"),
-                publication_date=it.get("publication_date"),
-                uspc_classification=it.get("uspc_classification"),
-                cpc_classifications=it.get("cpc_classifications"),
-                assignee=it.get("assignee"),
-                priority_date=it.get("priority_date"),
-                patent_family_id=it.get("patent_family_id"),
-                patent_pdf_url=it.get("patent_pdf_url"),
-                thumbnail_url=it.get("thumbnail_url"),
-                cited_by_count=it.get("cited_by_count"),
-                # Paper fields
-                arxiv_id=it.get("arxiv_id"),
-                pdf_url=it.get("pdf_url"),
-                doi=it.get("doi"),
-                journal_ref=it.get("journal_ref"),
-                categories=it.get("categories"),
-                comment=it.get("comment")
+            row = {**it, "external_id": external_id_for(it), "domain_id": domain_ids[it["domain"]]}
+            by_key.setdefault((row["source"], row["external_id"]), row)
+        rows = list(by_key.values())
+        core_fields = ITEM_FIELDS + ["external_id", "domain_id"]
+
+        dialect = engine.dialect.name
+        insert = dialect_insert()
+        memberships = []
+        written_details = defaultdict(list)
+        def upsert(values):
+            stmt = insert(Item).values(values)
+            return stmt.on_conflict_do_update(
+                index_elements=["source", "external_id"],
+                set_={field: stmt.excluded[field] for field in UPDATABLE_FIELDS if field in ITEM_FIELDS},
             )
-            db.add(item)
-            inserted_count += 1
+
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            values = [{field: row.get(field) for field in core_fields} for row in rows[start:start + INSERT_BATCH_SIZE]]
+            if update_existing and dialect == "postgresql":
+                stmt = upsert(values)
+            else:
+                stmt = insert(Item).values(values).on_conflict_do_nothing(index_elements=["source", "external_id"])
+            # xmax = 0 marks a freshly inserted row (as opposed to an updated one) in Postgres
+            is_new = literal_column("xmax = 0") if dialect == "postgresql" else literal_column("1")
+            written = db.execute(stmt.returning(Item.id, Item.source, Item.external_id, Item.date, is_new)).all()
+            if update_existing and dialect != "postgresql":
+                # SQLite can't tell an upsert's inserted rows from its updated ones, so update the rest separately
+                fresh = {(source, external_id) for _, source, external_id, _, _ in written}
+                written += [
+                    (*row, False)
+                    for row in db.execute(upsert(values).returning(Item.id, Item.source, Item.external_id, Item.date))
+                    if (row.source, row.external_id) not in fresh
+                ]
+            for item_id, source, external_id, item_date, inserted in written:
+                counts["inserted" if inserted else "updated"] += 1
+                row = by_key[(source, external_id)]
+                memberships.extend((item_id, domain_ids[name], item_date) for name in item_domain_names(row))
+                if row["type"] in DETAIL_TABLES:
+                    written_details[row["type"]].append({"item_id": item_id, **detail_values(row, DETAIL_TABLES[row["type"]][1])})
+                if inserted:
+                    new_ids.append(item_id)
+                    new_rows.append(row)
+                    new_cards[item_id] = {
+                        "id": item_id, "type": row["type"], "title": row["title"], "date": item_date,
+                        "source": source, "domain_id": row["domain_id"],
+                    }
+        counts["skipped"] = len(items) - counts["inserted"] - counts["updated"]
+
+        for item_type, values in written_details.items():
+            model, fields = DETAIL_TABLES[item_type]
+            for start in range(0, len(values), INSERT_BATCH_SIZE):
+                stmt = insert(model).values(values[start:start + INSERT_BATCH_SIZE])
+                refreshed = {field: stmt.excluded[field] for field in UPDATABLE_FIELDS if field in fields}
+                if update_existing and refreshed:
+                    stmt = stmt.on_conflict_do_update(index_elements=["item_id"], set_=refreshed)
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=["item_id"])
+                db.execute(stmt)
+        added_memberships = add_item_domains(db, memberships)
+        touched_domain_ids = {domain_id for _, domain_id, _ in memberships}
+        register_items(db, new_ids, new_rows)
+        add_item_facets(db, new_ids, new_rows)
+        update_facet_counts(db, new_ids, added_memberships)
+
+        # Live /feed/{user_id}/stream notifications: each new item, once per domain it is in
+        cards_by_domain = defaultdict(list)
+        for item_id, domain_id, _ in memberships:
+            if item_id in new_cards:
+                cards_by_domain[domain_id].append(new_cards[item_id])
+        events = item_event_payloads(cards_by_domain)
+        if dialect == "postgresql":
+            notify_item_events(db, events)
         db.commit()
-        print(f"Inserted {inserted_count} new items successfully ✅")
+        # Drop cached feed pages for exactly the domains whose rows changed
+        invalidation_bus.publish("domain", sorted(touched_domain_ids))
+        if dialect != "postgresql":
+            item_event_log.append(events)
+        print(f"Inserted {counts['inserted']} new items, updated {counts['updated']}, skipped {counts['skipped']} ✅")
     except Exception as e:
         db.rollback()
         print("Error inserting items:", e)
+        counts["error"] = str(e)
+        new_ids, new_rows = [], []
     finally:
         db.close()
 
+    # Committed rows are already live; a failed append is repaired by the next backfill_item_vectors()
+    try:
+        item_vectors.append(new_ids, [item_text(r["title"], r["abstract"]) for r in new_rows])
+    except OSError as e:
+        print("Error appending item vectors:", e)
+    return counts
 
-if __name__ == "__main__":
-    Base.metadata.create_all(bind=engine)
-    
+
+def backfill_item_vectors():
+    """Embeds stored items that have no row in the vector index yet, e.g. rows that predate it."""
+    indexed = item_vectors.indexed_ids()
     db = SessionLocal()
-    domains_list = [d.name for d in db.query(Domain).all()]
-    if not domains_list:
-        print("No domains found. Initializing with default domains...")
-        default_domains = ["AI", "Robotics", "Quantum Computing", "Genetics", "Cybersecurity", "Blockchain"]
-        for domain_name in default_domains:
-            get_domain_id(db, domain_name)
+    try:
+        stored = np.asarray(db.execute(select(Item.id).order_by(Item.id)).scalars().all(), dtype=np.int64)
+        missing = stored[~np.isin(stored, indexed)].tolist()
+        for start in range(0, len(missing), INSERT_BATCH_SIZE):
+            chunk = missing[start:start + INSERT_BATCH_SIZE]
+            rows = db.execute(select(Item.id, Item.title, Item.abstract).where(Item.id.in_(chunk))).all()
+            item_vectors.append([r.id for r in rows], [item_text(r.title, r.abstract) for r in rows])
+    finally:
         db.close()
-        db = SessionLocal()
-        domains_list = [d.name for d in db.query(Domain).all()]
-        
-    print(f"Using domains: {domains_list}")
-    
-    print("\n--- Fetching arXiv Papers ---")
-    arxiv_papers = fetch_arxiv(domains_list, max_results=50)
-    print(f"Fetched {len(arxiv_papers)} papers from arXiv.")
+    if missing:
+        print(f"Embedded {len(missing)} items missing from the vector index")
+    return len(missing)
+
+
+# --- Facet Rollups ---
+# facet_counts.domain_id of the rows that count every item once, whatever its domains
+ALL_DOMAINS = 0
+
+
+def split_codes(value):
+    """The entries of a comma-joined categories or CPC string, without blanks, repeats and "N/A"."""
+    if not value:
+        return []
+    return list(dict.fromkeys(code.strip() for code in value.split(",") if code.strip() not in ("", "N/A")))
+
+
+def item_facet_rows(item_ids, rows):
+    """
+    item_categories, item_cpc_codes and item_assignees rows for item dicts,
+    or for details rows, whose assignee string holds only the first one.
+    """
+    values = {ItemCategory: [], ItemCpcCode: [], ItemAssignee: []}
+    for item_id, row in zip(item_ids, rows):
+        values[ItemCategory].extend({"item_id": item_id, "category": c} for c in split_codes(row.get("categories")))
+        values[ItemCpcCode].extend({"item_id": item_id, "code": c} for c in split_codes(row.get("cpc_classifications")))
+        names = row.get("assignees")
+        if names is None:
+            names = [row.get("assignee")]
+        names = dict.fromkeys(name.strip() for name in names if name and name.strip() not in ("", "N/A"))
+        values[ItemAssignee].extend({"item_id": item_id, "assignee": name} for name in names)
+    return values
+
+
+def add_item_facets(db, item_ids, rows):
+    """Writes the facet table rows of newly stored items, in the caller's transaction."""
+    insert = dialect_insert()
+    for model, values in item_facet_rows(item_ids, rows).items():
+        key = [c.name for c in model.__table__.primary_key.columns]
+        for start in range(0, len(values), INSERT_BATCH_SIZE):
+            db.execute(insert(model).values(values[start:start + INSERT_BATCH_SIZE]).on_conflict_do_nothing(index_elements=key))
+
+
+def month_bucket(column):
+    """A date's "YYYY-MM" month facet value, computed in SQL."""
+    if engine.dialect.name == "postgresql":
+        # Inlined rather than bound, so GROUP BY matches the selected expression
+        return func.to_char(column, literal_column("'YYYY-MM'"))
+    return func.strftime("%Y-%m", column)
+
+
+def facet_sources():
+    """Each facet's (item id, value) columns: items for type and month, the facet tables for the rest."""
+    return {
+        "type": (Item.id, Item.type),
+        "month": (Item.id, month_bucket(Item.date)),
+        "category": (ItemCategory.item_id, ItemCategory.category),
+        "cpc": (ItemCpcCode.item_id, ItemCpcCode.code),
+        "assignee": (ItemAssignee.item_id, ItemAssignee.assignee),
+    }
+
+
+def update_facet_counts(db, new_item_ids, memberships):
+    """
+    Counts new items under ALL_DOMAINS and new (item_id, domain_id)
+    memberships under their domain in facet_counts, in the caller's
+    transaction, so the rollup commits or rolls back with the rows it
+    counts. Write the items' facet rows first.
+    """
+    domains_of = defaultdict(list)
+    for item_id, domain_id in memberships:
+        domains_of[item_id].append(domain_id)
+    for item_id in new_item_ids:
+        domains_of[item_id].append(ALL_DOMAINS)
+    item_ids = sorted(domains_of)
+
+    increments = Counter()
+    for facet, (item_id_column, value_column) in facet_sources().items():
+        for start in range(0, len(item_ids), INSERT_BATCH_SIZE):
+            chunk = item_ids[start:start + INSERT_BATCH_SIZE]
+            stmt = select(item_id_column, value_column).where(item_id_column.in_(chunk), value_column.isnot(None))
+            for item_id, value in db.execute(stmt):
+                for domain_id in domains_of[item_id]:
+                    increments[(facet, domain_id, value)] += 1
+
+    # Sorted, so concurrent ingests lock shared rows in the same order and can't deadlock
+    values = [
+        {"facet": facet, "domain_id": domain_id, "value": value, "item_count": n}
+        for (facet, domain_id, value), n in sorted(increments.items())
+    ]
+    insert = dialect_insert()
+    for start in range(0, len(values), INSERT_BATCH_SIZE):
+        stmt = insert(FacetCount).values(values[start:start + INSERT_BATCH_SIZE])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["facet", "domain_id", "value"],
+            set_={"item_count": FacetCount.item_count + stmt.excluded.item_count},
+        ))
+
+
+def backfill_item_facets():
+    """Splits the categories, CPC and assignee strings of stored details rows into the facet tables."""
+    total = 0
+    db = SessionLocal()
+    try:
+        for model, fields in ((PaperDetails, ["categories"]), (PatentDetails, ["cpc_classifications", "assignee"])):
+            last_id = 0
+            while True:
+                rows = db.execute(
+                    select(model.item_id, *[getattr(model, f) for f in fields])
+                    .where(model.item_id > last_id).order_by(model.item_id).limit(INSERT_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].item_id
+                add_item_facets(db, [r.item_id for r in rows], [r._asdict() for r in rows])
+                total += len(rows)
+            db.commit()
+    finally:
+        db.close()
+    if total:
+        print(f"Split the categories, CPC codes and assignees of {total} items into facet tables")
+    return total
+
+
+def rebuild_facet_counts():
+    """Recomputes facet_counts from items, item_domains and the facet tables; returns its row count."""
+    columns = ["facet", "domain_id", "value", "item_count"]
+    insert = FacetCount.__table__.insert()
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            # Ingests wait to add their counts until the rebuilt ones are committed
+            conn.execute(text("LOCK TABLE facet_counts IN EXCLUSIVE MODE"))
+        conn.execute(FacetCount.__table__.delete())
+        for facet, (item_id_column, value_column) in facet_sources().items():
+            per_item = (
+                select(literal(facet), literal(ALL_DOMAINS), value_column, func.count())
+                .select_from(item_id_column.table)
+                .where(value_column.isnot(None))
+                .group_by(value_column)
+            )
+            per_domain = (
+                select(literal(facet), ItemDomain.domain_id, value_column, func.count())
+                .join_from(ItemDomain, item_id_column.table, item_id_column == ItemDomain.item_id)
+                .where(value_column.isnot(None))
+                .group_by(ItemDomain.domain_id, value_column)
+            )
+            conn.execute(insert.from_select(columns, per_item))
+            conn.execute(insert.from_select(columns, per_domain))
+        total = conn.scalar(select(func.count()).select_from(FacetCount))
+    print(f"Rebuilt {total} facet counts ✅")
+    return total
+
+
+# --- Ranking ---
+# Items read per round trip, and rescored per UPDATE batch, by refresh_rank_scores
+RANK_BATCH_SIZE = 10000
+
+
+def refresh_rank_scores():
+    """
+    Recomputes every item's "top" ranking score in one vectorized pass over
+    the table, normalizing citation counts per primary domain, and writes
+    back only the scores that moved: new memberships, refreshed citation
+    counts, and items whose domain statistics shifted. Each item's score is
+    written to all of its item_domains rows. Returns the number of items rescored.
+    """
+    memberships = (
+        select(
+            ItemDomain.item_id,
+            func.min(ItemDomain.rank_score).label("low"),
+            func.max(ItemDomain.rank_score).label("high"),
+            (func.count() - func.count(ItemDomain.rank_score)).label("unscored"),
+        )
+        .group_by(ItemDomain.item_id)
+        .subquery()
+    )
+    stmt = (
+        select(
+            Item.id, Item.date, Item.source, Item.domain_id, PatentDetails.cited_by_count,
+            memberships.c.low, memberships.c.high, memberships.c.unscored,
+        )
+        .join(memberships, memberships.c.item_id == Item.id)
+        .outerjoin(PatentDetails, PatentDetails.item_id == Item.id)
+    )
+    columns = defaultdict(list)
+    # Plain Core rows: no ORM bookkeeping per row
+    with engine.connect() as conn:
+        for rows in conn.execution_options(yield_per=RANK_BATCH_SIZE).execute(stmt).partitions():
+            ids, dates, sources, domain_ids, cited_by, low, high, unscored = zip(*rows)
+            columns["id"].append(np.asarray(ids, dtype=np.int64))
+            columns["date"].append(np.asarray(dates, dtype="datetime64[s]"))
+            columns["source"].append(np.asarray([RANK_SOURCE_WEIGHTS.get(s, 1.0) for s in sources], dtype=np.float64))
+            columns["domain"].append(np.asarray([-1 if d is None else d for d in domain_ids], dtype=np.int64))
+            for name, values in (("cited_by", cited_by), ("low", low), ("high", high)):
+                columns[name].append(np.asarray([np.nan if v is None else v for v in values], dtype=np.float64))
+            columns["unscored"].append(np.asarray(unscored, dtype=np.int64))
+    if not columns:
+        return 0
+    data = {name: np.concatenate(parts) for name, parts in columns.items()}
+
+    dates = data["date"]
+    epoch_days = np.where(np.isnat(dates), np.nan, dates.astype(np.int64) / 86400.0)
+    _, groups = np.unique(data["domain"], return_inverse=True)
+    scores = rank_scores(epoch_days, data["source"], data["cited_by"], groups)
+
+    undated = np.isnan(scores)
+    moved = (
+        (data["unscored"] > 0)
+        | ~(np.abs(scores - data["low"]) <= RANK_SCORE_TOLERANCE)
+        | ~(np.abs(scores - data["high"]) <= RANK_SCORE_TOLERANCE)
+    )
+    # Undated items never enter the "top" feed; only clear scores they somehow have
+    stale = np.flatnonzero(np.where(undated, ~np.isnan(data["high"]), moved))
+    if not len(stale):
+        return 0
+
+    set_score = (
+        update(ItemDomain)
+        .where(ItemDomain.item_id == bindparam("b_item_id"))
+        .values(rank_score=bindparam("b_rank_score"))
+    )
+    touched_domain_ids = set()
+    with engine.begin() as conn:
+        for start in range(0, len(stale), RANK_BATCH_SIZE):
+            chunk = stale[start:start + RANK_BATCH_SIZE]
+            item_ids = data["id"][chunk].tolist()
+            conn.execute(set_score, [
+                {"b_item_id": item_id, "b_rank_score": None if np.isnan(score) else score}
+                for item_id, score in zip(item_ids, scores[chunk].tolist())
+            ])
+            touched_domain_ids.update(conn.execute(
+                select(ItemDomain.domain_id).where(ItemDomain.item_id.in_(item_ids)).distinct()
+            ).scalars().all())
+        conn.execute(update(Domain).where(Domain.id.in_(touched_domain_ids)).values(ranked_at=datetime.now()))
+    invalidation_bus.publish("domain", sorted(touched_domain_ids))
+    print(f"Rescored {len(stale)} of {len(scores)} items in {len(touched_domain_ids)} domains ✅")
+    return len(stale)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch, dedup, classify, summarize and store new items.")
+    parser.add_argument("--backfill-until", type=datetime.fromisoformat, metavar="YYYY-MM-DD",
+                        help="ignore watermarks and page back to this date")
+    parser.add_argument("--max-results", type=int, default=INGEST_MAX_RESULTS,
+                        help="items per query on a first run (default %(default)s)")
+    parser.add_argument("--migrate", action="store_true", help="bring the schema up to date and exit")
+    parser.add_argument("--rank", action="store_true", help="refresh ranking scores and exit")
+    parser.add_argument("--facets", action="store_true", help="recompute the /facets counts from scratch and exit")
+    args = parser.parse_args()
+
+    ensure_schema()
+    if args.migrate:
+        raise SystemExit(0)
+    if args.rank:
+        refresh_rank_scores()
+        raise SystemExit(0)
+    if args.facets:
+        rebuild_facet_counts()
+        raise SystemExit(0)
+    backfill_item_vectors()
+    backfill_dedup_index()
     
-    print("\n--- Fetching Google Patents ---")
-    google_patents = fetch_google_patents(domains_list, max_results=50)
-    print(f"Fetched {len(google_patents)} patents from Google Patents.")
+    domains_list = ensure_domains()
+    print(f"Using domains: {domains_list}")
     
-    all_items = arxiv_papers + google_patents
-    print(f"\n--- Inserting {len(all_items)} total items into database ---")
-    insert_items(all_items)
+    print("\n--- Fetching arXiv Papers and Google Patents ---")
+    all_items, progress = asyncio.run(fetch_all(domains_list, args.max_results, args.backfill_until))
+
+    print(f"\n--- Deduplicating, classifying, summarizing and storing {len(all_items)} items ---")
+    counts = store_batch(all_items, load_domain_classifier())
+    # Leave watermarks alone if the items never landed, so the next run fetches them again
+    if "error" not in counts:
+        advance_watermarks(progress)
+    refresh_rank_scores()
+    report_ingest_metrics()
     
     print("\n✅ Data ingestion complete!")
\ No newline at end of file
@@ -0,0 +1,372 @@
+"""
+Long-running ingestion worker backed by the durable ingest_jobs table.
+
+    python ingest_worker.py enqueue                    # one incremental job per distinct source query
+    python ingest_worker.py enqueue --source arxiv --domain AI --backfill-until 2024-01-01
+    python ingest_worker.py enqueue --source arxiv --domain AI --start 500 --max-results 500
+    python ingest_worker.py list --status queued
+    python ingest_worker.py cancel 12 13
+    python ingest_worker.py run [--once]
+
+Domains whose queries are the same (cs.CR serves Cybersecurity and
+Blockchain) share one job; its items are routed to all of them. Workers
+refresh the "top" feed's ranking scores once the queue drains.
+
+Any number of workers can share one database. Each job is leased for
+INGEST_LEASE_SECONDS, and every page checkpoint renews the lease. If a
+worker dies, its lease lapses and the next worker resumes the job from the
+last checkpoint. A failed page is retried with exponential backoff until
+the job's max_attempts is reached. Source rate limits are per process, so
+divide ARXIV_REQUESTS_PER_SECOND and SERPAPI_REQUESTS_PER_SECOND by the
+number of workers.
+"""
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import asyncio
+import json
+import random
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from ingest import (
+    ARXIV_PAGE_SIZE, INGEST_MAX_RESULTS, INGEST_STAGE_SECONDS, PATENT_PAGE_SIZE, SERPAPI_KEY, SOURCE_QUERIES,
+    IngestJob, QueryProgress, SessionLocal, advance_watermarks, backfill_dedup_index, backfill_item_vectors,
+    engine, ensure_domains, ensure_schema, fetch_arxiv_page, fetch_patents_page, load_domain_classifier,
+    load_watermarks, make_fetcher, plan_queries, query_key, refresh_rank_scores, report_ingest_metrics, source_query,
+    store_batch,
+)
+
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "300"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "10"))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("INGEST_RETRY_BASE_SECONDS", "30"))
+INGEST_RETRY_MAX_SECONDS = float(os.getenv("INGEST_RETRY_MAX_SECONDS", "3600"))
+# Ranking scores are refreshed whenever the queue drains, and at most this often while it doesn't
+RANK_REFRESH_SECONDS = float(os.getenv("RANK_REFRESH_SECONDS", "300"))
+
+SOURCES = {"arxiv": "arXiv", "patents": "Google Patents"}
+ACTIVE_STATUSES = ("queued", "running")
+
+
+# --- Job Queue ---
+def enqueue_jobs(sources, domains, start_offset=0, max_results=None, cutoff=None, max_attempts=5):
+    """
+    Queues one job per distinct source query serving any of the domains,
+    skipping any identical job that is already active. Queries are planned
+    over every domain, so a job serves all domains that share its query.
+    """
+    now = datetime.now()
+    created = []
+    all_domains = ensure_domains()
+    db = SessionLocal()
+    try:
+        for source in sources:
+            for domain in domains:
+                if domain not in SOURCE_QUERIES[source]:
+                    print(f"No {source} query for domain {domain}; skipping")
+            for query, served in plan_queries(source, all_domains).values():
+                if not set(served) & set(domains):
+                    continue
+                label = ", ".join(served)
+                active = db.execute(select(IngestJob.id).where(
+                    IngestJob.source == source, IngestJob.query == query,
+                    IngestJob.start_offset == start_offset, IngestJob.max_results == max_results,
+                    IngestJob.cutoff == cutoff, IngestJob.status.in_(ACTIVE_STATUSES),
+                )).first()
+                if active:
+                    print(f"Job {active.id} for {source} / {label} is already active")
+                    continue
+                job = IngestJob(
+                    source=source, domain=label, query=query, start_offset=start_offset, max_results=max_results,
+                    cutoff=cutoff, status="queued", attempts=0, max_attempts=max_attempts,
+                    run_after=now, created_at=now, updated_at=now,
+                )
+                db.add(job)
+                db.flush()
+                created.append(job.id)
+        db.commit()
+    finally:
+        db.close()
+    return created
+
+
+def claim_job(worker_id):
+    """
+    Leases the next due job: queued, or running under a lease that has
+    lapsed. Returns the job row, or None if nothing is due.
+    """
+    now = datetime.now()
+    claimable = and_(
+        or_(IngestJob.status == "queued", and_(IngestJob.status == "running", IngestJob.lease_expires < now)),
+        IngestJob.run_after <= now,
+    )
+    # On Postgres, SKIP LOCKED lets concurrent workers take different rows instead of waiting on one;
+    # SQLite serializes writers, so the single UPDATE is already atomic there
+    next_id = (
+        select(IngestJob.id).where(claimable)
+        .order_by(IngestJob.run_after, IngestJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(IngestJob)
+        .where(IngestJob.id == next_id, claimable)
+        .values(
+            status="running", lease_owner=worker_id, attempts=IngestJob.attempts + 1, updated_at=now,
+            lease_expires=now + timedelta(seconds=INGEST_LEASE_SECONDS),
+        )
+        .returning(*IngestJob.__table__.columns)
+    )
+    with engine.begin() as conn:
+        return conn.execute(stmt).first()
+
+
+def _update_leased(job_id, worker_id, **values):
+    """Updates a job only while this worker still holds its lease; False if it was lost or cancelled."""
+    values["updated_at"] = datetime.now()
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(IngestJob)
+            .where(IngestJob.id == job_id, IngestJob.lease_owner == worker_id, IngestJob.status == "running")
+            .values(**values)
+        )
+    return result.rowcount == 1
+
+
+def save_checkpoint(job_id, worker_id, checkpoint):
+    return _update_leased(
+        job_id, worker_id, checkpoint=json.dumps(checkpoint),
+        lease_expires=datetime.now() + timedelta(seconds=INGEST_LEASE_SECONDS),
+    )
+
+
+def complete_job(job_id, worker_id):
+    return _update_leased(job_id, worker_id, status="done", lease_owner=None, lease_expires=None)
+
+
+def release_job(job_id, worker_id):
+    """Hands a job back on shutdown without counting the attempt."""
+    return _update_leased(
+        job_id, worker_id, status="queued", lease_owner=None, lease_expires=None,
+        attempts=IngestJob.attempts - 1,
+    )
+
+
+def fail_job(job, worker_id, error):
+    """Requeues the job with exponential backoff, or marks it failed once attempts run out."""
+    if job.attempts >= job.max_attempts:
+        print(f"Job {job.id} failed after {job.attempts} attempts: {error}")
+        return _update_leased(job.id, worker_id, status="failed", lease_owner=None, lease_expires=None,
+                              last_error=error)
+    delay = min(INGEST_RETRY_MAX_SECONDS, INGEST_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+    delay *= random.uniform(0.5, 1.0)
+    print(f"Job {job.id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+    return _update_leased(
+        job.id, worker_id, status="queued", lease_owner=None, lease_expires=None, last_error=error,
+        run_after=datetime.now() + timedelta(seconds=delay),
+    )
+
+
+def cancel_jobs(job_ids):
+    """Cancels queued or running jobs; a running job stops at its next checkpoint."""
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(IngestJob)
+            .where(IngestJob.id.in_(job_ids), IngestJob.status.in_(ACTIVE_STATUSES))
+            .values(status="cancelled", updated_at=datetime.now())
+        )
+    return result.rowcount
+
+
+def list_jobs(status=None, limit=50):
+    db = SessionLocal()
+    try:
+        stmt = select(IngestJob).order_by(IngestJob.id.desc()).limit(limit)
+        if status:
+            stmt = stmt.where(IngestJob.status == status)
+        return db.execute(stmt).scalars().all()
+    finally:
+        db.close()
+
+
+# --- Job Execution ---
+def job_query(job):
+    """
+    The job's query and the domains it serves under the current domain list
+    and query config. Jobs queued before query planning name one domain.
+    """
+    query = job.query or source_query(job.source, job.domain)
+    planned = plan_queries(job.source, ensure_domains()).get(query_key(query or ""))
+    if planned is None:
+        raise RuntimeError(f"No {job.source} query is configured for {job.query or job.domain} any more")
+    return planned
+
+
+def job_paging(job, query):
+    """Paging state for a job, resumed from its checkpoint; also returns the next result offset."""
+    # Only jobs that list from the top stop at (and later advance) the watermark
+    watermarks = load_watermarks() if job.start_offset == 0 and job.cutoff is None else {}
+    paging = QueryProgress(
+        job.source, query, watermarks, job.max_results or INGEST_MAX_RESULTS, job.cutoff,
+        catch_up=job.max_results is None,
+    )
+    offset = job.start_offset
+    if job.checkpoint:
+        checkpoint = json.loads(job.checkpoint)
+        paging.restore(checkpoint)
+        offset = checkpoint["offset"]
+    return paging, offset
+
+
+async def run_job(fetcher, job, worker_id, stop):
+    """
+    Fetches and stores a job's pages one at a time, checkpointing after
+    each committed page. Returns True once the job is finished, False if it
+    was interrupted by shutdown, cancellation or a lost lease.
+    """
+    query, domains = job_query(job)
+    paging, offset = job_paging(job, query)
+    classifier = load_domain_classifier()
+    print(f"Job {job.id}: {job.source} '{query}' for {', '.join(domains)} from offset {offset} (attempt {job.attempts})")
+
+    while not paging.done():
+        if stop.is_set():
+            return False
+        if job.source == "arXiv":
+            size = min(ARXIV_PAGE_SIZE, paging.max_results - paging.count)
+            page = await fetch_arxiv_page(fetcher, query, domains, offset, size)
+        else:
+            size = PATENT_PAGE_SIZE
+            page = await fetch_patents_page(fetcher, query, domains, offset, size)
+
+        if not page:
+            paging.exhausted()
+        else:
+            counts = store_batch(paging.wanted(page), classifier)
+            if "error" in counts:
+                raise RuntimeError(counts["error"])
+            offset += size
+
+        # A crash between the batch commit and this checkpoint replays one page, which dedup absorbs
+        if not save_checkpoint(job.id, worker_id, {"offset": offset, **paging.checkpoint()}):
+            print(f"Job {job.id} was cancelled or its lease was lost; stopping")
+            return False
+
+    if job.start_offset == 0:
+        advance_watermarks({paging.key: paging.state()})
+    return True
+
+
+async def run_worker(worker_id, once=False):
+    """Claims and runs jobs until stopped; with once, exits when no job is due."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C still interrupts, the lease just lapses
+
+    print(f"Worker {worker_id} started")
+    unranked, ranked_at = False, time.monotonic()
+    async with make_fetcher() as fetcher:
+        while not stop.is_set():
+            job = claim_job(worker_id)
+            if job is None:
+                if unranked:
+                    refresh_rank_scores()
+                    unranked, ranked_at = False, time.monotonic()
+                if once:
+                    break
+                try:
+                    await asyncio.wait_for(stop.wait(), INGEST_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if job.attempts > job.max_attempts:
+                # Re-leased after crashing workers too many times
+                fail_job(job, worker_id, job.last_error or "lease expired repeatedly")
+                continue
+            if job.source == "Google Patents" and not SERPAPI_KEY:
+                _update_leased(job.id, worker_id, status="failed", lease_owner=None, lease_expires=None,
+                               last_error="SERPAPI_KEY not set")
+                continue
+
+            stage_totals = INGEST_STAGE_SECONDS.totals()
+            try:
+                if await run_job(fetcher, job, worker_id, stop):
+                    complete_job(job.id, worker_id)
+                    print(f"Job {job.id} done")
+                elif stop.is_set():
+                    release_job(job.id, worker_id)
+            except Exception as e:
+                fail_job(job, worker_id, f"{type(e).__name__}: {e}")
+            # This job's timings only; the process totals are in the metrics file
+            report_ingest_metrics(since=stage_totals)
+            # Even a failed job may have stored some pages
+            unranked = True
+            if time.monotonic() - ranked_at >= RANK_REFRESH_SECONDS:
+                refresh_rank_scores()
+                unranked, ranked_at = False, time.monotonic()
+    print(f"Worker {worker_id} stopped")
+
+
+# --- CLI ---
+def print_jobs(jobs):
+    print(f"{'id':>5}  {'source':<14} {'domains':<26} {'status':<9} {'tries':>5}  {'offset':>6}  {'run_after':<19}  last_error")
+    for job in jobs:
+        checkpoint = json.loads(job.checkpoint) if job.checkpoint else {}
+        offset = checkpoint.get("offset", job.start_offset)
+        error = (job.last_error or "")[:60]
+        print(f"{job.id:>5}  {job.source:<14} {job.domain:<26} {job.status:<9} "
+              f"{job.attempts:>2}/{job.max_attempts:<2}  {offset:>6}  {job.run_after:%Y-%m-%d %H:%M:%S}  {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="queue jobs")
+    enqueue.add_argument("--source", choices=sorted(SOURCES), action="append", help="default: all sources")
+    enqueue.add_argument("--domain", action="append", help="default: every domain")
+    enqueue.add_argument("--start", type=int, default=0, help="result offset to start from")
+    enqueue.add_argument("--max-results", type=int, help="size of the page range (default: down to the watermark)")
+    enqueue.add_argument("--backfill-until", type=datetime.fromisoformat, metavar="YYYY-MM-DD")
+    enqueue.add_argument("--max-attempts", type=int, default=5)
+
+    listing = commands.add_parser("list", help="show recent jobs")
+    listing.add_argument("--status", choices=["queued", "running", "done", "failed", "cancelled"])
+    listing.add_argument("--limit", type=int, default=50)
+
+    cancel = commands.add_parser("cancel", help="cancel queued or running jobs")
+    cancel.add_argument("job_ids", type=int, nargs="+")
+
+    run = commands.add_parser("run", help="process jobs until stopped")
+    run.add_argument("--once", action="store_true", help="exit when no job is due")
+    run.add_argument("--worker-id", default=f"{socket.gethostname()}:{os.getpid()}")
+
+    args = parser.parse_args()
+    ensure_schema()
+
+    if args.command == "enqueue":
+        sources = [SOURCES[s] for s in (args.source or sorted(SOURCES))]
+        domains = args.domain or ensure_domains()
+        job_ids = enqueue_jobs(sources, domains, args.start, args.max_results, args.backfill_until, args.max_attempts)
+        print(f"Queued {len(job_ids)} jobs: {job_ids}")
+    elif args.command == "list":
+        print_jobs(list_jobs(args.status, args.limit))
+    elif args.command == "cancel":
+        print(f"Cancelled {cancel_jobs(args.job_ids)} jobs")
+    elif args.command == "run":
+        ensure_domains()
+        backfill_item_vectors()
+        backfill_dedup_index()
+        asyncio.run(run_worker(args.worker_id, args.once))
@@ -0,0 +1,304 @@
+import os
+import asyncio
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import orjson
+from sqlalchemy import func, make_url, select
+
+# Postgres channel that insert_items notifies and every API process listens on
+ITEM_EVENTS_CHANNEL = os.getenv("ITEM_EVENTS_CHANNEL", "innofeed_items")
+# Local stand-in for LISTEN/NOTIFY: an append-only log that ingest writes and API processes tail
+ITEM_EVENTS_LOG_PATH = os.getenv(
+    "ITEM_EVENTS_LOG_PATH",
+    os.path.join(tempfile.gettempdir(), "innofeed_item_events.log"),
+)
+# Ingest rotates the log to <path>.1 once it reaches this size; 0 never rotates
+ITEM_EVENTS_LOG_MAX_BYTES = int(os.getenv("ITEM_EVENTS_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+ITEM_EVENTS_POLL_SECONDS = float(os.getenv("ITEM_EVENTS_POLL_SECONDS", "0.5"))
+# A comment frame goes to idle connections this often, so proxies and clients keep them open
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Events buffered per connection; a client that falls this far behind is told to resync and dropped.
+# Frames are shared by every connection they go to, so a slot costs one pointer.
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "1024"))
+# Open streams per API process before new ones are refused with a 503
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "10000"))
+# Milliseconds EventSource waits before reconnecting
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "5000"))
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_PAYLOAD_BYTES = 7800
+
+HELLO_FRAME = f"retry: {SSE_RETRY_MS}\n\n".encode("ascii")
+HEARTBEAT_FRAME = b": keepalive\n\n"
+# Events may have been missed: refetch /feed with the last since_cursor
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+
+# --- Publishing (ingest side) ---
+def item_event_payloads(cards_by_domain: Dict[int, List[dict]]) -> List[bytes]:
+    """
+    Encodes new-item cards as JSON events of {"domain_id", "items"}, one or
+    more per domain, each small enough for a NOTIFY payload.
+    """
+    payloads = []
+    for domain_id, cards in sorted(cards_by_domain.items()):
+        head = b'{"domain_id":' + str(domain_id).encode("ascii") + b',"items":['
+        encoded = [orjson.dumps(card) for card in cards]
+        batch, size = [], len(head) + 2
+        for card in encoded:
+            if batch and size + len(card) + 1 > NOTIFY_MAX_PAYLOAD_BYTES:
+                payloads.append(head + b",".join(batch) + b"]}")
+                batch, size = [], len(head) + 2
+            batch.append(card)
+            size += len(card) + 1
+        if batch:
+            payloads.append(head + b",".join(batch) + b"]}")
+    return payloads
+
+
+def notify_item_events(db, payloads: Iterable[bytes]):
+    """Queues a NOTIFY per payload in db's transaction; Postgres delivers them on commit, or never on rollback."""
+    for payload in payloads:
+        db.execute(select(func.pg_notify(ITEM_EVENTS_CHANNEL, payload.decode("utf-8"))))
+
+
+class FileEventLog:
+    """
+    Local stand-in for LISTEN/NOTIFY, like FileInvalidationBus: publishers
+    append one payload per line, and each reader remembers how far it has
+    read. It rotates the same way, to <path>.1 at max_bytes, and readers
+    report the rotation so clients resync.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._inode, self._offset = self._stat()
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Tuple[Optional[int], int]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def append(self, payloads: Iterable[bytes]):
+        data = b"".join(payload + b"\n" for payload in payloads)
+        if not data:
+            return
+        if self.max_bytes and self._stat()[1] >= self.max_bytes:
+            try:
+                os.replace(self.path, f"{self.path}.1")
+            except FileNotFoundError:
+                pass
+        # O_APPEND keeps concurrent writers' lines from interleaving
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def poll(self) -> Optional[List[bytes]]:
+        """Returns payloads appended since the last call, or None if the log was rotated or truncated."""
+        inode, size = self._stat()
+        if inode == self._inode and size == self._offset:
+            return []
+        with self._lock:
+            if inode != self._inode and not (self._inode is None and self._offset == 0):
+                self._inode, self._offset = inode, size
+                return None
+            if size < self._offset:
+                self._offset = size
+                return None
+            self._inode = inode
+            try:
+                with open(self.path, "rb") as f:
+                    if os.fstat(f.fileno()).st_ino != inode:
+                        # Rotated since the stat; the next poll resets
+                        return []
+                    f.seek(self._offset)
+                    chunk = f.read(size - self._offset)
+            except FileNotFoundError:
+                return []
+            # Only consume complete lines; a partial write is picked up next time
+            end = chunk.rfind(b"\n") + 1
+            self._offset += end
+        return chunk[:end].splitlines()
+
+
+item_event_log = FileEventLog(ITEM_EVENTS_LOG_PATH, ITEM_EVENTS_LOG_MAX_BYTES)
+
+
+# --- Fan-out (API side) ---
+class Subscription:
+    """One SSE connection's pending frames; a plain list and an Event keep idle connections cheap."""
+
+    __slots__ = ("domain_ids", "frames", "wakeup", "overflowed")
+
+    def __init__(self, domain_ids: Iterable[int]):
+        self.domain_ids = tuple(domain_ids)
+        self.frames: List[bytes] = []
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+
+    def offer(self, frame: bytes, limit: int):
+        if self.overflowed:
+            return
+        if len(self.frames) >= limit:
+            # Don't buffer without bound for a client that isn't reading
+            self.overflowed = True
+            self.frames.clear()
+        else:
+            self.frames.append(frame)
+        self.wakeup.set()
+
+
+class ItemEventHub:
+    """
+    In-process pub/sub for one API process. Events arrive from the
+    process's single listener; each is encoded as an SSE frame once and
+    appended to the queue of every subscriber of its domain, so fan-out is
+    O(subscribers) and never waits on a client. A client whose queue fills
+    up is sent a resync event and disconnected.
+
+    Call publish, subscribe and unsubscribe from the event loop thread only.
+    """
+
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._by_domain: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def full(self) -> bool:
+        """True once max_subscribers streams are open; check before starting another."""
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self, domain_ids: Iterable[int]) -> Subscription:
+        subscription = Subscription(domain_ids)
+        self._subscribers.add(subscription)
+        for domain_id in subscription.domain_ids:
+            self._by_domain[domain_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        for domain_id in subscription.domain_ids:
+            subscribers = self._by_domain.get(domain_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_domain[domain_id]
+
+    def publish(self, payload: bytes):
+        """Fans one {"domain_id", "items"} payload out to that domain's subscribers."""
+        try:
+            domain_id = orjson.loads(payload)["domain_id"]
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            print(f"⚠️ Ignoring malformed item event: {payload[:80]!r}")
+            return
+        subscribers = self._by_domain.get(domain_id)
+        if not subscribers:
+            return
+        self.published += 1
+        frame = b"event: items\ndata: " + payload + b"\n\n"
+        for subscription in subscribers:
+            subscription.offer(frame, self.queue_size)
+
+    def broadcast(self, frame: bytes):
+        for subscription in self._subscribers:
+            subscription.offer(frame, self.queue_size)
+
+    def heartbeat(self):
+        """Queues a keepalive for every idle connection; busy ones are already sending."""
+        for subscription in self._subscribers:
+            if not subscription.frames:
+                subscription.offer(HEARTBEAT_FRAME, self.queue_size)
+
+    async def stream(self, domain_ids: Iterable[int]):
+        """
+        The SSE body for a subscription to domain_ids. It subscribes on the
+        first iteration and unsubscribes when closed, so a response that
+        never starts leaves nothing behind.
+        """
+        subscription = self.subscribe(domain_ids)
+        try:
+            yield HELLO_FRAME
+            while True:
+                await subscription.wakeup.wait()
+                subscription.wakeup.clear()
+                if subscription.overflowed:
+                    self.dropped += 1
+                    yield RESYNC_FRAME
+                    return
+                frames, subscription.frames = subscription.frames, []
+                yield b"".join(frames)
+        finally:
+            self.unsubscribe(subscription)
+
+
+item_event_hub = ItemEventHub(SSE_QUEUE_SIZE, SSE_MAX_SUBSCRIBERS)
+
+
+# --- Listener (one per API process) ---
+async def _listen_postgres(hub: ItemEventHub, database_url: str):
+    import asyncpg
+
+    dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+    connected_before = False
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _conn: lost.set())
+            await conn.add_listener(ITEM_EVENTS_CHANNEL, lambda _conn, _pid, _channel, payload: hub.publish(payload.encode("utf-8")))
+            if connected_before:
+                # Notifications sent while we were disconnected are gone
+                hub.broadcast(RESYNC_FRAME)
+            connected_before = True
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Notices a silently dropped connection
+                    await conn.execute("SELECT 1")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Item event listener lost its connection: {e}")
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(SSE_RETRY_MS / 1000)
+
+
+async def _listen_file(hub: ItemEventHub, log: FileEventLog):
+    while True:
+        payloads = log.poll()
+        if payloads is None:
+            hub.broadcast(RESYNC_FRAME)
+        else:
+            for payload in payloads:
+                hub.publish(payload)
+        await asyncio.sleep(ITEM_EVENTS_POLL_SECONDS)
+
+
+async def _send_heartbeats(hub: ItemEventHub):
+    while True:
+        await asyncio.sleep(SSE_HEARTBEAT_SECONDS)
+        hub.heartbeat()
+
+
+def start_item_event_listener(database_url: str, hub: ItemEventHub = item_event_hub) -> List[asyncio.Task]:
+    """Starts this process's listener (LISTEN on Postgres, the event log otherwise) and heartbeat; cancel the tasks to stop."""
+    if make_url(database_url).get_backend_name() == "postgresql":
+        listener = _listen_postgres(hub, database_url)
+    else:
+        listener = _listen_file(hub, item_event_log)
+    return [asyncio.create_task(listener), asyncio.create_task(_send_heartbeats(hub))]
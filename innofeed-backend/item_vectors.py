@@ -0,0 +1,205 @@
+import os
+import json
+import threading
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from extractive_summarizer import STOPWORDS, TOKEN
+
+# Directory holding the append-only vector files; ingest writes it, API workers memory-map it
+ITEM_VECTORS_DIR = os.getenv(
+    "ITEM_VECTORS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "item_vectors"),
+)
+# Only used when the directory is created; an existing index keeps the settings in its meta.json
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+LSH_TABLES = int(os.getenv("LSH_TABLES", "8"))
+LSH_BITS = int(os.getenv("LSH_BITS", "12"))
+LSH_SEED = 1729
+
+
+def item_text(title: Optional[str], abstract: Optional[str]) -> str:
+    return f"{title or ''}. {abstract or ''}"
+
+
+class ItemVectorStore:
+    """
+    Item embeddings in three parallel append-only files: vectors.f32
+    (rows x dim float32), codes.u16 (rows x tables LSH bucket codes) and
+    ids.i64 (one item id per row). ids.i64 is written last, so its length is
+    the number of complete rows; readers never see a half-written row.
+
+    Embeddings are signed feature hashes of an item's title and abstract,
+    so they need no training and stay comparable across runs. Lookups use
+    random-hyperplane LSH: each table buckets rows by LSH_BITS sign bits,
+    and a query probes its own bucket plus every bucket one bit away,
+    then ranks the candidates by exact cosine similarity.
+
+    Readers np.memmap the files read-only, so every API worker shares one
+    copy through the OS page cache. Only the per-table sort orders
+    (4 bytes per row per table) are private to each process. A single
+    writer (the ingest run) is assumed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._meta = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @property
+    def meta(self) -> dict:
+        if self._meta is None:
+            meta_path = self._path("meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            else:
+                meta = {"dim": EMBEDDING_DIM, "tables": LSH_TABLES, "bits": LSH_BITS, "seed": LSH_SEED}
+            rng = np.random.default_rng(meta["seed"])
+            self._planes = rng.standard_normal((meta["tables"] * meta["bits"], meta["dim"])).astype(np.float32)
+            self._meta = meta
+        return self._meta
+
+    # --- Embedding ---
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """L2-normalized signed-hash bag-of-words vectors, shape (texts, dim)."""
+        dim = self.meta["dim"]
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            for token in TOKEN.findall((text or "").lower()):
+                if token not in STOPWORDS:
+                    rows.append(row)
+                    hashes.append(zlib.crc32(token.encode("utf-8")))
+        hashes = np.asarray(hashes, dtype=np.int64)
+        # Low bits pick the column, the top bit picks the sign, so collisions cancel out in expectation
+        signs = np.where(hashes >> 31, -1.0, 1.0)
+        flat = np.asarray(rows, dtype=np.int64) * dim + hashes % dim
+        counts = np.bincount(flat, weights=signs, minlength=len(texts) * dim).reshape(len(texts), dim)
+        vectors = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def lsh_codes(self, vectors: np.ndarray) -> np.ndarray:
+        """One LSH_BITS-bit bucket code per table, shape (rows, tables)."""
+        meta = self.meta
+        bits = (vectors @ self._planes.T > 0).reshape(len(vectors), meta["tables"], meta["bits"])
+        return (bits * (1 << np.arange(meta["bits"]))).sum(axis=2).astype(np.uint16)
+
+    # --- Writing ---
+    def append(self, item_ids: Sequence[int], texts: Sequence[str]) -> int:
+        """Embeds and appends items; a re-appended id supersedes its earlier row."""
+        if not item_ids:
+            return 0
+        vectors = self.embed(texts)
+        codes = self.lsh_codes(vectors)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            meta_path = self._path("meta.json")
+            if not os.path.exists(meta_path):
+                with open(meta_path, "w") as f:
+                    json.dump(self.meta, f)
+            for name, data in (("vectors.f32", vectors), ("codes.u16", codes)):
+                with open(self._path(name), "ab") as f:
+                    f.write(np.ascontiguousarray(data).tobytes())
+            with open(self._path("ids.i64"), "ab") as f:
+                f.write(np.asarray(item_ids, dtype=np.int64).tobytes())
+        return len(item_ids)
+
+    def indexed_ids(self) -> np.ndarray:
+        snapshot = self._refresh()
+        return snapshot["id_sorted"] if snapshot else np.zeros(0, dtype=np.int64)
+
+    # --- Reading ---
+    def _refresh(self):
+        """Re-maps the files when the writer has appended rows since the last look."""
+        try:
+            n_rows = os.stat(self._path("ids.i64")).st_size // 8
+        except FileNotFoundError:
+            return None
+        if n_rows == 0:
+            return None
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot["n_rows"] == n_rows:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot["n_rows"] == n_rows:
+                return self._snapshot
+            if self._snapshot is None:
+                # Pick up the writer's meta.json in case it differs from this process's defaults
+                self._meta = None
+            meta = self.meta
+            # Plain ndarray views over the maps; np.memmap's subclass hooks cost more than the lookups
+            ids = np.memmap(self._path("ids.i64"), dtype=np.int64, mode="r", shape=(n_rows,)).view(np.ndarray)
+            vectors = np.memmap(
+                self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(n_rows, meta["dim"])
+            ).view(np.ndarray)
+            codes = np.memmap(
+                self._path("codes.u16"), dtype=np.uint16, mode="r", shape=(n_rows, meta["tables"])
+            ).view(np.ndarray)
+
+            # The latest row for each id wins; older rows are masked out of results
+            id_sorted, first_from_end = np.unique(ids[::-1], return_index=True)
+            id_rows = n_rows - 1 - first_from_end
+            live = np.zeros(n_rows, dtype=bool)
+            live[id_rows] = True
+
+            # Every table's buckets in one sorted array, keyed by (table << bits) | code
+            keys = ((np.arange(meta["tables"], dtype=np.uint32) << meta["bits"]) | codes).ravel()
+            order = np.argsort(keys, kind="stable")
+            self._snapshot = {
+                "n_rows": n_rows, "ids": ids, "vectors": vectors, "live": live,
+                "id_sorted": id_sorted, "id_rows": id_rows,
+                "bucket_keys": keys[order], "bucket_rows": (order // meta["tables"]).astype(np.int32),
+            }
+            return self._snapshot
+
+    def vector_for(self, item_id: int) -> Optional[np.ndarray]:
+        snapshot = self._refresh()
+        if snapshot is None:
+            return None
+        pos = np.searchsorted(snapshot["id_sorted"], item_id)
+        if pos == len(snapshot["id_sorted"]) or snapshot["id_sorted"][pos] != item_id:
+            return None
+        return np.asarray(snapshot["vectors"][snapshot["id_rows"][pos]])
+
+    def nearest(self, vector: np.ndarray, k: int, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Approximate k nearest items to vector by cosine similarity, best first."""
+        snapshot = self._refresh()
+        if snapshot is None or k <= 0:
+            return []
+        meta = self.meta
+        query_codes = self.lsh_codes(vector[None, :])[0]
+        # Multi-probe: the query's bucket plus each bucket at Hamming distance one, in every table
+        flips = np.concatenate(([0], 1 << np.arange(meta["bits"]))).astype(np.uint32)
+        tables = np.arange(meta["tables"], dtype=np.uint32) << meta["bits"]
+        probes = (tables[:, None] | (query_codes[:, None].astype(np.uint32) ^ flips)).ravel()
+        lo = np.searchsorted(snapshot["bucket_keys"], probes, side="left")
+        lengths = np.searchsorted(snapshot["bucket_keys"], probes, side="right") - lo
+        total = int(lengths.sum())
+        if not total:
+            return []
+
+        # Gather every probed range in one shot, then dedupe by sorting
+        offsets = np.repeat(lo - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+        rows = np.sort(snapshot["bucket_rows"][offsets])
+        rows = rows[np.concatenate(([True], rows[1:] != rows[:-1]))]
+        rows = rows[snapshot["live"][rows]]
+        if exclude_id is not None:
+            rows = rows[snapshot["ids"][rows] != exclude_id]
+        if not len(rows):
+            return []
+        scores = snapshot["vectors"][rows] @ vector
+        top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(snapshot["ids"][rows[i]]), float(scores[i])) for i in top]
+
+
+item_vectors = ItemVectorStore(ITEM_VECTORS_DIR)
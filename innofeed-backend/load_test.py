@@ -0,0 +1,172 @@
+"""
+Closed-loop HTTP load generator for the API: --concurrency clients, each
+on its own keep-alive connection, send their next request as soon as the
+previous one answers. After --duration seconds, throughput and latency
+percentiles are printed.
+
+    uvicorn main:app --port 8000
+    python load_test.py --path "/items/{id}" --ids 1-5000 --concurrency 200 --duration 20
+    python load_test.py --path "/search?q=robot" --path "/items/{id}" --ids 1-5000
+    python load_test.py --path "/feed/{user_id}" --email a@b.c --password pw --login-storm 50
+
+Paths are taken round-robin; "{id}" is replaced by a random id from --ids.
+With --email and --password the script logs in first, sends the token
+with every request and fills in "{user_id}". --login-storm adds that many
+clients that log in over and over while the paths are measured, to show
+what a burst of bcrypt work does to everyone else's latency.
+
+With sync endpoints, throughput flattens once concurrency reaches the
+threadpool size (40 by default) or the connection pool. With async
+endpoints, it keeps climbing until the pool (DB_POOL_SIZE +
+DB_MAX_OVERFLOW) or the database saturates.
+
+The client speaks just enough HTTP/1.1 for this API (Content-Length
+bodies only). A general-purpose client such as httpx costs more CPU per
+request than the endpoints do, and would measure itself.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from itertools import cycle
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def request(reader, writer, host, method, path, headers, body=b""):
+    """Sends one keep-alive request and reads the response; returns (status, retry_after, body)."""
+    head = [f"{method} {path} HTTP/1.1", f"Host: {host}", *headers]
+    if body:
+        head += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("ascii") + body)
+    response_head = await reader.readuntil(b"\r\n\r\n")
+    lines = response_head.decode("latin-1").split("\r\n")
+    length, retry_after = 0, 0.0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "retry-after":
+            retry_after = float(value)
+    return int(lines[0].split(" ", 2)[1]), retry_after, await reader.readexactly(length)
+
+
+async def client(host, port, next_request, deadline, latencies, statuses):
+    """Sends next_request() = (method, path, headers, body) back to back until the deadline."""
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        method, path, headers, body = next_request()
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            status, retry_after, _ = await request(reader, writer, host, method, path, headers, body)
+            statuses[status] += 1
+            if status == 503:
+                # Back off like a well-behaved client instead of hammering a busy server
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(retry_after)
+                continue
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            statuses[type(e).__name__] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+    if writer is not None:
+        writer.close()
+
+
+def report(label, latencies, statuses, elapsed, clients):
+    latencies.sort()
+    print(f"{label}: {len(latencies)} requests in {elapsed:.1f}s with {clients} clients: "
+          f"{len(latencies) / elapsed:.0f} req/s")
+    print(f"  latency ms  p50 {percentile(latencies, 0.5) * 1000:.1f}  p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}  max {(latencies[-1] if latencies else 0) * 1000:.1f}")
+    print("  status " + "  ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+
+
+async def login(host, port, credentials):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, _, body = await request(reader, writer, host, "POST", "/login", [], credentials)
+    finally:
+        writer.close()
+    if status != 200:
+        raise SystemExit(f"Login failed with {status}: {body.decode('utf-8', 'replace')}")
+    return json.loads(body)
+
+
+async def run(base_url, paths, ids, concurrency, duration, warmup, email=None, password=None, login_storm=0):
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    headers, user_id = [], ""
+    credentials = json.dumps({"email": email, "password": password}).encode("utf-8")
+    if email:
+        session = await login(host, port, credentials)
+        user_id = str(session["user_id"])
+        if session.get("token"):
+            headers = [f"Authorization: Bearer {session['token']}"]
+
+    def path_requests():
+        paths_cycle = cycle(paths)
+
+        def next_request():
+            path = next(paths_cycle).replace("{user_id}", user_id)
+            if ids:
+                path = path.replace("{id}", str(random.randint(*ids)))
+            return "GET", path, headers, b""
+        return next_request
+
+    def login_request():
+        return "POST", "/login", [], credentials
+
+    if warmup:
+        await asyncio.gather(*(
+            client(host, port, path_requests(), time.perf_counter() + warmup, [], Counter())
+            for _ in range(concurrency)
+        ))
+    latencies, statuses = [], Counter()
+    storm_latencies, storm_statuses = [], Counter()
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(host, port, path_requests(), started + duration, latencies, statuses) for _ in range(concurrency)),
+        *(client(host, port, login_request, started + duration, storm_latencies, storm_statuses)
+          for _ in range(login_storm)),
+    )
+    elapsed = time.perf_counter() - started
+
+    report("paths", latencies, statuses, elapsed, concurrency)
+    if login_storm:
+        report("login storm", storm_latencies, storm_statuses, elapsed, login_storm)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", action="append", help='request path, may contain "{id}" (repeatable)')
+    parser.add_argument("--ids", default=None, metavar="FIRST-LAST", help="range substituted for {id}")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured load first")
+    parser.add_argument("--email", help="log in as this user first")
+    parser.add_argument("--password")
+    parser.add_argument("--login-storm", type=int, default=0, metavar="N",
+                        help="clients logging in continuously while the paths are measured")
+    args = parser.parse_args()
+    if args.login_storm and not args.email:
+        parser.error("--login-storm needs --email and --password")
+
+    id_range = tuple(int(i) for i in args.ids.split("-")) if args.ids else None
+    asyncio.run(run(
+        args.base_url, args.path or ["/domains"], id_range, args.concurrency, args.duration, args.warmup,
+        args.email, args.password, args.login_storm,
+    ))
@@ -2,14 +2,27 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, Text, DateTime, ForeignKey, PrimaryKeyConstraint
-from sqlalchemy.orm import sessionmaker, declarative_base
+from contextlib import asynccontextmanager
+from sqlalchemy import Column, Integer, BigInteger, Float, Text, Date, DateTime, ForeignKey, PrimaryKeyConstraint, Index, UniqueConstraint, delete, func, select, tuple_, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.orm import declarative_base
 from urllib.parse import quote
-import bcrypt
+from datetime import datetime
+import base64
+import hashlib
+import orjson
+from auth import PasswordHasherBusy, issue_token, password_hasher, verify_token
+from feed_cache import feed_cache, normalize_domain_ids
+from search import build_search_query, encode_search_cursor, decode_search_cursor, search_terms
+from item_events import item_event_hub, start_item_event_listener
+from streaming import RecordStreamResponse, negotiate_stream_format, record_encoder, stream_records, MSGPACK, NDJSON
+from item_vectors import item_vectors, item_text
+from metrics import PROMETHEUS_CONTENT_TYPE, CheckoutTimingMixin, Gauge, MetricsMiddleware, instrument_engine, registry
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 # --- Database Configuration ---
 DB_USER = os.getenv("DB_USER")
@@ -18,30 +31,56 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-if not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
+# DATABASE_URL overrides the DB_* settings, e.g. sqlite:///innofeed.db for a local stand-in
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+if not DATABASE_URL and not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
     raise RuntimeError("Database environment variables are not fully set in .env file.")
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+if not DATABASE_URL:
+    DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+# Connections per API worker process; keep workers * (pool + overflow) under Postgres max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Compiled SQL per engine, and prepared statements per asyncpg connection
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
 
-# --- Security and Hashing with Direct bcrypt ---
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    try:
-        password_bytes = plain_password.encode('utf-8')[:72]
-        hash_bytes = hashed_password.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hash_bytes)
-    except Exception as e:
-        print(f"Password verification error: {e}")
-        return False
+def async_database_url(url: str):
+    """Swaps in the asyncio driver: asyncpg for Postgres, aiosqlite for the SQLite stand-in."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg").update_query_dict(
+            {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+        )
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+class TimedPool(CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    """The async engines' default pool, timing each checkout for /metrics and Server-Timing."""
 
-def get_password_hash(password: str) -> str:
-    password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+engine = create_async_engine(
+    async_database_url(DATABASE_URL),
+    poolclass=TimedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    query_cache_size=DB_STATEMENT_CACHE_SIZE,
+)
+instrument_engine(engine.sync_engine, "api")
+# Loaded objects stay readable after commit; nothing is lazy-loaded
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+Base = declarative_base()
+
+async def get_db():
+    """One session per request; a connection is only checked out on its first query."""
+    async with SessionLocal() as db:
+        yield db
 
 # --- Pydantic Models for API Validation ---
 class UserCreate(BaseModel):
@@ -68,39 +107,87 @@ class Domain(Base):
     __tablename__ = "domains"
     id = Column(Integer, primary_key=True)
     name = Column(Text, nullable=False)
+    # Last change to a ranking score in this domain; part of the "top" feed's ETag
+    ranked_at = Column(DateTime)
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        # Primary-domain listings, newest first
+        Index("ix_items_domain_date_id", "domain_id", "date", "id"),
+        Index("ix_items_domain_id_id", "domain_id", "id"),
+        # Serves type + date-range filters: WHERE type = ... AND date BETWEEN ...
+        Index("ix_items_type_date_id", "type", "date", "id"),
+        Index("uq_items_source_external_id", "source", "external_id", unique=True),
+    )
     id = Column(Integer, primary_key=True)
     type = Column(Text, nullable=False)
     title = Column(Text, nullable=False)
+    external_id = Column(Text)
     abstract = Column(Text)
     summary = Column(Text)
     authors = Column(Text)
     date = Column(DateTime)
     source = Column(Text)
     domain_id = Column(Integer, ForeignKey("domains.id"))
-    
-    # Patent-specific columns
+
+class ItemDomain(Base):
+    """Every domain an item is routed to; items.domain_id is only its primary one."""
+    __tablename__ = "item_domains"
+    __table_args__ = (
+        UniqueConstraint("item_id", "domain_id", name="uq_item_domains_item_domain"),
+        # Serves the keyset-paginated feed: WHERE domain_id IN (...) ORDER BY date DESC, item_id DESC
+        Index("ix_item_domains_domain_date_item", "domain_id", "date", "item_id"),
+        # Serves the feed ETag version stamp: max(id) per domain
+        Index("ix_item_domains_domain_id_id", "domain_id", "id"),
+        # Serves sort=top: WHERE domain_id IN (...) ORDER BY rank_score DESC, item_id DESC
+        Index("ix_item_domains_domain_rank_item", "domain_id", "rank_score", "item_id"),
+    )
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    domain_id = Column(Integer, ForeignKey("domains.id"), nullable=False)
+    # Copy of items.date, so the feed pages through this table alone
+    date = Column(DateTime)
+    # Precomputed by ingest.refresh_rank_scores, the same on each of an item's rows; NULL until then
+    rank_score = Column(Float)
+
+class PaperDetails(Base):
+    __tablename__ = "paper_details"
+    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
+    arxiv_id = Column(Text)
+    pdf_url = Column(Text)
+    doi = Column(Text)
+    journal_ref = Column(Text)
+    categories = Column(Text)
+    comment = Column(Text)
+
+class PatentDetails(Base):
+    __tablename__ = "patent_details"
+    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
     application_number = Column(Text)
     application_status = Column(Text)
-    publication_date = Column(Text)
+    publication_date = Column(Date)
     uspc_classification = Column(Text)
     cpc_classifications = Column(Text)
     assignee = Column(Text)
-    priority_date = Column(Text)
+    priority_date = Column(Date)
     patent_family_id = Column(Text)
     patent_pdf_url = Column(Text)
     thumbnail_url = Column(Text)
     cited_by_count = Column(Integer)
-    
-    # Paper-specific columns
-    arxiv_id = Column(Text)
-    pdf_url = Column(Text)
-    doi = Column(Text)
-    journal_ref = Column(Text)
-    categories = Column(Text)
-    comment = Column(Text)
+
+class FacetCount(Base):
+    """Items per facet value, per domain and under ALL_DOMAINS; kept current by ingest.insert_items."""
+    __tablename__ = "facet_counts"
+    __table_args__ = (
+        PrimaryKeyConstraint("facet", "domain_id", "value"),
+        # Serves top values: WHERE facet = ? AND domain_id = ? ORDER BY item_count DESC LIMIT n
+        Index("ix_facet_counts_facet_domain_count", "facet", "domain_id", "item_count"),
+    )
+    facet = Column(Text, nullable=False)
+    domain_id = Column(Integer, nullable=False)
+    value = Column(Text, nullable=False)
+    item_count = Column(BigInteger, nullable=False)
 
 class UserDomainPreference(Base):
     __tablename__ = "user_domain_preferences"
@@ -108,8 +195,265 @@ class UserDomainPreference(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     domain_id = Column(Integer, ForeignKey("domains.id"), nullable=False)
 
+# --- Feed Pagination Cursors ---
+FEED_DEFAULT_LIMIT = 50
+FEED_MAX_LIMIT = 200
+# sort=date pages newest first on (date, id); sort=top best first on (rank_score, id)
+FEED_SORT_KEYS = {"date": ItemDomain.date, "top": ItemDomain.rank_score}
+
+def encode_cursor(date: datetime, item_id: int) -> str:
+    """Encodes an item's (date, id) sort key as an opaque URL-safe cursor."""
+    raw = f"{date.isoformat()}|{item_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def feed_query(domain_ids, after=None, newer_than=None, limit: Optional[int] = None, sort: str = "date"):
+    """
+    Feed cards for items in any of the domains, keyset-paged on (sort key,
+    id) from the highest: newest first for sort=date, best-ranked first
+    (with their rank_score) for sort=top. The page of ids is picked from
+    item_domains alone, each item once however many of the domains it is
+    in; then the cards are joined.
+    """
+    sort_key = FEED_SORT_KEYS[sort]
+    page = (
+        select(sort_key, ItemDomain.item_id)
+        .where(ItemDomain.domain_id.in_(domain_ids), sort_key.isnot(None))
+        .distinct()
+    )
+    if after:
+        page = page.where(tuple_(sort_key, ItemDomain.item_id) < tuple_(*after))
+    if newer_than:
+        page = page.where(tuple_(sort_key, ItemDomain.item_id) > tuple_(*newer_than))
+    page = page.order_by(sort_key.desc(), ItemDomain.item_id.desc())
+    if limit is not None:
+        page = page.limit(limit)
+    page = page.subquery()
+    page_key = page.c[sort_key.key]
+    columns = FEED_COLUMNS + ((page_key,) if sort == "top" else ())
+    return (
+        select(*columns)
+        .join(page, page.c.item_id == Item.id)
+        .order_by(page_key.desc(), page.c.item_id.desc())
+    )
+
+def decode_cursor(cursor: str):
+    """Decodes a cursor produced by encode_cursor back into (date, id)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_str, item_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(date_str), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def feed_cursor(row, sort: str) -> str:
+    """The cursor continuing after a feed row in the given sort order."""
+    if sort == "top":
+        return encode_search_cursor(row.rank_score, row.id)
+    return encode_cursor(row.date, row.id)
+
+def decode_feed_cursor(cursor: str, sort: str):
+    """Decodes a feed_cursor back into its (sort key, id)."""
+    if sort == "top":
+        try:
+            return decode_search_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return decode_cursor(cursor)
+
+# --- Search ---
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# --- Related Items ---
+RELATED_DEFAULT_LIMIT = 10
+RELATED_MAX_LIMIT = 50
+# The vector index doesn't know item types, so fetch extra neighbours when filtering by one
+RELATED_TYPE_OVERSAMPLE = 5
+
+# --- Facets ---
+# facet_counts rows that count every item once, rather than once per domain
+ALL_DOMAINS = 0
+FACETS = ("type", "month", "category", "cpc", "assignee")
+# Facets answered with their most frequent values; month returns the latest months, type every value
+TOP_VALUE_FACETS = {"category", "cpc", "assignee"}
+FACET_DEFAULT_LIMIT = 20
+FACET_MAX_LIMIT = 200
+FACET_DEFAULT_MONTHS = 24
+FACET_MAX_MONTHS = 600
+
+def facet_query(facet: str, domain_ids, limit: int, months: int):
+    """(value, count) rows of one facet from facet_counts, summed over the domains."""
+    stmt = select(FacetCount.value).where(FacetCount.facet == facet)
+    if len(domain_ids) == 1:
+        # One domain (or ALL_DOMAINS) reads the rows it returns straight off an index
+        count = FacetCount.item_count
+        stmt = stmt.add_columns(count).where(FacetCount.domain_id == domain_ids[0])
+    else:
+        count = func.sum(FacetCount.item_count)
+        stmt = stmt.add_columns(count).where(FacetCount.domain_id.in_(domain_ids)).group_by(FacetCount.value)
+    if facet in TOP_VALUE_FACETS:
+        return stmt.order_by(count.desc()).limit(limit)
+    if facet == "month":
+        return stmt.order_by(FacetCount.value.desc()).limit(months)
+    return stmt.order_by(FacetCount.value)
+
+# --- Item Serialization ---
+# Columns the feed card renders; everything else is served by /items
+FEED_COLUMNS = (Item.id, Item.type, Item.title, Item.summary, Item.date, Item.domain_id, Item.source)
+ITEMS_BATCH_MAX = 100
+
+def json_response(payload, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Encodes with orjson directly, skipping FastAPI's jsonable_encoder pass."""
+    return Response(content=orjson.dumps(payload), status_code=status_code, headers=headers, media_type="application/json")
+
+def feed_page_response(user_id: int, page: bytes, headers: dict) -> Response:
+    """Prefixes a cached, user-independent page body with the caller's user_id."""
+    body = b'{"user_id":' + str(user_id).encode("ascii") + b"," + page[1:]
+    return Response(content=body, headers=headers, media_type="application/json")
+
+# --- Conditional Requests ---
+# Feeds change with every ingest run, so clients must revalidate each time;
+# the domain list is effectively static once seeded.
+FEED_CACHE_CONTROL = "private, no-cache"
+DOMAINS_CACHE_CONTROL = "public, max-age=300"
+# Facet counts are aggregates, so a minute-old copy is good enough
+FACETS_CACHE_CONTROL = "public, max-age=60"
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from a version stamp."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix is ignored."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def conditional_response(if_none_match: Optional[str], etag: str, cache_control: str, build) -> Response:
+    """Answers 304 when the client's copy is current, otherwise calls build(headers)."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return build(headers)
+
+# Full item rows: the narrow items row plus whichever details row matches its type
+ITEM_DETAIL_QUERY = (
+    select(Item, PaperDetails, PatentDetails)
+    .outerjoin(PaperDetails, PaperDetails.item_id == Item.id)
+    .outerjoin(PatentDetails, PatentDetails.item_id == Item.id)
+)
+
+# --- Streaming Responses ---
+# Sent with every streamed body: the same URL also answers with a JSON page
+STREAM_HEADERS = {"Vary": "Accept", "X-Content-Type-Options": "nosniff"}
+
+# Flat rows for /export: every item column except the search index, then the details columns
+EXPORT_COLUMNS = (
+    Item.id, Item.type, Item.title, Item.external_id, Item.authors, Item.date, Item.source, Item.domain_id,
+    Item.abstract, Item.summary,
+    *(c for c in PaperDetails.__table__.columns if c.key != "item_id"),
+    *(c for c in PatentDetails.__table__.columns if c.key != "item_id"),
+)
+
+def parse_domain_ids(domain_ids: Optional[str]) -> Optional[List[int]]:
+    """Parses a comma-separated domain_ids query parameter."""
+    if not domain_ids:
+        return None
+    try:
+        return [int(d) for d in domain_ids.split(",") if d.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="domain_ids must be comma-separated integers")
+
+def serialize_item(it: Item, paper: Optional[PaperDetails] = None, patent: Optional[PatentDetails] = None) -> dict:
+    """Full detail payload for a single paper or patent."""
+    # Base fields common to both papers and patents
+    item = {
+        "id": it.id,
+        "type": it.type,
+        "title": it.title,
+        "abstract": it.abstract,
+        "summary": it.summary,
+        "authors": it.authors,
+        "date": it.date.isoformat() if it.date else None,
+        "source": it.source,
+        "domain_id": it.domain_id,
+    }
+    
+    # Add paper-specific fields
+    if it.type == "paper" and paper:
+        item.update({
+            "arxiv_id": paper.arxiv_id,
+            "pdf_url": paper.pdf_url,
+            "doi": paper.doi,
+            "journal_ref": paper.journal_ref,
+            "categories": paper.categories,
+            "comment": paper.comment
+        })
+    
+    # Add patent-specific fields
+    elif it.type == "patent" and patent:
+        item.update({
+            "application_number": patent.application_number,
+            "application_status": patent.application_status,
+            "publication_date": patent.publication_date.isoformat() if patent.publication_date else None,
+            "uspc_classification": patent.uspc_classification,
+            "cpc_classifications": patent.cpc_classifications,
+            "assignee": patent.assignee,
+            "priority_date": patent.priority_date.isoformat() if patent.priority_date else None,
+            "patent_family_id": patent.patent_family_id,
+            "patent_pdf_url": patent.patent_pdf_url,
+            "thumbnail_url": patent.thumbnail_url,
+            "cited_by_count": patent.cited_by_count
+        })
+    
+    return item
+
+# --- Authentication ---
+# Clients retry a refused login after this many seconds
+PASSWORD_HASH_RETRY_AFTER = "1"
+
+def hashing_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Too many logins in progress, retry shortly",
+                         headers={"Retry-After": PASSWORD_HASH_RETRY_AFTER})
+
+def check_token(user_id: int, token: Optional[str]) -> int:
+    token_user_id = verify_token(token) if token else None
+    if token_user_id is None:
+        raise HTTPException(status_code=401, detail="Missing, invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    if token_user_id != user_id:
+        raise HTTPException(status_code=403, detail="Token does not belong to this user")
+    return user_id
+
+async def authorized_user(user_id: int, authorization: Optional[str] = Header(None)) -> int:
+    """Requires a bearer token from /login issued to the user_id in the path."""
+    scheme, _, token = (authorization or "").partition(" ")
+    return check_token(user_id, token if scheme.lower() == "bearer" else None)
+
+async def authorized_stream_user(
+    user_id: int,
+    authorization: Optional[str] = Header(None),
+    access_token: Optional[str] = Query(None),
+) -> int:
+    """Like authorized_user, but also takes the token as ?access_token=, since EventSource can't send headers."""
+    if access_token:
+        return check_token(user_id, access_token)
+    return await authorized_user(user_id, authorization)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    password_hasher.start()
+    listener_tasks = start_item_event_listener(DATABASE_URL)
+    yield
+    for task in listener_tasks:
+        task.cancel()
+    password_hasher.shutdown()
+    await engine.dispose()
+
 # Initialize the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS Middleware Configuration ---
 origins = [
@@ -124,142 +468,463 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read the Server-Timing breakdown of cross-origin calls
+    expose_headers=["Server-Timing"],
 )
+# Added last, so it is outermost and times everything inside it, CORS included
+app.add_middleware(MetricsMiddleware)
 
 # --- API Endpoints ---
 @app.get("/")
-def root():
+async def root():
     return {"message": "InnoFeed backend running"}
 
 @app.post("/register")
-def register_user(user_data: UserCreate):
-    db = SessionLocal()
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
+    if existing_user:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    # Release the connection while bcrypt runs
+    await db.close()
+
     try:
-        existing_user = db.query(User).filter(User.email == user_data.email).first()
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Email already registered")
-
-        hashed_password = get_password_hash(user_data.password)
-        new_user = User(
-            email=user_data.email, 
-            password_hash=hashed_password,
-            name=user_data.name
-        )
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        return {"message": "User registered successfully", "user_id": new_user.id}
-    finally:
-        db.close()
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordHasherBusy:
+        raise hashing_busy()
+    new_user = User(
+        email=user_data.email, 
+        password_hash=hashed_password,
+        name=user_data.name
+    )
+    db.add(new_user)
+    await db.commit()
+    return {"message": "User registered successfully", "user_id": new_user.id}
 
 @app.post("/login")
-def login_user(user_data: UserLogin):
-    db = SessionLocal()
+async def login_user(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == user_data.email))
+    # Release the connection while bcrypt runs
+    await db.close()
     try:
-        user = db.query(User).filter(User.email == user_data.email).first()
-        if not user or not verify_password(user_data.password, user.password_hash):
-            raise HTTPException(status_code=401, detail="Invalid email or password")
-        
-        return {
-            "message": "Login successful", 
-            "user_id": user.id,
-            "name": user.name or user.email.split('@')[0]  # Return name or email prefix
-        }
-    finally:
-        db.close()
+        valid = user is not None and await password_hasher.verify(user_data.password, user.password_hash)
+    except PasswordHasherBusy:
+        raise hashing_busy()
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    # Send as "Authorization: Bearer <token>" on per-user endpoints
+    token, expires = issue_token(user.id)
+    return {
+        "message": "Login successful", 
+        "user_id": user.id,
+        "name": user.name or user.email.split('@')[0],  # Return name or email prefix
+        "token": token,
+        "expires_at": expires,
+    }
 
 @app.post("/set-preferences/{user_id}")
-def set_preferences(user_id: int, preferences: UserPreferences):
-    db = SessionLocal()
-    try:
-        db.query(UserDomainPreference).filter(UserDomainPreference.user_id == user_id).delete()
-        
-        for domain_id in preferences.domain_ids:
-            preference = UserDomainPreference(user_id=user_id, domain_id=domain_id)
-            db.add(preference)
-        
-        db.commit()
-        return {"message": "Preferences saved successfully"}
-    finally:
-        db.close()
+async def set_preferences(
+    preferences: UserPreferences,
+    user_id: int = Depends(authorized_user),
+    db: AsyncSession = Depends(get_db),
+):
+    await db.execute(delete(UserDomainPreference).where(UserDomainPreference.user_id == user_id))
+    
+    for domain_id in preferences.domain_ids:
+        preference = UserDomainPreference(user_id=user_id, domain_id=domain_id)
+        db.add(preference)
+    
+    await db.commit()
+    feed_cache.invalidate_user(user_id)
+    return {"message": "Preferences saved successfully"}
 
 @app.get("/domains")
-def get_domains():
-    db = SessionLocal()
-    try:
-        domains = db.query(Domain).all()
-        return [{"id": d.id, "name": d.name} for d in domains]
-    finally:
-        db.close()
+async def get_domains(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    # Domains are only ever added, so (count, max id) identifies the list
+    count, max_id = (await db.execute(select(func.count(Domain.id), func.max(Domain.id)))).one()
+    etag = make_etag("domains", count, max_id)
+    headers = {"ETag": etag, "Cache-Control": DOMAINS_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    domains = (await db.execute(select(Domain.id, Domain.name))).all()
+    return json_response([{"id": d.id, "name": d.name} for d in domains], headers=headers)
 
 @app.get("/feed/{user_id}")
-def get_feed(user_id: int):
-    """Generates a personalized feed with ALL available fields"""
-    db = SessionLocal()
+async def get_feed(
+    user_id: int = Depends(authorized_user),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    sort: str = Query("date", pattern="^(date|top)$"),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Generates a personalized feed page of compact item cards.
+    Items are ordered newest first and paged with keyset cursors on (date, id):
+    pass `next_cursor` back as `cursor` for the following page, or the
+    `since_cursor` of a first page as `since` to receive only newer items.
+    Full paper/patent details are served by /items/{item_id}.
+    Responses carry a strong ETag; a matching If-None-Match gets a 304.
+    Requires the user's bearer token from /login.
+
+    With Accept: application/x-ndjson or application/msgpack, the cards
+    are streamed one per record instead, with no page size cap (`limit` is
+    optional), and a final record carries `next_cursor` and `since_cursor`.
+    Streams are neither cached nor ETagged.
+
+    With sort=top, items are ordered by a precomputed ranking score
+    (recency, citations and source, normalized per domain) instead, and
+    cards carry their `rank_score`. Items wait for the next ranking refresh
+    after ingestion before they appear there. `since` does not apply.
+    """
+    if since and sort != "date":
+        raise HTTPException(status_code=400, detail="since only applies to sort=date")
+    after = decode_feed_cursor(cursor, sort) if cursor else None
+    newer_than = decode_cursor(since) if since else None
+
+    def since_cursor(first):
+        # Only date order has newer items to poll for
+        if sort != "date":
+            return None
+        return encode_cursor(first.date, first.id) if first else since
+
+    stream_type = negotiate_stream_format(accept)
+    if stream_type is None:
+        limit = limit or FEED_DEFAULT_LIMIT
+        if limit > FEED_MAX_LIMIT:
+            raise HTTPException(
+                status_code=422,
+                detail=f"limit must be at most {FEED_MAX_LIMIT}; request {NDJSON} or {MSGPACK} to stream more",
+            )
+
+    # Pick up invalidations from ingest runs and other workers
+    feed_cache.sync()
+    domain_ids = feed_cache.get_user_domains(user_id)
+    if domain_ids is not None and stream_type is None:
+        # Cache hits return before the session checks out a connection
+        cached = feed_cache.get_page((domain_ids, limit, cursor, since, sort))
+        if cached is not None:
+            etag, page = cached
+            return conditional_response(if_none_match, etag, FEED_CACHE_CONTROL,
+                                        lambda headers: feed_page_response(user_id, page, headers))
+
     try:
-        user_domains = db.query(UserDomainPreference.domain_id).filter(
-            UserDomainPreference.user_id == user_id
-        ).all()
+        if domain_ids is None:
+            user_epoch = feed_cache.user_epoch()
+            user_domains = await db.scalars(
+                select(UserDomainPreference.domain_id).where(UserDomainPreference.user_id == user_id)
+            )
+            domain_ids = normalize_domain_ids(user_domains)
+            feed_cache.put_user_domains(user_id, domain_ids, user_epoch)
         
-        if not user_domains:
-            return {
+        if not domain_ids and stream_type:
+            empty = record_encoder(stream_type)({"next_cursor": None, "since_cursor": since})
+            return Response(content=empty, media_type=stream_type, headers=STREAM_HEADERS)
+        if not domain_ids:
+            return json_response({
                 "user_id": user_id, 
                 "feed": [], 
+                "next_cursor": None,
+                "since_cursor": since,
                 "message": "No domain preferences found for this user."
-            }
+            }, headers={"Cache-Control": FEED_CACHE_CONTROL})
         
-        domain_ids = [d[0] for d in user_domains]
+        if stream_type:
+            def trailer(first, last, has_more):
+                return {
+                    "next_cursor": feed_cursor(last, sort) if has_more else None,
+                    "since_cursor": since_cursor(first),
+                }
+            # Fetch one extra row to learn whether another page exists
+            stmt = feed_query(domain_ids, after, newer_than, limit + 1 if limit else None, sort)
+            return RecordStreamResponse(
+                stream_records(SessionLocal, stmt, stream_type, limit, trailer),
+                media_type=stream_type,
+                headers={**STREAM_HEADERS, "Cache-Control": FEED_CACHE_CONTROL},
+            )
+
+        # Pages are shared by every user with the same domain set
+        key = (domain_ids, limit, cursor, since, sort)
+        cached = feed_cache.get_page(key)
+        if cached is not None:
+            etag, page = cached
+            return conditional_response(if_none_match, etag, FEED_CACHE_CONTROL,
+                                        lambda headers: feed_page_response(user_id, page, headers))
+        generation = feed_cache.generation(domain_ids)
         
-        items_query = db.query(Item).filter(
-            Item.domain_id.in_(domain_ids)
-        ).order_by(Item.date.desc()).all()
+        # Version stamp: the newest membership in each domain, read from ix_item_domains_domain_id_id.
+        # It also moves when a stored item is routed to one more domain.
+        versions = (await db.execute(
+            select(ItemDomain.domain_id, func.max(ItemDomain.id))
+            .where(ItemDomain.domain_id.in_(domain_ids))
+            .group_by(ItemDomain.domain_id)
+            .order_by(ItemDomain.domain_id)
+        )).all()
+        if sort == "top":
+            # Ranking refreshes rescore stored items without adding memberships
+            versions += (await db.execute(
+                select(Domain.id, Domain.ranked_at).where(Domain.id.in_(domain_ids)).order_by(Domain.id)
+            )).all()
+        etag = make_etag("feed", key, [tuple(v) for v in versions])
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": FEED_CACHE_CONTROL})
+
+        # Fetch one extra row to learn whether another page exists
+        rows = (await db.execute(feed_query(domain_ids, after, newer_than, limit + 1, sort))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
-        feed = []
-        for it in items_query:
-            # Base fields common to both papers and patents
-            feed_item = {
-                "id": it.id,
-                "type": it.type,
-                "title": it.title,
-                "abstract": it.abstract,
-                "summary": it.summary,
-                "authors": it.authors,
-                "date": it.date.isoformat() if it.date else None,
-                "source": it.source,
-                "domain_id": it.domain_id,
-            }
-            
-            # Add paper-specific fields
-            if it.type == "paper":
-                feed_item.update({
-                    "arxiv_id": it.arxiv_id,
-                    "pdf_url": it.pdf_url,
-                    "doi": it.doi,
-                    "journal_ref": it.journal_ref,
-                    "categories": it.categories,
-                    "comment": it.comment
-                })
-            
-            # Add patent-specific fields
-            elif it.type == "patent":
-                feed_item.update({
-                    "application_number": it.application_number,
-                    "application_status": it.application_status,
-                    "publication_date": it.publication_date,
-                    "uspc_classification": it.uspc_classification,
-                    "cpc_classifications": it.cpc_classifications,
-                    "assignee": it.assignee,
-                    "priority_date": it.priority_date,
-                    "patent_family_id": it.patent_family_id,
-                    "patent_pdf_url": it.patent_pdf_url,
-                    "thumbnail_url": it.thumbnail_url,
-                    "cited_by_count": it.cited_by_count
-                })
-            
-            feed.append(feed_item)
+        # Plain rows, no ORM hydration; orjson renders the datetimes as ISO 8601
+        feed = [row._asdict() for row in rows]
         
-        return {"user_id": user_id, "feed": feed}
+        last, first = (rows[-1], rows[0]) if rows else (None, None)
+        page = orjson.dumps({
+            "feed": feed,
+            "next_cursor": feed_cursor(last, sort) if has_more else None,
+            "since_cursor": since_cursor(first),
+        })
+        feed_cache.put_page(key, etag, page, generation)
+        return feed_page_response(user_id, page, {"ETag": etag, "Cache-Control": FEED_CACHE_CONTROL})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB query failed: {e}")
-    finally:
-        db.close()
+
+# --- Live Updates ---
+# Clients reconnect after this many seconds when every stream slot is taken
+SSE_BUSY_RETRY_AFTER = "30"
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stops nginx from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+@app.get("/feed/{user_id}/stream")
+async def stream_feed_updates(
+    user_id: int = Depends(authorized_stream_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Server-Sent Events announcing items as they are ingested into the
+    user's domains: an `items` event per domain and batch, with data
+    {"domain_id", "items": [compact cards]}. An item in several of the
+    user's domains arrives once per domain; dedupe by id. A `resync` event
+    means events were missed (the client fell behind, or the server lost
+    its listener); refetch /feed with the last `since_cursor`, then
+    reconnect. Comment lines are heartbeats. The domains are read at
+    connect time, so reconnect after changing preferences.
+
+    Takes the bearer token as ?access_token= for EventSource clients.
+    """
+    feed_cache.sync()
+    domain_ids = feed_cache.get_user_domains(user_id)
+    if domain_ids is None:
+        user_epoch = feed_cache.user_epoch()
+        user_domains = await db.scalars(
+            select(UserDomainPreference.domain_id).where(UserDomainPreference.user_id == user_id)
+        )
+        domain_ids = normalize_domain_ids(user_domains)
+        feed_cache.put_user_domains(user_id, domain_ids, user_epoch)
+    # Idle streams must not hold pooled connections
+    await db.close()
+
+    if item_event_hub.full():
+        raise HTTPException(status_code=503, detail="Too many open streams, retry shortly",
+                            headers={"Retry-After": SSE_BUSY_RETRY_AFTER})
+    return RecordStreamResponse(
+        item_event_hub.stream(domain_ids), media_type="text/event-stream", headers=SSE_HEADERS,
+    )
+
+@app.get("/items")
+async def get_items(
+    ids: str = Query(..., description="Comma-separated item ids"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Returns full details for a batch of items, in the order requested."""
+    try:
+        item_ids = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(item_ids) > ITEMS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {ITEMS_BATCH_MAX} ids per request")
+
+    found = {row.Item.id: row for row in await db.execute(ITEM_DETAIL_QUERY.where(Item.id.in_(item_ids)))}
+    return json_response({"items": [serialize_item(*found[i]) for i in item_ids if i in found]})
+
+@app.get("/items/{item_id}")
+async def get_item(item_id: int, db: AsyncSession = Depends(get_db)):
+    """Returns the full paper or patent payload for one item."""
+    row = (await db.execute(ITEM_DETAIL_QUERY.where(Item.id == item_id))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return json_response(serialize_item(*row))
+
+@app.get("/items/{item_id}/related")
+async def get_related_items(
+    item_id: int,
+    limit: int = Query(RELATED_DEFAULT_LIMIT, ge=1, le=RELATED_MAX_LIMIT),
+    type: Optional[str] = Query(None, pattern="^(paper|patent)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns the items most similar to this one across both sources, as feed
+    cards with a cosine `similarity`, e.g. the papers closest to a patent
+    with type=paper. Items not yet in the vector index are embedded on the fly.
+    """
+    vector = item_vectors.vector_for(item_id)
+    if vector is None:
+        item = (await db.execute(select(Item.title, Item.abstract).where(Item.id == item_id))).first()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        vector = item_vectors.embed([item_text(item.title, item.abstract)])[0]
+
+    k = limit * RELATED_TYPE_OVERSAMPLE if type else limit
+    neighbours = item_vectors.nearest(vector, k, exclude_id=item_id)
+    stmt = select(*FEED_COLUMNS).where(Item.id.in_([i for i, _ in neighbours]))
+    if type:
+        stmt = stmt.where(Item.type == type)
+    cards = {row.id: row._asdict() for row in await db.execute(stmt)}
+
+    related = []
+    for neighbour_id, similarity in neighbours:
+        if neighbour_id in cards:
+            related.append({**cards[neighbour_id], "similarity": round(similarity, 4)})
+            if len(related) == limit:
+                break
+    return json_response({"item_id": item_id, "related": related})
+
+@app.get("/search")
+async def search_items(
+    q: str = Query(..., min_length=1, max_length=200),
+    domain_ids: Optional[str] = Query(None, description="Comma-separated domain ids"),
+    type: Optional[str] = Query(None, pattern="^(paper|patent)$"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Ranked full-text search over item titles, summaries and abstracts.
+    Title matches weigh most, then summary, then abstract. Results are
+    feed cards plus `rank` and a highlighted `snippet`; pass `next_cursor`
+    back as `cursor` (with the same query and filters) for the next page.
+    """
+    domain_filter = parse_domain_ids(domain_ids)
+    try:
+        after = decode_search_cursor(cursor) if cursor else None
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not search_terms(q):
+        # Nothing but punctuation: no index can match it, so skip the query
+        return json_response({"query": q, "results": [], "next_cursor": None})
+
+    stmt = build_search_query(
+        engine.dialect.name, Item, ItemDomain, FEED_COLUMNS, q,
+        domain_ids=domain_filter, item_type=type, date_from=date_from, date_to=date_to,
+        after=after, limit=limit,
+    )
+    rows = (await db.execute(stmt)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = []
+    for row in rows:
+        result = row._asdict()
+        result["rank"] = result.pop("score")
+        results.append(result)
+    last = rows[-1] if rows else None
+    return json_response({
+        "query": q,
+        "results": results,
+        "next_cursor": encode_search_cursor(last.score, last.id) if has_more else None,
+    })
+
+@app.get("/export")
+async def export_items(
+    domain_ids: Optional[str] = Query(None, description="Comma-separated domain ids"),
+    type: Optional[str] = Query(None, pattern="^(paper|patent)$"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    after_id: int = Query(0, ge=0),
+    accept: Optional[str] = Header(None),
+):
+    """
+    Streams every item matching the filters, with its paper or patent
+    details, in id order: NDJSON by default, MessagePack for Accept:
+    application/msgpack. Rows are read and written in batches, so memory use
+    stays constant however large the pull. To resume an interrupted pull,
+    pass the last id received as `after_id`.
+    """
+    domain_filter = parse_domain_ids(domain_ids)
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .outerjoin(PaperDetails, PaperDetails.item_id == Item.id)
+        .outerjoin(PatentDetails, PatentDetails.item_id == Item.id)
+        .where(Item.id > after_id)
+    )
+    if domain_filter:
+        stmt = stmt.where(Item.id.in_(select(ItemDomain.item_id).where(ItemDomain.domain_id.in_(domain_filter))))
+    if type:
+        stmt = stmt.where(Item.type == type)
+    if date_from:
+        stmt = stmt.where(Item.date >= date_from)
+    if date_to:
+        stmt = stmt.where(Item.date < date_to)
+    stream_type = negotiate_stream_format(accept) or NDJSON
+    return RecordStreamResponse(
+        stream_records(SessionLocal, stmt.order_by(Item.id), stream_type),
+        media_type=stream_type,
+        headers=STREAM_HEADERS,
+    )
+
+@app.get("/facets")
+async def get_facets(
+    domain_ids: Optional[str] = Query(None, description="Comma-separated domain ids"),
+    facet: Optional[str] = Query(None, description="Comma-separated facets: " + ", ".join(FACETS)),
+    limit: int = Query(FACET_DEFAULT_LIMIT, ge=1, le=FACET_MAX_LIMIT),
+    months: int = Query(FACET_DEFAULT_MONTHS, ge=1, le=FACET_MAX_MONTHS),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Item counts as [{"value", "count"}] lists per facet: the paper/patent
+    mix (type), items per month (the latest `months`, oldest first), and the
+    top `limit` arXiv categories, CPC codes and assignees. Without
+    domain_ids every item counts once; with them, counts add up over the
+    domains, so an item in two of them counts twice. Answered from the
+    facet_counts rollup, so the cost depends on the number of distinct
+    values, not of items.
+    """
+    facets = [f.strip() for f in facet.split(",") if f.strip()] if facet else list(FACETS)
+    unknown = [f for f in facets if f not in FACETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown facets: {', '.join(unknown)}")
+    domain_filter = parse_domain_ids(domain_ids)
+    scope = list(normalize_domain_ids(domain_filter)) if domain_filter else [ALL_DOMAINS]
+
+    result = {}
+    for name in facets:
+        rows = (await db.execute(facet_query(name, scope, limit, months))).all()
+        if name == "month":
+            rows.reverse()
+        result[name] = [{"value": value, "count": int(count)} for value, count in rows]
+    return json_response(
+        {"domain_ids": list(scope) if domain_filter else None, "facets": result},
+        headers={"Cache-Control": FACETS_CACHE_CONTROL},
+    )
+
+# --- Metrics ---
+Gauge("db_pool_checked_out_connections", "API connections currently checked out of this worker's pool",
+      lambda: engine.pool.checkedout())
+Gauge("sse_open_streams", "Open /feed/{user_id}/stream connections on this worker", lambda: len(item_event_hub))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    This worker's metrics in the Prometheus text format: request latency
+    per route, SQL statement counts and durations, and pool checkout time.
+    Each worker process keeps its own counts.
+    """
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+# Ingest runs and workers write their metrics here for node_exporter's textfile
+# collector (one file per process); unset, they only print their stage timings
+METRICS_TEXTFILE_PATH = os.getenv("METRICS_TEXTFILE_PATH")
+# Histogram buckets in seconds, from a point lookup up to a slow HF batch
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Metric Types ---
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    """This process's metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Replaces path atomically, so a collector never reads half a file."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _pairs(self, key: Tuple[str, ...]):
+        return list(zip(self.labelnames, key))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield "", self._pairs(key), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not yet cumulative) counts, the last one for +Inf, then the sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][slot] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) per label values."""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            pairs = self._pairs(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", pairs + [("le", _format_value(bound))], cumulative
+            yield "_sum", pairs, total
+            yield "_count", pairs, cumulative
+
+
+class Gauge(Metric):
+    """A value read at scrape time from function()."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def samples(self):
+        yield "", [], self.function()
+
+
+# --- Shared Metrics ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "API request latency by route template", ["method", "route", "status"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Time per SQL statement, from send to result", ["engine", "operation"],
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised", ["engine"])
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to get a pooled connection: waiting for a free one, opening a new one and the pre-ping",
+)
+EXTERNAL_REQUEST_SECONDS = Histogram(
+    "external_request_duration_seconds",
+    "Latency of calls to arXiv, SerpAPI and Hugging Face; each retry counts as a call",
+    ["service", "outcome"],
+)
+
+
+# --- Per-Request Timings ---
+# What a Server-Timing phase counts, singular and plural, for its description
+PHASE_UNITS = {"db": ("query", "queries"), "pool": ("checkout", "checkouts")}
+
+
+class RequestTimings:
+    """Time one request spent per phase ("db", "pool"), for its Server-Timing header."""
+
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases: Dict[str, list] = {}
+
+    def add(self, phase: str, seconds: float):
+        totals = self.phases.setdefault(phase, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+    def header(self, total_seconds: float) -> bytes:
+        entries = [f"app;dur={total_seconds * 1000:.1f}"]
+        entries.extend(
+            f'{phase};dur={seconds * 1000:.1f};desc="{count} {PHASE_UNITS.get(phase, ("call", "calls"))[count != 1]}"'
+            for phase, (seconds, count) in self.phases.items()
+        )
+        return ", ".join(entries).encode("ascii")
+
+
+current_request: ContextVar[Optional[RequestTimings]] = ContextVar("current_request", default=None)
+
+
+def record_phase(phase: str, seconds: float):
+    """Adds to the current request's Server-Timing phase; a no-op outside a request."""
+    timings = current_request.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+# --- Database Hooks ---
+SQL_OPERATIONS = {"select", "insert", "update", "delete"}
+
+
+def statement_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].lower() if words else ""
+    return operation if operation in SQL_OPERATIONS else "other"
+
+
+def instrument_engine(sync_engine, name: str):
+    """
+    Times every statement on sync_engine (an AsyncEngine's .sync_engine) into
+    db_query_duration_seconds and the current request's "db" phase.
+    """
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.observe(seconds, engine=name, operation=statement_operation(statement))
+        record_phase("db", seconds)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        DB_QUERY_ERRORS.inc(engine=name)
+
+
+class CheckoutTimingMixin:
+    """
+    Mix in ahead of a pool class to time every checkout into
+    db_pool_checkout_seconds and the current request's "pool" phase.
+    """
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            seconds = time.perf_counter() - start
+            DB_POOL_CHECKOUT_SECONDS.observe(seconds)
+            record_phase("pool", seconds)
+
+
+# --- HTTP Middleware ---
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (so streamed bodies pass straight through) that
+    times each request into http_request_duration_seconds by route
+    template, and sends a Server-Timing header with the time spent so far
+    in total, in SQL and waiting for the pool. Headers go out before a
+    streamed body, so for streams it covers the work up to the first byte.
+    Event streams stay out of the histogram: they last as long as the
+    client stays connected.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_request.set(timings)
+        start = time.perf_counter()
+        response = {"status": 500, "event_stream": False}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                for name, value in headers:
+                    if name.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                        response["event_stream"] = True
+                headers.append((b"server-timing", timings.header(time.perf_counter() - start)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            if not response["event_stream"]:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start, method=scope["method"], route=route, status=response["status"],
+                )
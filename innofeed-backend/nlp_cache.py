@@ -0,0 +1,73 @@
+import os
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+# Local on-disk store for inference results; survives across ingestion runs
+NLP_CACHE_PATH = os.getenv("NLP_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nlp_cache.sqlite3"))
+NLP_CACHE_MAX_BYTES = int(os.getenv("NLP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Evict down to this fraction of the limit so eviction doesn't run on every write
+EVICT_TARGET_RATIO = 0.9
+
+
+def make_key(model_url: str, parameters: dict, text: str) -> str:
+    """Content hash of everything that determines a model's output."""
+    material = json.dumps([model_url, parameters, text], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class InferenceCache:
+    """
+    Size-bounded persistent cache of model outputs, backed by SQLite.
+    Least recently used entries are evicted once the stored values exceed max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS inference_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_inference_cache_accessed ON inference_cache (accessed)")
+        self.current_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM inference_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM inference_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE inference_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        encoded = json.dumps(value, ensure_ascii=False)
+        size = len(encoded.encode("utf-8")) + len(key)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM inference_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO inference_cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, encoded, size, time.time()),
+            )
+            self.current_bytes += size - (old[0] if old else 0)
+            if self.current_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM inference_cache ORDER BY accessed"):
+            if self.current_bytes <= target:
+                break
+            doomed.append((key,))
+            self.current_bytes -= size
+        self._conn.executemany("DELETE FROM inference_cache WHERE key = ?", doomed)
+
+
+inference_cache = InferenceCache(NLP_CACHE_PATH, NLP_CACHE_MAX_BYTES)
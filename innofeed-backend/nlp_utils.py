@@ -3,59 +3,198 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 import requests
-from typing import List
+from requests.adapters import HTTPAdapter
+from typing import List, Optional
 import time
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from nlp_cache import inference_cache, make_key
+from metrics import EXTERNAL_REQUEST_SECONDS, Counter
+import extractive_summarizer
 
 # Get the Hugging Face API Key from the environment variables
 HF_API_KEY = os.getenv("HF_API_KEY")
+# "hf" (remote abstractive model, extractive fallback) or "extractive" (local only, no network)
+SUMMARIZER_BACKEND = os.getenv("SUMMARIZER_BACKEND", "hf")
+# Point at hf_stub_server.py (e.g. http://127.0.0.1:8089) for local runs
+HF_API_BASE = os.getenv("HF_API_BASE", "https://api-inference.huggingface.co")
+
+# Batch API tuning: texts per request, requests in flight, per-request timeout
+HF_BATCH_SIZE = int(os.getenv("HF_BATCH_SIZE", "8"))
+HF_MAX_CONCURRENCY = int(os.getenv("HF_MAX_CONCURRENCY", "4"))
+HF_BATCH_TIMEOUT = float(os.getenv("HF_BATCH_TIMEOUT", "60"))
 
 # Working models confirmed on Hugging Face Inference API (November 2024)
 # Philipp Schmid model for summarization - actively maintained
 # MoritzLaurer model for zero-shot classification - top rated and active
-API_URL_SUMMARIZATION = "https://api-inference.huggingface.co/models/Falconsai/text_summarization"
-API_URL_CLASSIFICATION = "https://api-inference.huggingface.co/models/MoritzLaurer/deberta-v3-large-zeroshot-v2.0"
+API_URL_SUMMARIZATION = f"{HF_API_BASE}/models/Falconsai/text_summarization"
+API_URL_CLASSIFICATION = f"{HF_API_BASE}/models/MoritzLaurer/deberta-v3-large-zeroshot-v2.0"
+
+SUMMARIZATION_PARAMETERS = {"max_length": 150, "min_length": 30, "do_sample": False}
+# Input truncation (T5 and DeBERTa have token limits)
+SUMMARIZATION_MAX_CHARS = 800
+CLASSIFICATION_MAX_CHARS = 1000
+
+# --- Shared Session, Circuit Breakers and Latency Tracking ---
+# Rate limiting and every 5xx mean the endpoint is overloaded or down rather than that the input is bad
+def is_breaker_failure(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive 429/5xx responses or timeouts,
+    failing calls fast for `reset_timeout` seconds before letting one trial through.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: this caller is the trial, everyone else waits another period
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyRecorder:
+    """Keeps a rolling window of per-endpoint call latencies plus outcome counts."""
+
+    def __init__(self, max_samples: int = 10000):
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._outcomes = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, outcome):
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+            self._outcomes[endpoint][str(outcome)] += 1
+
+    def summary(self) -> dict:
+        stats = {}
+        with self._lock:
+            for endpoint, samples in self._samples.items():
+                ordered = sorted(samples)
+                stats[endpoint] = {
+                    "calls": sum(self._outcomes[endpoint].values()),
+                    "outcomes": dict(self._outcomes[endpoint]),
+                    "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                    "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 1),
+                    "max_ms": round(ordered[-1] * 1000, 1),
+                }
+        return stats
+
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=HF_MAX_CONCURRENCY))
+_session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=HF_MAX_CONCURRENCY))
+
+breakers = {
+    API_URL_SUMMARIZATION: CircuitBreaker(),
+    API_URL_CLASSIFICATION: CircuitBreaker(),
+}
+latency = LatencyRecorder()
+# Texts answered locally (extractive summary, first category) instead of by the API
+HF_FALLBACKS = Counter(
+    "hf_fallbacks_total", "Texts the Hugging Face API did not answer, by task and whether an API key was set",
+    ["task", "reason"],
+)
+
+
+def count_fallbacks(task: str, n: int = 1):
+    if n:
+        HF_FALLBACKS.inc(n, task=task, reason="failed" if HF_API_KEY else "no_api_key")
+
+
+def _post(url: str, payload: dict, timeout: float) -> requests.Response:
+    """POSTs over the pooled session, recording latency and feeding the endpoint's breaker."""
+    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
+    start = time.perf_counter()
+    try:
+        response = _session.post(url, headers=headers, json=payload, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        latency.record(url, time.perf_counter() - start, type(e).__name__)
+        EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - start, service="huggingface", outcome=type(e).__name__)
+        breakers[url].record_failure()
+        raise
+    latency.record(url, time.perf_counter() - start, response.status_code)
+    EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - start, service="huggingface", outcome=response.status_code)
+    if is_breaker_failure(response.status_code):
+        breakers[url].record_failure()
+    elif 200 <= response.status_code < 300:
+        # Other 4xx say nothing about the endpoint's health, so they leave the breaker as it is
+        breakers[url].record_success()
+    return response
+
+
+def _fallback_summary(text: str) -> str:
+    """Offline extractive summary, used whenever the remote model can't answer."""
+    count_fallbacks("summarization")
+    return extractive_summarizer.summarize_many([text])[0]
+
 
 def summarize_text(text: str) -> str:
     """
     Generates an abstractive summary using Hugging Face's Inference API.
     Model: Falconsai/text_summarization (T5-based, actively maintained)
-    Fallback: Returns truncated text if API unavailable
+    Fallback: Local extractive summary if API unavailable
+    Successful results are cached on disk, keyed by model, parameters and input.
     """
     if not text or len(text.strip()) == 0:
         return "No content available"
+
+    if SUMMARIZER_BACKEND != "hf":
+        return summarize_many([text])[0]
     
     # If no API key, use fallback
     if not HF_API_KEY:
-        return text.strip()[:200] + "..."
+        return _fallback_summary(text)
 
-    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
-    
     # Truncate text (T5 models have token limits)
-    max_length = 800
-    truncated_text = text[:max_length] if len(text) > max_length else text
+    truncated_text = text[:SUMMARIZATION_MAX_CHARS]
     
     payload = {
         "inputs": truncated_text,
-        "parameters": {
-            "max_length": 150,
-            "min_length": 30,
-            "do_sample": False
-        },
+        "parameters": SUMMARIZATION_PARAMETERS,
         "options": {
             "wait_for_model": True,
             "use_cache": True
         }
     }
 
+    cache_key = make_key(API_URL_SUMMARIZATION, payload["parameters"], truncated_text)
+    cached = inference_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Fail fast while the endpoint is known to be overloaded
+    if not breakers[API_URL_SUMMARIZATION].allow():
+        return _fallback_summary(text)
+
     max_retries = 2
     for attempt in range(max_retries):
         try:
-            response = requests.post(
-                API_URL_SUMMARIZATION, 
-                headers=headers, 
-                json=payload, 
-                timeout=45
-            )
+            response = _post(API_URL_SUMMARIZATION, payload, timeout=45)
             
             # Handle various response codes
             if response.status_code == 503:
@@ -68,10 +207,10 @@ def summarize_text(text: str) -> str:
                         continue
                 except:
                     pass
-                return text.strip()[:200] + "..."
+                return _fallback_summary(text)
             
             if response.status_code in [429, 410]:
-                return text.strip()[:200] + "..."
+                return _fallback_summary(text)
             
             response.raise_for_status()
             result = response.json()
@@ -79,25 +218,27 @@ def summarize_text(text: str) -> str:
             # Handle different response formats
             if isinstance(result, list) and len(result) > 0:
                 if isinstance(result[0], dict) and "summary_text" in result[0]:
+                    inference_cache.set(cache_key, result[0]["summary_text"])
                     return result[0]["summary_text"]
             elif isinstance(result, dict):
                 if "summary_text" in result:
+                    inference_cache.set(cache_key, result["summary_text"])
                     return result["summary_text"]
                 elif "error" in result:
-                    return text.strip()[:200] + "..."
+                    return _fallback_summary(text)
                 
         except requests.exceptions.Timeout:
             if attempt == max_retries - 1:
-                return text.strip()[:200] + "..."
+                return _fallback_summary(text)
             time.sleep(2)
         except requests.exceptions.RequestException:
             if attempt == max_retries - 1:
-                return text.strip()[:200] + "..."
+                return _fallback_summary(text)
             time.sleep(2)
         except Exception:
-            return text.strip()[:200] + "..."
+            return _fallback_summary(text)
     
-    return text.strip()[:200] + "..."
+    return _fallback_summary(text)
 
 
 def categorize_text(text: str, categories: List[str]) -> str:
@@ -105,6 +246,7 @@ def categorize_text(text: str, categories: List[str]) -> str:
     Categorizes text using zero-shot classification.
     Model: MoritzLaurer/deberta-v3-large-zeroshot-v2.0 (top-rated, actively maintained)
     Fallback: Returns first category if API unavailable
+    Successful results are cached on disk, keyed by model, parameters and input.
     """
     if not text or len(text.strip()) == 0:
         return categories[0] if categories else "Uncategorized"
@@ -115,11 +257,8 @@ def categorize_text(text: str, categories: List[str]) -> str:
     if not categories:
         return "Uncategorized"
 
-    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
-
     # Truncate text (DeBERTa has 512 token limit)
-    max_length = 1000
-    truncated_text = text[:max_length] if len(text) > max_length else text
+    truncated_text = text[:CLASSIFICATION_MAX_CHARS]
 
     payload = {
         "inputs": truncated_text,
@@ -133,15 +272,19 @@ def categorize_text(text: str, categories: List[str]) -> str:
         }
     }
 
+    cache_key = make_key(API_URL_CLASSIFICATION, payload["parameters"], truncated_text)
+    cached = inference_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Fail fast while the endpoint is known to be overloaded
+    if not breakers[API_URL_CLASSIFICATION].allow():
+        return categories[0]
+
     max_retries = 2
     for attempt in range(max_retries):
         try:
-            response = requests.post(
-                API_URL_CLASSIFICATION, 
-                headers=headers, 
-                json=payload, 
-                timeout=45
-            )
+            response = _post(API_URL_CLASSIFICATION, payload, timeout=45)
             
             # Handle various response codes
             if response.status_code == 503:
@@ -165,6 +308,7 @@ def categorize_text(text: str, categories: List[str]) -> str:
             # Extract the top label
             if isinstance(result, dict) and "labels" in result:
                 if result["labels"] and len(result["labels"]) > 0:
+                    inference_cache.set(cache_key, result["labels"][0])
                     return result["labels"][0]
                 elif "error" in result:
                     return categories[0]
@@ -180,4 +324,114 @@ def categorize_text(text: str, categories: List[str]) -> str:
         except Exception:
             return categories[0]
     
-    return categories[0] if categories else "Uncategorized"
\ No newline at end of file
+    return categories[0] if categories else "Uncategorized"
+
+
+# --- Batch API ---
+def _parse_summary(output) -> Optional[str]:
+    # Batched responses hold either {"summary_text": ...} or [{"summary_text": ...}] per input
+    if isinstance(output, list) and output:
+        output = output[0]
+    if isinstance(output, dict) and "summary_text" in output:
+        return output["summary_text"]
+    return None
+
+
+def _parse_top_label(output) -> Optional[str]:
+    if isinstance(output, dict) and output.get("labels"):
+        return output["labels"][0]
+    return None
+
+
+def _infer_many(url: str, texts: List[str], parameters: dict, parse) -> List[Optional[str]]:
+    """
+    Runs list-input inference for texts not already cached, HF_BATCH_SIZE texts per
+    request and up to HF_MAX_CONCURRENCY requests at once. Returns None where a
+    batch failed or was short-circuited by an open breaker.
+    """
+    results = [None] * len(texts)
+    keys = [make_key(url, parameters, t) for t in texts]
+    pending = []
+    for i, key in enumerate(keys):
+        results[i] = inference_cache.get(key)
+        if results[i] is None:
+            pending.append(i)
+
+    def run(batch):
+        if not breakers[url].allow():
+            return batch, None
+        payload = {
+            "inputs": [texts[i] for i in batch],
+            "parameters": parameters,
+            "options": {"wait_for_model": True, "use_cache": True},
+        }
+        try:
+            response = _post(url, payload, timeout=HF_BATCH_TIMEOUT)
+            outputs = response.json() if response.status_code == 200 else None
+        except (requests.exceptions.RequestException, ValueError):
+            return batch, None
+        if not isinstance(outputs, list) or len(outputs) != len(batch):
+            return batch, None
+        return batch, [parse(output) for output in outputs]
+
+    batches = [pending[start:start + HF_BATCH_SIZE] for start in range(0, len(pending), HF_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=HF_MAX_CONCURRENCY) as pool:
+        for batch, outputs in pool.map(run, batches):
+            for i, output in zip(batch, outputs or []):
+                if output is not None:
+                    results[i] = output
+                    inference_cache.set(keys[i], output)
+    return results
+
+
+def _summarize_many_hf(texts: List[str]) -> List[str]:
+    """
+    Batched summarize_text: same model, parameters, cache and fallback, but
+    texts are sent as list inputs over a bounded number of parallel requests.
+    """
+    summaries = ["No content available" if not t or not t.strip() else None for t in texts]
+    todo = [i for i, summary in enumerate(summaries) if summary is None]
+    if HF_API_KEY and todo:
+        outputs = _infer_many(
+            API_URL_SUMMARIZATION,
+            [texts[i][:SUMMARIZATION_MAX_CHARS] for i in todo],
+            SUMMARIZATION_PARAMETERS,
+            _parse_summary,
+        )
+        for i, output in zip(todo, outputs):
+            summaries[i] = output
+    failed = [i for i, summary in enumerate(summaries) if summary is None]
+    count_fallbacks("summarization", len(failed))
+    for i, summary in zip(failed, extractive_summarizer.summarize_many([texts[i] for i in failed])):
+        summaries[i] = summary
+    return summaries
+
+
+SUMMARIZER_BACKENDS = {
+    "hf": _summarize_many_hf,
+    "extractive": extractive_summarizer.summarize_many,
+}
+
+
+def summarize_many(texts: List[str]) -> List[str]:
+    """Summarizes a batch of texts with the configured SUMMARIZER_BACKEND."""
+    return SUMMARIZER_BACKENDS[SUMMARIZER_BACKEND](texts)
+
+
+def categorize_many(texts: List[str], categories: List[str]) -> List[str]:
+    """Batched categorize_text with the same cache and fallback behaviour."""
+    if not categories:
+        return ["Uncategorized"] * len(texts)
+    labels = [categories[0] if not t or not t.strip() else None for t in texts]
+    todo = [i for i, label in enumerate(labels) if label is None]
+    if HF_API_KEY and todo:
+        outputs = _infer_many(
+            API_URL_CLASSIFICATION,
+            [texts[i][:CLASSIFICATION_MAX_CHARS] for i in todo],
+            {"candidate_labels": categories, "multi_label": False},
+            _parse_top_label,
+        )
+        for i, output in zip(todo, outputs):
+            labels[i] = output
+    count_fallbacks("classification", sum(label is None for label in labels))
+    return [label if label is not None else categories[0] for label in labels]
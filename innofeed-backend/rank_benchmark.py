@@ -0,0 +1,133 @@
+"""
+Ranked-page latency for /feed?sort=top: the precomputed, indexed
+item_domains.rank_score that the API serves, against computing the same
+score inside the query.
+
+    python ingest.py --rank
+    python rank_benchmark.py --domain-ids 1 --pages 20 --repeat 5
+    python rank_benchmark.py --domain-ids 1,2,3 --limit 50
+
+Each variant walks --pages keyset pages of --limit cards, --repeat times,
+and the median latency of the first and the last page is printed. To
+return any page at all, the computed variant has to score every item in
+the domains, with its details row and its domain's citation statistics;
+the stored variant reads the next --limit entries of
+ix_item_domains_domain_rank_item.
+"""
+import argparse
+import math
+import statistics
+import time
+
+from sqlalchemy import and_, case, create_engine, func, select, tuple_
+
+from main import DATABASE_URL, FEED_COLUMNS, Item, ItemDomain, PatentDetails, feed_query
+from ranking import DECAY_PER_DAY, RANK_CITATION_CLIP, RANK_CITATION_WEIGHT, RANK_SOURCE_WEIGHTS
+
+
+def epoch_days(dialect: str, column):
+    if dialect == "postgresql":
+        return func.extract("epoch", column) / 86400.0
+    return func.julianday(column) - 2440587.5
+
+
+def clip(value, bound):
+    return case((value > bound, bound), (value < -bound, -bound), else_=value)
+
+
+def computed_feed_query(dialect: str, domain_ids, after=None, limit=None):
+    """The sort=top page with ranking.rank_scores' formula evaluated per row in SQL."""
+    cites = func.ln(1.0 + PatentDetails.cited_by_count)
+    stats = (
+        select(Item.domain_id, func.avg(cites).label("mean"), func.avg(cites * cites).label("mean_square"))
+        .outerjoin(PatentDetails, PatentDetails.item_id == Item.id)
+        .group_by(Item.domain_id)
+        .cte("citation_stats")
+    )
+    variance = stats.c.mean_square - stats.c.mean * stats.c.mean
+    z = case(
+        (and_(cites.isnot(None), variance > 0), (cites - stats.c.mean) / func.sqrt(variance)),
+        else_=0.0,
+    )
+    source_weight = case(
+        {source: math.log(weight) for source, weight in RANK_SOURCE_WEIGHTS.items()},
+        value=Item.source, else_=0.0,
+    )
+    score = DECAY_PER_DAY * epoch_days(dialect, Item.date) + source_weight + RANK_CITATION_WEIGHT * clip(z, RANK_CITATION_CLIP)
+
+    scored = (
+        select(score.label("rank_score"), Item.id.label("item_id"))
+        .outerjoin(PatentDetails, PatentDetails.item_id == Item.id)
+        .join(stats, stats.c.domain_id == Item.domain_id)
+        .where(
+            Item.id.in_(select(ItemDomain.item_id).where(ItemDomain.domain_id.in_(domain_ids))),
+            Item.date.isnot(None),
+        )
+        .subquery()
+    )
+    page = select(scored)
+    if after:
+        page = page.where(tuple_(scored.c.rank_score, scored.c.item_id) < tuple_(*after))
+    page = page.order_by(scored.c.rank_score.desc(), scored.c.item_id.desc())
+    if limit is not None:
+        page = page.limit(limit)
+    page = page.subquery()
+    return (
+        select(*FEED_COLUMNS, page.c.rank_score)
+        .join(page, page.c.item_id == Item.id)
+        .order_by(page.c.rank_score.desc(), page.c.item_id.desc())
+    )
+
+
+def walk(conn, build, pages, limit):
+    """Fetches pages one keyset cursor after another; returns (per-page seconds, first page ids)."""
+    timings, first_ids, after = [], None, None
+    for _ in range(pages):
+        start = time.perf_counter()
+        rows = conn.execute(build(after, limit)).all()
+        timings.append(time.perf_counter() - start)
+        if first_ids is None:
+            first_ids = [row.id for row in rows]
+        if len(rows) < limit:
+            break
+        after = (rows[-1].rank_score, rows[-1].id)
+    return timings, first_ids
+
+
+def report(label, runs):
+    first = statistics.median(t[0] for t in runs) * 1000
+    last = statistics.median(t[-1] for t in runs) * 1000
+    print(f"{label:<9} first page {first:8.1f} ms   page {len(runs[0]):>3} {last:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domain-ids", default="1", help="comma-separated domain ids (default %(default)s)")
+    parser.add_argument("--limit", type=int, default=50, help="cards per page (default %(default)s)")
+    parser.add_argument("--pages", type=int, default=10, help="pages to walk per run (default %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per variant (default %(default)s)")
+    args = parser.parse_args()
+    domain_ids = sorted({int(d) for d in args.domain_ids.split(",")})
+
+    engine = create_engine(DATABASE_URL)
+    dialect = engine.dialect.name
+    variants = {
+        "stored": lambda after, limit: feed_query(domain_ids, after, limit=limit, sort="top"),
+        "computed": lambda after, limit: computed_feed_query(dialect, domain_ids, after, limit),
+    }
+    with engine.connect() as conn:
+        unscored = conn.scalar(
+            select(func.count()).where(ItemDomain.domain_id.in_(domain_ids), ItemDomain.rank_score.is_(None))
+        )
+        if unscored:
+            print(f"⚠️ {unscored} memberships have no rank_score yet; run python ingest.py --rank first")
+        first_pages = {}
+        for label, build in variants.items():
+            walk(conn, build, 1, args.limit)  # warm the page cache
+            runs = []
+            for _ in range(args.repeat):
+                timings, first_pages[label] = walk(conn, build, args.pages, args.limit)
+                runs.append(timings)
+            report(label, runs)
+    agree = len(set(first_pages["stored"]) & set(first_pages["computed"]))
+    print(f"First pages share {agree} of {len(first_pages['stored'])} items")
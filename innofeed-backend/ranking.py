@@ -0,0 +1,70 @@
+import os
+import math
+from typing import Dict
+
+import numpy as np
+
+
+def parse_source_weights(spec: str) -> Dict[str, float]:
+    """Parses "source=weight,..." pairs, e.g. "arXiv=1.0,Google Patents=0.8"."""
+    weights = {}
+    for pair in spec.split(","):
+        source, _, weight = pair.partition("=")
+        if source.strip():
+            weights[source.strip()] = float(weight)
+    return weights
+
+
+# Days for an item's recency weight to halve
+RANK_HALF_LIFE_DAYS = float(os.getenv("RANK_HALF_LIFE_DAYS", "30"))
+# Score for citations one standard deviation above the domain's mean (log scale)
+RANK_CITATION_WEIGHT = float(os.getenv("RANK_CITATION_WEIGHT", "1.0"))
+# Multiplier per items.source; unlisted sources get 1.0
+RANK_SOURCE_WEIGHTS = parse_source_weights(os.getenv("RANK_SOURCE_WEIGHTS", "arXiv=1.0,Google Patents=0.8"))
+# Citation z-scores are clipped to this many standard deviations either way
+RANK_CITATION_CLIP = 3.0
+# Recomputed scores closer than this to the stored one are not written back; the
+# default is about an hour of recency, so a little drift in a domain's citation
+# statistics doesn't rewrite all of its rows
+RANK_SCORE_TOLERANCE = float(os.getenv("RANK_SCORE_TOLERANCE", "0.001"))
+
+# Score units per day of recency: exactly one half-life apart is ln 2
+DECAY_PER_DAY = math.log(2) / RANK_HALF_LIFE_DAYS
+
+
+def citation_zscores(cited_by: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    log1p(citations) as standard scores within each group (domain), so a
+    well-cited patent in a domain where citations are scarce ranks like one
+    in a domain where they are plentiful. NaN counts (papers, patents the
+    source gave none for) score 0, as do groups with no spread.
+    """
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    known = ~np.isnan(cited_by)
+    x = np.log1p(np.where(known, np.maximum(cited_by, 0), 0))
+    counts = np.bincount(groups, weights=known, minlength=n_groups)
+    sums = np.bincount(groups, weights=np.where(known, x, 0), minlength=n_groups)
+    squares = np.bincount(groups, weights=np.where(known, x * x, 0), minlength=n_groups)
+    mean = sums / np.maximum(counts, 1)
+    std = np.sqrt(np.maximum(squares / np.maximum(counts, 1) - mean * mean, 0))
+    spread = std[groups]
+    z = np.where(known & (spread > 0), (x - mean[groups]) / np.where(spread > 0, spread, 1), 0.0)
+    return np.clip(z, -RANK_CITATION_CLIP, RANK_CITATION_CLIP)
+
+
+def rank_scores(epoch_days: np.ndarray, source_weights: np.ndarray, cited_by: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    Log-scale "top" scores for a whole table at once:
+
+        score = DECAY_PER_DAY * days since 1970 + ln(source weight) + RANK_CITATION_WEIGHT * citation z-score
+
+    which orders items like source_weight * 2^(-age / half-life) * e^(weight * z).
+    Decay is measured from a fixed epoch rather than from now, so scores
+    never go stale with time and only change when an item's inputs or its
+    domain's citation statistics do. Undated items score NaN.
+    """
+    return (
+        DECAY_PER_DAY * epoch_days
+        + np.log(source_weights)
+        + RANK_CITATION_WEIGHT * citation_zscores(cited_by, groups)
+    )
@@ -0,0 +1,170 @@
+import base64
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, column, func, literal_column, or_, select, table, text, tuple_
+
+# Postgres: a generated tsvector over title (A), summary (B) and abstract (C), kept current by the database itself
+POSTGRES_SEARCH_DDL = [
+    """
+    ALTER TABLE items ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(summary, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(abstract, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_items_search_vector ON items USING GIN (search_vector)",
+]
+
+# SQLite stand-in: an external-content FTS5 index kept in sync by triggers
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        title, summary, abstract, content='items', content_rowid='id', tokenize='porter'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, title, summary, abstract) VALUES (new.id, new.title, new.summary, new.abstract);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, title, summary, abstract)
+        VALUES ('delete', old.id, old.title, old.summary, old.abstract);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF title, summary, abstract ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, title, summary, abstract)
+        VALUES ('delete', old.id, old.title, old.summary, old.abstract);
+        INSERT INTO items_fts(rowid, title, summary, abstract) VALUES (new.id, new.title, new.summary, new.abstract);
+    END
+    """,
+]
+
+# Field weights mirror the Postgres A/B/C setweight ordering
+SQLITE_BM25 = "bm25(items_fts, 10.0, 4.0, 1.0)"
+SNIPPET_OPEN, SNIPPET_CLOSE = "<mark>", "</mark>"
+POSTGRES_HEADLINE_OPTIONS = f"StartSel={SNIPPET_OPEN}, StopSel={SNIPPET_CLOSE}, MaxFragments=2, MinWords=5, MaxWords=20"
+
+QUERY_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_schema(engine):
+    """Creates the full-text index for the engine's dialect; idempotent."""
+    if engine.dialect.name == "postgresql":
+        statements = POSTGRES_SEARCH_DDL
+    elif engine.dialect.name == "sqlite":
+        statements = SQLITE_SEARCH_DDL
+    else:
+        raise RuntimeError(f"Full-text search is not supported on {engine.dialect.name}")
+
+    with engine.begin() as conn:
+        fts_existed = engine.dialect.name == "sqlite" and conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'")
+        ).first() is not None
+        for statement in statements:
+            conn.execute(text(statement))
+        if engine.dialect.name == "sqlite" and not fts_existed:
+            # Index rows that predate the FTS table
+            conn.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+
+
+def encode_search_cursor(score: float, item_id: int) -> str:
+    raw = f"{score!r}|{item_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: str):
+    """Returns (score, id); raises ValueError on a malformed cursor."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    score, item_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+    return float(score), int(item_id)
+
+
+def search_terms(q: str) -> List[str]:
+    """The words in q; punctuation-only input has none and can't be searched."""
+    return QUERY_TERM.findall(q)
+
+
+def fts5_query(q: str) -> str:
+    """Quotes each term so user input can't trip FTS5 query syntax; terms are ANDed."""
+    terms = search_terms(q)
+    if not terms:
+        raise ValueError("Search query has no terms")
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def build_search_query(
+    dialect: str,
+    item,
+    item_domain,
+    card_columns,
+    q: str,
+    domain_ids: Optional[List[int]] = None,
+    item_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    after=None,
+    limit: int = 20,
+):
+    """
+    Ranked full-text query returning card columns plus `score` (higher is
+    better) and a highlighted `snippet`, ordered by (score, id) descending
+    and keyset-paginated by `after` = (score, id). Fetches limit + 1 rows.
+    domain_ids matches every domain an item is routed to (item_domain rows),
+    not just its primary one.
+    """
+    filters = []
+    if domain_ids:
+        filters.append(item.id.in_(select(item_domain.item_id).where(item_domain.domain_id.in_(domain_ids))))
+    if item_type:
+        filters.append(item.type == item_type)
+    if date_from:
+        filters.append(item.date >= date_from)
+    if date_to:
+        filters.append(item.date < date_to)
+
+    if dialect == "postgresql":
+        tsquery = func.websearch_to_tsquery("english", q)
+        search_vector = literal_column("items.search_vector")
+        score = func.ts_rank_cd(search_vector, tsquery)
+        match = search_vector.op("@@")(tsquery)
+        if after:
+            filters.append(tuple_(score, item.id) < tuple_(*after))
+        # Rank and page first, then build headlines only for the rows returned
+        page = (
+            select(item.id.label("id"), score.label("score"))
+            .where(match, *filters)
+            .order_by(score.desc(), item.id.desc())
+            .limit(limit + 1)
+            .subquery()
+        )
+        snippet = func.ts_headline(
+            "english", func.coalesce(item.abstract, item.summary, item.title), tsquery, POSTGRES_HEADLINE_OPTIONS
+        )
+        return (
+            select(*card_columns, page.c.score, snippet.label("snippet"))
+            .join(page, page.c.id == item.id)
+            .order_by(page.c.score.desc(), item.id.desc())
+        )
+
+    if dialect == "sqlite":
+        score = literal_column(f"-{SQLITE_BM25}")
+        snippet = literal_column(f"snippet(items_fts, -1, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', 20)")
+        if after:
+            after_score, after_id = after
+            filters.append(or_(score < after_score, and_(score == after_score, item.id < after_id)))
+        items_fts = table("items_fts", column("rowid"))
+        return (
+            select(*card_columns, score.label("score"), snippet.label("snippet"))
+            .select_from(items_fts)
+            .join(item, item.id == items_fts.c.rowid)
+            .where(literal_column("items_fts").op("MATCH")(fts5_query(q)), *filters)
+            .order_by(score.desc(), item.id.desc())
+            .limit(limit + 1)
+        )
+
+    raise RuntimeError(f"Full-text search is not supported on {dialect}")
@@ -0,0 +1,170 @@
+"""
+Local stand-in for the arXiv export API and SerpAPI's Google Patents engine,
+for running ingest.py and ingest_worker.py without network access or quota:
+
+    python source_stub_server.py --port 8090 --items 500 --arrival-seconds 60
+    ARXIV_API_URL=http://127.0.0.1:8090/api/query SERPAPI_URL=http://127.0.0.1:8090/search \\
+        SERPAPI_KEY=stub ARXIV_REQUESTS_PER_SECOND=50 python ingest_worker.py run
+
+Every arXiv category and patent query has its own synthetic listing,
+newest first, of --items entries spaced an hour apart. Another entry is
+published every --arrival-seconds, so incremental runs find fresh items.
+Failures are answered with --fail-status (503 by default).
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+VOCABULARY = """
+learning network model data system method quantum robot control sensor genome sequence security protocol
+ledger consensus attack privacy neural training inference circuit qubit error correction manipulation
+planning grasp locomotion variant expression cell encryption key signature transaction contract graph
+optimization benchmark dataset architecture latency throughput scalable robust efficient adaptive
+""".split()
+
+# Secondary categories and CPC codes, so facet counts have some spread
+CROSS_LISTS = ["cs.LG", "stat.ML", "cs.CV", "eess.SY", "quant-ph", "q-bio.GN"]
+CPC_CODES = ["G06N3/08", "G06F21/60", "H04L9/32", "B25J9/16", "G06N10/00", "C12Q1/68", "G05B13/02"]
+
+
+class Listing:
+    """A deterministic newest-first listing whose head grows by one entry every arrival_seconds."""
+
+    def __init__(self, key, items, arrival_seconds, started):
+        self.key = key
+        self.number = zlib.crc32(key.encode("utf-8")) % 1000
+        self.items = items
+        self.arrival_seconds = arrival_seconds
+        self.started = started
+
+    def total(self):
+        if self.arrival_seconds <= 0:
+            return self.items
+        return self.items + int((time.time() - self.started.timestamp()) // self.arrival_seconds)
+
+    def entry(self, k):
+        """Entry k in publication order (0 is the oldest)."""
+        if k < self.items:
+            date = self.started - timedelta(hours=self.items - k)
+        else:
+            date = self.started + timedelta(seconds=(k - self.items + 1) * self.arrival_seconds)
+        rng = random.Random(f"{self.key}:{k}")
+        topic = [w.lower() for w in self.key.replace(":", " ").replace(".", " ").split() if w.isalpha()]
+        words = [rng.choice(VOCABULARY + topic) for _ in range(60)]
+        title = " ".join(words[:8]).capitalize()
+        abstract = " ".join(words).capitalize() + "."
+        return k, date, title, abstract
+
+    def page(self, start, size):
+        total = self.total()
+        return [self.entry(total - 1 - p) for p in range(start, min(start + size, total))]
+
+
+def arxiv_feed(listing, entries):
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">']
+    for k, date, title, abstract in entries:
+        arxiv_id = f"{2400 + listing.number % 100}.{k:05d}v1"
+        parts.append(
+            f"<entry><id>http://arxiv.org/abs/{arxiv_id}</id>"
+            f"<published>{date:%Y-%m-%dT%H:%M:%SZ}</published>"
+            f"<title>{escape(title)}</title><summary>{escape(abstract)}</summary>"
+            f"<author><name>Stub Author {k % 17}</name></author>"
+            f'<link title="pdf" href="http://arxiv.org/pdf/{arxiv_id}"/>'
+            f'<category term="{escape(listing.key.removeprefix("cat:"))}"/>'
+            f'<category term="{CROSS_LISTS[k % len(CROSS_LISTS)]}"/></entry>'
+        )
+    parts.append("</feed>")
+    return "".join(parts).encode("utf-8")
+
+
+def patent_results(listing, entries):
+    return {"organic_results": [{
+        "title": title,
+        "snippet": abstract,
+        "patent_id": f"patent/US{listing.number:03d}{k:06d}A1/en",
+        "publication_date": f"{date:%Y-%m-%d}",
+        "priority_date": f"{date - timedelta(days=400):%Y-%m-%d}",
+        "family_id": f"{listing.number:03d}{k:07d}",
+        "inventors": [{"name": f"Stub Inventor {k % 13}"}],
+        "assignees": [{"name": f"Stub Corp {k % 7}"}] + ([{"name": f"Stub Labs {k % 5}"}] if k % 3 == 0 else []),
+        "classifications": {"cpc": [
+            {"code": CPC_CODES[(listing.number + k) % len(CPC_CODES)]},
+            {"code": CPC_CODES[k % len(CPC_CODES)]},
+        ]},
+        "status": "Active",
+    } for k, date, title, abstract in entries]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    items = 500
+    arrival_seconds = 60.0
+    latency = 0.0
+    fail_rate = 0.0
+    fail_status = 503
+    started = datetime.now().replace(microsecond=0)
+    listings = {}
+
+    def listing(self, key):
+        if key not in self.listings:
+            self.listings[key] = Listing(key, self.items, self.arrival_seconds, self.started)
+        return self.listings[key]
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            return self._send(self.fail_status, "application/json", b'{"error": "Service unavailable"}')
+
+        if url.path == "/api/query":
+            listing = self.listing(query.get("search_query", ""))
+            entries = listing.page(int(query.get("start", 0)), int(query.get("max_results", 10)))
+            return self._send(200, "application/atom+xml", arxiv_feed(listing, entries))
+        if url.path == "/search" and query.get("engine") == "google_patents":
+            listing = self.listing(query.get("q", ""))
+            entries = listing.page(int(query.get("start", 0)), int(query.get("num", 10)))
+            return self._send(200, "application/json", json.dumps(patent_results(listing, entries)).encode("utf-8"))
+        self._send(404, "application/json", b'{"error": "Unknown endpoint"}')
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8090, items=500, arrival_seconds=60.0, latency=0.0, fail_rate=0.0, fail_status=503):
+    """Builds a configured server; call serve_forever() on it (or run it in a thread)."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "items": items, "arrival_seconds": arrival_seconds, "latency": latency,
+        "fail_rate": fail_rate, "fail_status": fail_status,
+        "started": datetime.now().replace(microsecond=0), "listings": {},
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--items", type=int, default=500, help="entries per listing at startup")
+    parser.add_argument("--arrival-seconds", type=float, default=60.0,
+                        help="seconds between new entries in each listing (0 for none)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.items, args.arrival_seconds, args.latency, args.fail_rate, args.fail_status)
+    print(f"Source stub listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,131 @@
+import os
+from datetime import date, datetime
+from typing import AsyncIterator, Callable, Optional
+
+import anyio
+import anyio.lowlevel
+import msgpack
+import orjson
+from starlette.responses import StreamingResponse
+
+# Rows fetched per round trip from the server-side cursor, and written per chunk
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+# Accept values that select a streaming format; JSON and */* select the endpoint's default
+STREAM_FORMATS = {
+    "application/x-ndjson": NDJSON,
+    "application/ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+DEFAULT_FORMATS = {"application/json", "application/*", "*/*"}
+
+
+def negotiate_stream_format(accept: Optional[str]) -> Optional[str]:
+    """The streaming media type the Accept header prefers (by q-value), or None for the default."""
+    best, best_q = None, 0.0
+    for part in (accept or "").split(","):
+        media_range, *params = [p.strip() for p in part.split(";")]
+        media_range = media_range.lower()
+        if media_range not in STREAM_FORMATS and media_range not in DEFAULT_FORMATS:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        # Ties go to the first listed
+        if q > best_q:
+            best, best_q = STREAM_FORMATS.get(media_range), q
+    return best
+
+
+def _msgpack_default(value):
+    # Same ISO 8601 strings orjson writes for the JSON formats
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def record_encoder(media_type: str) -> Callable[[dict], bytes]:
+    """Encodes one record: a JSON line for NDJSON, one map for MessagePack (concatenated maps form the stream)."""
+    if media_type == MSGPACK:
+        return msgpack.Packer(default=_msgpack_default).pack
+    return lambda record: orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+
+
+async def stream_records(
+    session_factory,
+    stmt,
+    media_type: str,
+    limit: Optional[int] = None,
+    trailer: Optional[Callable] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Runs stmt on its own session and yields its rows encoded as media_type,
+    one STREAM_BATCH_SIZE batch per chunk. Rows are read from a server-side
+    cursor, so memory stays at one batch however many rows match.
+
+    With limit, stmt should fetch limit + 1 rows; the extra row is not sent
+    and only tells the trailer that more exist. trailer(first, last, has_more)
+    returns a final record, e.g. cursors to continue from.
+    """
+    encode = record_encoder(media_type)
+    first = last = None
+    sent, has_more = 0, False
+    db = session_factory()
+    try:
+        # Database calls are shielded: a client disconnect cancels the response, and
+        # cancelling the driver mid-call would leak the connection. The checkpoint
+        # between batches is where that cancellation takes effect instead.
+        with anyio.CancelScope(shield=True):
+            result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        partitions = result.partitions()
+        while True:
+            await anyio.lowlevel.checkpoint()
+            with anyio.CancelScope(shield=True):
+                rows = await anext(partitions, None)
+            if rows is None:
+                break
+            if limit is not None and sent + len(rows) > limit:
+                rows, has_more = rows[:limit - sent], True
+            if rows:
+                if first is None:
+                    first = rows[0]
+                last = rows[-1]
+                sent += len(rows)
+                yield b"".join(encode(row._asdict()) for row in rows)
+            if has_more:
+                break
+    except Exception as e:
+        # Headers are already sent, so the client only sees the body end early
+        print(f"⚠️ Stream aborted after {sent} rows: {e}")
+        raise
+    finally:
+        with anyio.CancelScope(shield=True):
+            await db.close()
+    if trailer:
+        yield encode(trailer(first, last, has_more))
+
+
+class RecordStreamResponse(StreamingResponse):
+    """
+    A StreamingResponse that closes its body iterator however the response
+    ends. Starlette abandons the iterator when the client disconnects, which
+    would keep stream_records' connection checked out, or an SSE stream
+    subscribed, until garbage collection.
+    """
+
+    async def stream_response(self, send):
+        try:
+            await super().stream_response(send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
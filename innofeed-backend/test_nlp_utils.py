@@ -0,0 +1,133 @@
+"""
+Batched Hugging Face inference (nlp_utils) against hf_stub_server.py:
+request batching, the on-disk cache and the circuit breaker's fallback.
+"""
+import threading
+
+import pytest
+
+import hf_stub_server
+import nlp_utils
+from nlp_cache import InferenceCache
+
+TEXTS = [f"Paper {i} studies topic {i}. It reports results for case {i}. Details follow." for i in range(20)]
+CATEGORIES = ["AI", "Robotics", "Genetics"]
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    """Points nlp_utils at a fresh stub server, cache, breakers and latency recorder; yields a function that sets the stub's failure rate and status."""
+    server = hf_stub_server.serve(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    summarization = f"{base}/models/Falconsai/text_summarization"
+    classification = f"{base}/models/MoritzLaurer/deberta-v3-large-zeroshot-v2.0"
+
+    monkeypatch.setattr(nlp_utils, "HF_API_KEY", "stub")
+    monkeypatch.setattr(nlp_utils, "SUMMARIZER_BACKEND", "hf")
+    monkeypatch.setattr(nlp_utils, "HF_BATCH_SIZE", 8)
+    # One request at a time, so the breaker opens after exactly failure_threshold requests
+    monkeypatch.setattr(nlp_utils, "HF_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(nlp_utils, "API_URL_SUMMARIZATION", summarization)
+    monkeypatch.setattr(nlp_utils, "API_URL_CLASSIFICATION", classification)
+    monkeypatch.setattr(nlp_utils, "breakers", {
+        summarization: nlp_utils.CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        classification: nlp_utils.CircuitBreaker(failure_threshold=2, reset_timeout=60),
+    })
+    monkeypatch.setattr(nlp_utils, "latency", nlp_utils.LatencyRecorder())
+    monkeypatch.setattr(nlp_utils, "inference_cache", InferenceCache(str(tmp_path / "cache.sqlite3"), 1024 * 1024))
+
+    def set_fail_rate(rate, status=503):
+        server.RequestHandlerClass.fail_rate = rate
+        server.RequestHandlerClass.fail_status = status
+
+    try:
+        yield set_fail_rate
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def requests_sent(url):
+    return nlp_utils.latency.summary().get(url, {}).get("calls", 0)
+
+
+def fallbacks(task):
+    return sum(value for _, labels, value in nlp_utils.HF_FALLBACKS.samples() if ("task", task) in labels)
+
+
+def test_summarize_many_batches_requests_and_caches_results(stub):
+    url = nlp_utils.API_URL_SUMMARIZATION
+    summaries = nlp_utils.summarize_many(TEXTS + [""])
+
+    assert summaries[:-1] == [text.split(". ")[0] for text in TEXTS]
+    assert summaries[-1] == "No content available"
+    # 20 texts at 8 per request
+    assert requests_sent(url) == 3
+
+    assert nlp_utils.summarize_many(TEXTS) == summaries[:-1]
+    assert requests_sent(url) == 3
+
+
+def test_categorize_many_batches_requests_and_caches_results(stub):
+    url = nlp_utils.API_URL_CLASSIFICATION
+    assert nlp_utils.categorize_many(TEXTS, CATEGORIES) == ["AI"] * len(TEXTS)
+    assert requests_sent(url) == 3
+
+    # Another label set is another cache key
+    assert nlp_utils.categorize_many(TEXTS[:4], ["Genetics", "AI"]) == ["Genetics"] * 4
+    assert requests_sent(url) == 4
+
+    nlp_utils.categorize_many(TEXTS, CATEGORIES)
+    assert requests_sent(url) == 4
+
+
+def test_open_breaker_skips_requests_and_falls_back(stub):
+    url = nlp_utils.API_URL_SUMMARIZATION
+    stub(1.0)
+    before = fallbacks("summarization")
+
+    summaries = nlp_utils.summarize_many(TEXTS)
+
+    # Two overloaded responses open the breaker; the third batch is never sent
+    assert requests_sent(url) == 2
+    assert not nlp_utils.breakers[url].allow()
+    assert all(summaries)
+    assert fallbacks("summarization") - before == len(TEXTS)
+
+    # Fallback summaries are not cached: once the endpoint recovers, the model answers
+    stub(0.0)
+    nlp_utils.breakers[url].record_success()
+    assert nlp_utils.summarize_many(TEXTS) == [text.split(". ")[0] for text in TEXTS]
+    assert requests_sent(url) == 5
+
+
+@pytest.mark.parametrize("status", [500, 502, 504])
+def test_any_server_error_opens_breaker(stub, status):
+    url = nlp_utils.API_URL_SUMMARIZATION
+    stub(1.0, status)
+
+    assert all(nlp_utils.summarize_many(TEXTS))
+    assert requests_sent(url) == 2
+    assert not nlp_utils.breakers[url].allow()
+
+
+def test_client_errors_do_not_reset_breaker(stub):
+    url = nlp_utils.API_URL_SUMMARIZATION
+    nlp_utils.breakers[url].record_failure()
+    stub(1.0, 400)
+
+    nlp_utils.summarize_many(TEXTS[:8])
+    # A rejected input is neither an overload nor a success: the earlier failure still counts
+    assert nlp_utils.breakers[url].failures == 1
+
+
+def test_open_breaker_falls_back_to_first_category(stub):
+    url = nlp_utils.API_URL_CLASSIFICATION
+    stub(1.0)
+    before = fallbacks("classification")
+
+    assert nlp_utils.categorize_many(TEXTS, CATEGORIES) == ["AI"] * len(TEXTS)
+    assert requests_sent(url) == 2
+    assert fallbacks("classification") - before == len(TEXTS)
@@ -8,19 +8,22 @@ function App() {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [userId, setUserId] = useState(null);
   const [userName, setUserName] = useState(null);
+  const [token, setToken] = useState(null);
 
   // Configure your backend API URL
   const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
-  const handleAuthSuccess = (id, name) => {
+  const handleAuthSuccess = (id, name, sessionToken) => {
     setUserId(id);
     setUserName(name);
+    setToken(sessionToken);
     setIsAuthenticated(true);
   };
 
   const handleLogout = () => {
     setUserId(null);
     setUserName(null);
+    setToken(null);
     setIsAuthenticated(false);
   };
 
@@ -32,6 +35,7 @@ function App() {
         <FeedPage
           userId={userId}
           userName={userName}
+          token={token}
           onLogout={handleLogout}
           API_BASE_URL={API_BASE_URL}
         />
@@ -34,8 +34,8 @@ function Auth({ onAuthSuccess, API_BASE_URL }) {
       }
 
       if (isLogin) {
-        // On successful login, pass user_id and name from backend response
-        onAuthSuccess(data.user_id, data.name || email.split('@')[0]);
+        // On successful login, pass user_id, name and session token from backend response
+        onAuthSuccess(data.user_id, data.name || email.split('@')[0], data.token);
       } else {
         setMessage('Registration successful! Please log in.');
         setIsLogin(true);
@@ -2,7 +2,7 @@ import React from 'react';
 import FeedItem from './FeedItem';
 import './Feed.css';
 
-function Feed({ feedData }) {
+function Feed({ feedData, API_BASE_URL }) {
   if (!feedData || feedData.length === 0) {
     return <p className="no-data">No feed items to display. Try setting your preferences.</p>;
   }
@@ -10,7 +10,7 @@ function Feed({ feedData }) {
   return (
     <div className="feed-container">
       {feedData.map((item) => (
-        <FeedItem key={item.id} item={item} />
+        <FeedItem key={item.id} item={item} API_BASE_URL={API_BASE_URL} />
       ))}
     </div>
   );
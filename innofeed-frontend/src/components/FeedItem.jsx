@@ -1,7 +1,29 @@
-import React from 'react';
+import React, { useState } from 'react';
 import './FeedItem.css';
 
-function FeedItem({ item }) {
+function FeedItem({ item: card, API_BASE_URL }) {
+  const [details, setDetails] = useState(null);
+  const [showDetails, setShowDetails] = useState(false);
+  const [detailsError, setDetailsError] = useState(null);
+
+  // The feed only carries card fields; full paper/patent details load on demand
+  const toggleDetails = async () => {
+    if (showDetails) {
+      setShowDetails(false);
+      return;
+    }
+    setShowDetails(true);
+    if (details) return;
+    try {
+      const response = await fetch(`${API_BASE_URL}/items/${card.id}`);
+      if (!response.ok) throw new Error('Failed to fetch item details.');
+      setDetails(await response.json());
+    } catch (e) {
+      setDetailsError('Could not load details.');
+    }
+  };
+
+  const item = details ? { ...card, ...details } : card;
   const formattedDate = item.date ? new Date(item.date).toLocaleDateString() : 'N/A';
 
   return (
@@ -14,12 +36,19 @@ function FeedItem({ item }) {
       <p className="item-summary">{item.summary || item.abstract || 'No summary available'}</p>
       
       <div className="item-details">
-        <p><strong>Authors:</strong> {item.authors || 'N/A'}</p>
         <p><strong>Source:</strong> {item.source}</p>
         <p><strong>Published Date:</strong> {formattedDate}</p>
 
+        <button className="details-toggle" onClick={toggleDetails}>
+          {showDetails ? 'Hide details' : 'Show details'}
+        </button>
+        {showDetails && detailsError && <p className="details-error">{detailsError}</p>}
+        {showDetails && details && (
+          <p><strong>Authors:</strong> {item.authors || 'N/A'}</p>
+        )}
+
         {/* PAPER-SPECIFIC FIELDS */}
-        {item.type === 'paper' && (
+        {showDetails && details && item.type === 'paper' && (
           <div className="paper-specific-details">
             {item.arxiv_id && (
               <p><strong>arXiv ID:</strong> {item.arxiv_id}</p>
@@ -65,7 +94,7 @@ function FeedItem({ item }) {
         )}
 
         {/* PATENT-SPECIFIC FIELDS */}
-        {item.type === 'patent' && (
+        {showDetails && details && item.type === 'patent' && (
           <div className="patent-specific-details">
             {item.application_number && (
               <p><strong>Application Number:</strong> {item.application_number}</p>
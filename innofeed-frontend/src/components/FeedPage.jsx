@@ -3,12 +3,24 @@ import React, { useState, useEffect } from 'react';
 import Feed from './Feed';
 import './FeedPage.css';
 
-function FeedPage({ userId, userName, onLogout, API_BASE_URL }) {
+function FeedPage({ userId, userName, token, onLogout, API_BASE_URL }) {
   const [feed, setFeed] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   const [availableDomains, setAvailableDomains] = useState([]);
   const [userDomainIds, setUserDomainIds] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+
+  // Per-user endpoints require the session token from /login
+  const authHeaders = { Authorization: `Bearer ${token}` };
+
+  // An expired or rejected token ends the session
+  const checkAuth = (response) => {
+    if (response.status === 401) {
+      onLogout();
+      throw new Error('Session expired.');
+    }
+  };
 
   // Fetch available domains from backend
   const fetchDomains = async () => {
@@ -27,10 +39,12 @@ function FeedPage({ userId, userName, onLogout, API_BASE_URL }) {
     setIsLoading(true);
     setError(null);
     try {
-      const response = await fetch(`${API_BASE_URL}/feed/${userId}`);
+      const response = await fetch(`${API_BASE_URL}/feed/${userId}`, { headers: authHeaders });
+      checkAuth(response);
       if (!response.ok) throw new Error('Failed to fetch feed.');
       const data = await response.json();
       setFeed(data.feed);
+      setNextCursor(data.next_cursor);
     } catch (e) {
       setError('Failed to fetch feed. Please check the backend connection.');
     } finally {
@@ -38,14 +52,32 @@ function FeedPage({ userId, userName, onLogout, API_BASE_URL }) {
     }
   };
 
+  // Fetch the next (older) page of the feed and append it
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const response = await fetch(`${API_BASE_URL}/feed/${userId}?cursor=${encodeURIComponent(nextCursor)}`, {
+        headers: authHeaders,
+      });
+      checkAuth(response);
+      if (!response.ok) throw new Error('Failed to fetch feed.');
+      const data = await response.json();
+      setFeed((prev) => [...prev, ...data.feed]);
+      setNextCursor(data.next_cursor);
+    } catch (e) {
+      setError('Failed to load more items.');
+    }
+  };
+
   // Save user preferences
   const savePreferences = async () => {
     try {
       const response = await fetch(`${API_BASE_URL}/set-preferences/${userId}`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders },
         body: JSON.stringify({ domain_ids: userDomainIds }),
       });
+      checkAuth(response);
       if (!response.ok) throw new Error('Failed to save preferences.');
       alert('Preferences saved!');
       fetchFeed(); // Refresh feed after saving
@@ -96,7 +128,10 @@ function FeedPage({ userId, userName, onLogout, API_BASE_URL }) {
       <hr />
       {isLoading && <p>Loading your feed...</p>}
       {error && <p className="error">{error}</p>}
-      {!isLoading && !error && <Feed feedData={feed} />}
+      {!isLoading && !error && <Feed feedData={feed} API_BASE_URL={API_BASE_URL} />}
+      {!isLoading && !error && nextCursor && (
+        <button className="load-more-button" onClick={loadMore}>Load more</button>
+      )}
     </div>
   );
 }